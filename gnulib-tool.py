@@ -26,12 +26,12 @@
 import os
 import re
 import sys
+import json
 import codecs
 import random
 import shutil
 import argparse
 import subprocess as sp
-from pprint import pprint
 from pygnulib import constants
 from pygnulib import classes
 
@@ -88,6 +88,14 @@ def main():
   vc_files = None
   dryrun = None
   errors = None
+  jobs = None
+  copymode = None
+  results = None
+  configcache = None
+  server = None
+  fields = None
+  profile = None
+  trace = None
   
   info = classes.GLInfo()
   parser = argparse.ArgumentParser(
@@ -155,6 +163,11 @@ def main():
     dest='mode_megatest',
     default=None,
     nargs='*')
+  # server
+  parser.add_argument('--server',
+    dest='mode_server',
+    default=None,
+    nargs=1)
   # copy-file
   parser.add_argument('-c', '--copy-file',
     dest='mode_copy_file',
@@ -189,6 +202,14 @@ def main():
     dest='mode_xdependencies',
     default=None,
     nargs='*')
+  parser.add_argument('-xr', '--extract-dependents',
+    dest='mode_xdependents',
+    default=None,
+    nargs='*')
+  parser.add_argument('-xrr', '--extract-recursive-dependents',
+    dest='mode_xrdependents',
+    default=None,
+    nargs='*')
   parser.add_argument('-xac', '--extract-autoconf-snippet',
     dest='mode_xautoconf',
     default=None,
@@ -213,6 +234,15 @@ def main():
     dest='mode_xmaintainer',
     default=None,
     nargs='*')
+  parser.add_argument('--extract-json',
+    dest='mode_xjson',
+    default=None,
+    nargs='*')
+  # fields
+  parser.add_argument('--fields',
+    dest='fields',
+    default=None,
+    nargs=1)
   # destdir
   parser.add_argument('-d', '--destdir',
     dest='destdir',
@@ -223,6 +253,15 @@ def main():
     dest='localdir',
     default=None,
     nargs=1)
+  # modcache
+  parser.add_argument('--cache-modules',
+    dest='modcache',
+    default=None,
+    action='store_true')
+  parser.add_argument('--no-cache-modules',
+    dest='modcache',
+    default=None,
+    action='store_false')
   # verbose
   parser.add_argument('-v', '--verbose',
     default=0,
@@ -236,6 +275,36 @@ def main():
     dest='dryrun',
     default=None,
     action='store_true')
+  # jobs
+  parser.add_argument('--jobs',
+    dest='jobs',
+    default=None,
+    type=int)
+  # copymode
+  parser.add_argument('--copy-mode',
+    dest='copymode',
+    default=None,
+    choices=constants.COPYMODES)
+  # results
+  parser.add_argument('--results',
+    dest='results',
+    default=None,
+    nargs=1)
+  # configcache
+  parser.add_argument('--config-cache',
+    dest='configcache',
+    default=None,
+    action='store_true')
+  # profile
+  parser.add_argument('--profile',
+    dest='profile',
+    default=None,
+    action='store_true')
+  # trace
+  parser.add_argument('--trace',
+    dest='trace',
+    default=None,
+    nargs=1)
   # inctests
   parser.add_argument('--with-tests',
     dest='inctests',
@@ -321,9 +390,18 @@ def main():
   # Parse the given arguments.
   cmdargs = parser.parse_args()
   
+  # Start profiler as early as possible; run() reports it at exit.
+  profile = bool(cmdargs.profile)
+  if cmdargs.trace != None:
+    trace = os.path.abspath(cmdargs.trace[0])
+  if profile or trace:
+    profiler = classes.GLProfiler(profile, trace)
+    profiler.start()
+  
   # Determine when user tries to combine modes.
   args = [
     cmdargs.mode_list,
+    cmdargs.mode_find,
     cmdargs.mode_import,
     cmdargs.mode_add_import,
     cmdargs.mode_remove_import,
@@ -333,6 +411,7 @@ def main():
     cmdargs.mode_test,
     cmdargs.mode_megatest,
     cmdargs.mode_copy_file,
+    cmdargs.mode_server,
     cmdargs.mode_xdescription,
     cmdargs.mode_xcomment,
     cmdargs.mode_xstatus,
@@ -340,12 +419,15 @@ def main():
     cmdargs.mode_xapplicability,
     cmdargs.mode_xfilelist,
     cmdargs.mode_xdependencies,
+    cmdargs.mode_xdependents,
+    cmdargs.mode_xrdependents,
     cmdargs.mode_xautoconf,
     cmdargs.mode_xautomake,
     cmdargs.mode_xinclude,
     cmdargs.mode_xlink,
     cmdargs.mode_xlicense,
     cmdargs.mode_xmaintainer,
+    cmdargs.mode_xjson,
   ]
   overflow = [arg for arg in args if arg]
   if len(overflow) > 1:
@@ -366,6 +448,9 @@ def main():
     sys.exit(0)
   if cmdargs.mode_list != None:
     mode = 'list'
+  if cmdargs.mode_find != None:
+    mode = 'find'
+    files = list(cmdargs.mode_find)
   if cmdargs.mode_import != None:
     mode = 'import'
     modules = list(cmdargs.mode_import)
@@ -389,6 +474,9 @@ def main():
   if cmdargs.mode_megatest != None:
     mode = 'megatest'
     modules = list(cmdargs.mode_megatest)
+  if cmdargs.mode_server != None:
+    mode = 'server'
+    server = cmdargs.mode_server[0]
   if cmdargs.mode_xdescription != None:
     mode = 'extract-description'
     modules = list(cmdargs.mode_xdescription)
@@ -416,6 +504,12 @@ def main():
   if cmdargs.mode_xdependencies != None:
     mode = 'extract-dependencies'
     modules = list(cmdargs.mode_xdependencies)
+  if cmdargs.mode_xdependents != None:
+    mode = 'extract-dependents'
+    modules = list(cmdargs.mode_xdependents)
+  if cmdargs.mode_xrdependents != None:
+    mode = 'extract-recursive-dependents'
+    modules = list(cmdargs.mode_xrdependents)
   if cmdargs.mode_xinclude != None:
     mode = 'extract-include-directive'
     modules = list(cmdargs.mode_xinclude)
@@ -428,6 +522,9 @@ def main():
   if cmdargs.mode_xmaintainer != None:
     mode = 'extract-maintainer'
     modules = list(cmdargs.mode_xmaintainer)
+  if cmdargs.mode_xjson != None:
+    mode = 'extract-json'
+    modules = list(cmdargs.mode_xjson)
   if cmdargs.mode_copy_file != None:
     mode = 'copy-file'
     if len(cmdargs.mode_copy_file) > 2:
@@ -445,6 +542,9 @@ def main():
   localdir = cmdargs.localdir
   if localdir != None:
     localdir = cmdargs.localdir[0]
+  if cmdargs.fields != None:
+    fields = [field.strip() for field in cmdargs.fields[0].split(',')]
+    fields = [field for field in fields if field]
   libname = cmdargs.libname
   if libname != None:
     libname = cmdargs.libname[0]
@@ -463,7 +563,15 @@ def main():
   testsbase = cmdargs.testsbase
   if testsbase != None:
     testsbase = cmdargs.testsbase[0]
+  modcache = cmdargs.modcache
+  if modcache == None:
+    modcache = True
   dryrun = cmdargs.dryrun
+  jobs = cmdargs.jobs
+  copymode = cmdargs.copymode
+  if cmdargs.results != None:
+    results = cmdargs.results[0]
+  configcache = cmdargs.configcache
   verbose = -cmdargs.quiet +cmdargs.verbose
   inctests = cmdargs.inctests
   flags = [cmdargs.inctests, cmdargs.obsolete, cmdargs.cxx,
@@ -519,6 +627,9 @@ def main():
     modcache=modcache,
     verbose=verbose,
     dryrun=dryrun,
+    jobs=jobs,
+    copymode=copymode,
+    configcache=configcache,
   )
   
   # Canonicalize the inctests variable.
@@ -533,9 +644,21 @@ def main():
     modulesystem = classes.GLModuleSystem(config)
     listing = modulesystem.list()
     result = '\n'.join(listing)
-    os.rmdir(config['tempdir'])
     print(result)
     
+  elif mode == 'find':
+    modulesystem = classes.GLModuleSystem(config)
+    localdir = config['localdir']
+    for file in files:
+      pattern = file.endswith('/') or [char for char in '*?[' if char in file]
+      if pattern or isfile(joinpath(DIRS['root'], file)) or \
+      (localdir and isfile(joinpath(localdir, file))):
+        for module in modulesystem.findFile(file):
+          print(module)
+      else: # if file does not exist
+        sys.stderr.write('gnulib-tool: warning: ')
+        sys.stderr.write('file %s does not exist\n' % file)
+    
   elif mode in ['import', 'add-import', 'remove-import', 'update']:
     mode = MODES[mode]
     if not destdir:
@@ -599,6 +722,7 @@ def main():
             if dirisnext:
               if not isabs(aclocal_amflag):
                 m4dirs += [aclocal_amflag]
+              dirisnext = False
             else: # if not dirisnext
               if aclocal_amflag == '-I':
                 dirisnext = True
@@ -646,12 +770,12 @@ def main():
           filetable, transformers = importer.prepare()
           importer.execute(filetable, transformers)
         else: # if len(m4dirs) > 1
+          configs = list()
           for m4base in m4dirs:
             config.setM4Base(m4base)
-            # Perform GLImport actions.
-            importer = classes.GLImport(config, mode)
-            filetable, transformers = importer.prepare()
-            importer.execute(filetable, transformers)
+            configs += [config.copy()]
+          # Perform GLImport actions, concurrently if --jobs allows.
+          classes.GLImport.executeAll(configs, mode)
   
   elif mode == 'create-testdir':
     if not destdir:
@@ -677,7 +801,8 @@ def main():
       auxdir = 'build-aux'
     config.setAuxDir(auxdir)
     testdir = classes.GLMegaTestDir(config, destdir)
-    testdir.execute()
+    if testdir.execute():
+      sys.exit(1)
   
   elif mode == 'test':
     if not destdir:
@@ -687,26 +812,13 @@ def main():
     config.setAuxDir(auxdir)
     testdir = classes.GLTestDir(config, destdir)
     testdir.execute()
-    os.chdir(destdir)
-    os.mkdir('build')
-    os.chdir('build')
-    try: # Try to execute commands
-      sp.call(['../configure'])
-      sp.call([UTILS['make']])
-      sp.call([UTILS['make'], 'check'])
-      sp.call([UTILS['make'], 'distclean'])
-    except Exception as error:
+    runner = classes.GLTestRunner(config, [destdir])
+    failures = [result for result in runner.execute() \
+      if result['status'] != 'passed']
+    if results:
+      runner.save(results)
+    if failures:
       sys.exit(1)
-    args = ['find', '.', '-type', 'f', '-print']
-    remaining = sp.check_output(args).decode(ENCS['shell'])
-    lines = [line.strip() for line in remaining.split('\n') if line.strip()]
-    remaining = ' '.join(lines)
-    if remaining:
-      message = 'Remaining files: %s\n' % remaining
-      message += 'gnulib-tool: *** Stop.\n'
-      sys.stderr.write(message)
-      sys.exit(1)
-    os.chdir('../..')
     sp.call(['rm', '-rf', destdir], shell=False)
     
   elif mode == 'megatest':
@@ -716,26 +828,29 @@ def main():
       auxdir = 'build-aux'
     config.setAuxDir(auxdir)
     testdir = classes.GLMegaTestDir(config, destdir)
-    testdir.execute()
-    os.chdir(destdir)
-    os.mkdir('build')
-    os.chdir('build')
-    sp.call(['../configure'])
-    sp.call([UTILS['make']])
-    sp.call([UTILS['make'], 'check'])
-    sp.call([UTILS['make'], 'distclean'])
-    args = ['find', '.', '-type', 'f', '-print']
-    remaining = sp.check_output(args).decode(ENCS['shell'])
-    lines = [line.strip() for line in remaining.split('\n') if line.strip()]
-    remaining = ' '.join(lines)
-    if remaining:
-      message = 'Remaining files: %s\n' % remaining
-      message += 'gnulib-tool: *** Stop.\n'
-      sys.stderr.write(message)
+    failures = testdir.execute()
+    # Every scratch package has its own configure, so they are tested
+    # separately and concurrently.
+    testdirs = [joinpath(destdir, subdir) for subdir in testdir.getSubdirs()]
+    cache = None
+    if config['configcache']:
+      cache = joinpath(destdir, 'config.cache')
+    runner = classes.GLTestRunner(config, testdirs, cache)
+    failures += [result for result in runner.execute() \
+      if result['status'] != 'passed']
+    if results:
+      runner.save(results)
+    if failures:
       sys.exit(1)
-    os.chdir('../..')
     sp.call(['rm', '-rf', destdir], shell=False)
   
+  elif mode == 'server':
+    server = classes.GLServer(config, server, run)
+    try: # Try to serve requests
+      server.serve()
+    finally: # Remove temporary directory
+      config.removeTempDir()
+    
   elif mode == 'extract-description':
     modulesystem = classes.GLModuleSystem(config)
     modules = [modulesystem.find(module) for module in modules]
@@ -771,7 +886,7 @@ def main():
     modulesystem = classes.GLModuleSystem(config)
     modules = [modulesystem.find(module) for module in modules]
     for module in modules:
-      files = module.getFiles()
+      files = module.getFiles(config['ac_version'])
       print('\n'.join(files))
     
   elif mode == 'extract-dependencies':
@@ -794,6 +909,29 @@ def main():
             result += '%s\t%s' % (str(depmodule), condition)
     print(result)
     
+  elif mode in ['extract-dependents', 'extract-recursive-dependents']:
+    result = string()
+    if avoids:
+      message = '%s: *** ' % constants.APP['name']
+      message += 'cannot combine --avoid and --%s\n' % mode
+      message += '%s: *** Exit.\n' % constants.APP['name']
+      sys.stderr.write(message)
+      sys.exit(1)
+    recursive = mode == 'extract-recursive-dependents'
+    modulesystem = classes.GLModuleSystem(config)
+    modules = [modulesystem.find(module) for module in modules]
+    for module in modules:
+      if recursive:
+        for dependent in modulesystem.getDependents(str(module), True):
+          result += '%s\n' % dependent
+      else: # if not recursive
+        for dependent, condition in modulesystem.getDependents(str(module)):
+          if condition == None:
+            result += '%s\n' % dependent
+          else: # if condition != None
+            result += '%s\t%s\n' % (dependent, condition)
+    sys.stdout.write(result)
+    
   elif mode == 'extract-autoconf-snippet':
     modulesystem = classes.GLModuleSystem(config)
     modules = [modulesystem.find(module) for module in modules]
@@ -804,7 +942,7 @@ def main():
     modulesystem = classes.GLModuleSystem(config)
     modules = [modulesystem.find(module) for module in modules]
     for module in modules:
-      print(module.getAutomakeSnippet())
+      print(module.getAutomakeSnippet(config['auxdir'], config['ac_version']))
     
   elif mode == 'extract-include-directive':
     modulesystem = classes.GLModuleSystem(config)
@@ -837,6 +975,24 @@ def main():
       if module.getTestsModule():
         print(module.getTestsName())
     
+  elif mode == 'extract-json':
+    unknown = [field for field in fields or list() \
+      if field not in constants.FIELDS]
+    if unknown:
+      message = '%s: *** ' % constants.APP['name']
+      message += 'unknown fields: %s\n' % ', '.join(unknown)
+      message += '%s: *** Exit.\n' % constants.APP['name']
+      sys.stderr.write(message)
+      sys.exit(1)
+    modulesystem = classes.GLModuleSystem(config)
+    if not modules:
+      modules = modulesystem.list()
+    for module in modules:
+      module = modulesystem.find(module)
+      if module == None:
+        continue
+      sys.stdout.write('%s\n' % json.dumps(module.getFields(fields)))
+    
   elif mode == 'copy-file':
     srcpath = files[0]
     if len(files) == 2:
@@ -896,7 +1052,7 @@ def main():
     # Copy the file.
     assistant = classes.GLFileAssistant(config)
     tmpfile = assistant.tmpfilename(destpath)
-    shutil.copy(lookedup, tmpfile)
+    constants.copy_file(lookedup, tmpfile, config['copymode'], not flag)
     already_present = True
     assistant.setOriginal(srcpath)
     assistant.setRewritten(destpath)
@@ -919,7 +1075,8 @@ def main():
     sys.stderr.write(message)
     sys.exit(1)
 
-if __name__ == '__main__':
+def run():
+  '''Run gnulib-tool and report errors in gnulib style.'''
   try: # Try to execute
     main()
   except classes.GLError as error:
@@ -984,4 +1141,20 @@ if __name__ == '__main__':
         message += '\n%s: *** Exit.\n' % constants.APP['name']
       sys.stderr.write(message)
       sys.exit(1)
+  finally: # Report profile, if profiler was started
+    profiler = classes.GLProfiler.current
+    if profiler != None:
+      profiler.report()
+
 
+#===============================================================================
+# Define entry point
+#===============================================================================
+if __name__ == '__main__':
+  # Forward the request to the server, if it is running.
+  path = os.getenv('GNULIB_TOOL_SOCKET')
+  if path and '--server' not in sys.argv[1:]:
+    status = classes.GLServer.request(path, sys.argv[1:])
+    if status != None:
+      sys.exit(status)
+  run()
@@ -8,6 +8,7 @@ import os
 import re
 import sys
 import copy
+import shutil
 import codecs
 import tempfile
 import subprocess as sp
@@ -35,6 +36,8 @@ UTILS = constants.UTILS
 FILES = constants.FILES
 MODES = constants.MODES
 TESTS = constants.TESTS
+STATUS = constants.STATUS
+COPYMODES = constants.COPYMODES
 compiler = constants.compiler
 joinpath = constants.joinpath
 cleaner = constants.cleaner
@@ -62,12 +65,13 @@ class GLConfig(object):
     podomain=None, witness_c_macro=None, vc_files=None, symbolic=None,
     lsymbolic=None, modcache=None, configure_ac=None, ac_version=None,
     libtests=None, single_configure=None, verbose=None, dryrun=None,
-    errors=None):
+    errors=None, jobs=None, copymode=None, configcache=None):
     '''GLConfig.__init__(arguments) -> GLConfig
     
     Create new GLConfig instance.'''
     self.table = dict()
-    self.table['tempdir'] = tempfile.mkdtemp()
+    # tempdir
+    self.resetTempDir()
     # destdir
     self.resetDestDir()
     if destdir != None:
@@ -269,6 +273,25 @@ class GLConfig(object):
       else: # if type(errors) is not bool
         raise(TypeError('errors must be a bool, not %s' % \
           type(errors).__name__))
+    # jobs
+    self.resetJobs()
+    if jobs != None:
+      self.setJobs(jobs)
+    # copymode
+    self.resetCopyMode()
+    if copymode != None:
+      self.setCopyMode(copymode)
+    # configcache
+    self.resetConfigCache()
+    if configcache != None:
+      if type(configcache) is bool:
+        if not configcache:
+          self.disableConfigCache()
+        else: # if configcache
+          self.enableConfigCache()
+      else: # if type(configcache) is not bool
+        raise(TypeError('configcache must be a bool, not %s' % \
+          type(configcache).__name__))
     
   # Define special methods.
   def __repr__(self):
@@ -278,6 +301,8 @@ class GLConfig(object):
   def __getitem__(self, y):
     '''x.__getitem__(y) <==> x[y]'''
     if y in self.table:
+      if y == 'tempdir' and self.table[y] == None:
+        self.table[y] = tempfile.mkdtemp()
       result = self.table[y]
       if type(y) is list:
         result = list(self.table[y])
@@ -340,14 +365,18 @@ class GLConfig(object):
         return(2.59)
       elif key == 'verbosity':
         return(0)
+      elif key == 'jobs':
+        return(1)
+      elif key == 'copymode':
+        return(string('auto'))
       elif key == 'copyrights':
         return(True)
       elif key in ['modules', 'avoids', 'tests', 'testflags']:
         return(list())
       elif key in ['libtool', 'lgpl', 'conddeps', 'modcache', 'symbolic',
-      'lsymbolic', 'libtests', 'dryrun']:
+      'lsymbolic', 'libtests', 'dryrun', 'configcache']:
         return(False)
-      if key == 'vc_files':
+      if key in ['vc_files', 'tempdir']:
         return(None)
       elif key == 'errors':
         return(True)
@@ -755,6 +784,23 @@ class GLConfig(object):
     self.table['testflags'] = list()
     self.table['tests'] = self.table['testflags']
     
+  def getExcludedStatusMask(self):
+    '''Return the combination of the STATUS bit masks which are not allowed by
+    the test flags. Obsolete modules are excluded unless obsolete flag is
+    enabled; test modules with the special status are excluded unless the
+    corresponding flag or all-test flag is enabled.'''
+    testflags = self.table['testflags']
+    result = 0
+    if TESTS['obsolete'] not in testflags:
+      result |= STATUS['obsolete']
+    if TESTS['all-test'] not in testflags:
+      result |= STATUS['all-test']
+      for word in ['c++-test', 'longrunning-test', 'privileged-test',
+      'unportable-test']:
+        if TESTS[word] not in testflags:
+          result |= STATUS[word]
+    return(result)
+    
     
   # Define libname methods.
   def getLibName(self):
@@ -1177,4 +1223,80 @@ class GLConfig(object):
   def resetErrors(self):
     '''Reset status of raising GLError in non-critical situations.'''
     self.table['errors'] = False
+    
+    
+  # Define jobs methods.
+  def getJobs(self):
+    '''Return the number of files which are processed concurrently.'''
+    return(self.table['jobs'])
+    
+  def setJobs(self, jobs):
+    '''Set the number of files which are processed concurrently. If jobs is
+    less than 1, the number of processors is used.'''
+    if type(jobs) is int:
+      if jobs < 1:
+        jobs = os.cpu_count() or 1
+      self.table['jobs'] = jobs
+    else: # if type(jobs) is not int
+      raise(TypeError('jobs must be an int, not %s' % type(jobs).__name__))
+    
+  def resetJobs(self):
+    '''Reset the number of files which are processed concurrently.'''
+    self.table['jobs'] = 1
+    
+    
+  # Define copymode methods.
+  def getCopyMode(self):
+    '''Return the way how files are placed into the destination directory.'''
+    return(self.table['copymode'])
+    
+  def setCopyMode(self, copymode):
+    '''Set the way how files are placed into the destination directory. The
+    possible values are 'auto', 'reflink', 'hardlink' and 'copy'.'''
+    if type(copymode) is bytes or type(copymode) is string:
+      if type(copymode) is bytes:
+        copymode = copymode.decode(ENCS['default'])
+    else: # if copymode has not bytes or string type
+      raise(TypeError('copymode must be a string, not %s' % \
+        type(copymode).__name__))
+    if copymode not in COPYMODES:
+      raise(TypeError('invalid copy mode: %s' % repr(copymode)))
+    self.table['copymode'] = copymode
+    
+  def resetCopyMode(self):
+    '''Reset the way how files are placed into the destination directory.'''
+    self.table['copymode'] = string('auto')
 
+    
+    
+  # Define tempdir methods.
+  def resetTempDir(self):
+    '''Forget the temporary directory of this configuration. New directory is
+    created on the first access to config['tempdir']; the previous one is
+    neither used nor removed after that.'''
+    self.table['tempdir'] = None
+    
+  def removeTempDir(self):
+    '''Remove the temporary directory of this configuration, if it was ever
+    created, and reset it.'''
+    if self.table['tempdir'] != None:
+      shutil.rmtree(self.table['tempdir'], True)
+    self.resetTempDir()
+    
+    
+  # Define configcache methods.
+  def checkConfigCache(self):
+    '''Check whether the scratch packages share the configure cache.'''
+    return(self.table['configcache'])
+    
+  def enableConfigCache(self):
+    '''Enable the configure cache shared by the scratch packages.'''
+    self.table['configcache'] = True
+    
+  def disableConfigCache(self):
+    '''Disable the configure cache shared by the scratch packages.'''
+    self.table['configcache'] = False
+    
+  def resetConfigCache(self):
+    '''Reset the configure cache shared by the scratch packages.'''
+    self.table['configcache'] = False
@@ -18,6 +18,7 @@ from .GLModuleSystem import GLModule
 from .GLModuleSystem import GLModuleTable
 from .GLMakefileTable import GLMakefileTable
 from .GLFileSystem import GLFileAssistant
+from .GLProfiler import GLProfiler
 from pprint import pprint
 
 
@@ -41,6 +42,7 @@ UTILS = constants.UTILS
 FILES = constants.FILES
 MODES = constants.MODES
 TESTS = constants.TESTS
+STATUS = constants.STATUS
 compiler = constants.compiler
 joinpath = constants.joinpath
 cleaner = constants.cleaner
@@ -50,6 +52,9 @@ isdir = os.path.isdir
 isfile = os.path.isfile
 normpath = os.path.normpath
 relpath = os.path.relpath
+# Rendered autoconf snippets are the same for every emission site which uses
+# the same module and parameters, so they are rendered once per process.
+SNIPPETS = dict()
 
 
 #===============================================================================
@@ -110,8 +115,10 @@ class GLEmiter(object):
       disable_libtool, disable_gettext, replace_auxdir,
       indentation) -> string
     
-    Emit the autoconf snippet of a module.
-    GLConfig: include_guard_prefix.
+    Emit the autoconf snippet of a module. Rendered snippet is remembered
+    together with the module file and all parameters which affect it, so it
+    is rendered only once per process.
+    GLConfig: auxdir, libtool, include_guard_prefix.
     
     module is a GLModule instance, which is processed.
     fileassistant is a GLFileAssistant instance, which is used to get temporary
@@ -156,24 +163,24 @@ class GLEmiter(object):
       flag = toplevel
     else: # if not str(module) in ['gnumakefile', 'maintainer-makefile']
       flag = True
+    transformer = fileassistant.transformers.get('aux', '')
+    key = tuple([os.path.abspath(module.module), str(module), indentation,
+      flag, disable_libtool, disable_gettext, replace_auxdir, transformer,
+      auxdir, libtool, include_guard_prefix])
+    if key in SNIPPETS:
+      return(SNIPPETS[key])
     if flag:
       snippet = module.getAutoconfSnippet()
       snippet = snippet.replace('${gl_include_guard_prefix}',
         include_guard_prefix)
       lines = [line for line in snippet.split('\n') if line.strip()]
       snippet = '%s\n' % '\n'.join(lines)
-      transformer = fileassistant.transformers.get('aux', '')
       pattern = compiler('(^.*?$)', re.S | re.M)
       snippet = pattern.sub('%s\\1' % indentation, snippet)
       if transformer:
-        args = ['sed', '-e', transformer]
-        path = fileassistant.tmpfilename('snippet')
-        with codecs.open(path, 'wb', 'UTF-8') as file:
-          file.write(snippet)
-        stdin = codecs.open(path, 'rb', 'UTF-8')
-        snippet = sp.check_output(args, stdin=stdin, shell=False)
-        snippet = snippet.decode(ENCS['shell'])
-        os.remove(path)
+        snippet = snippet.encode(ENCS['default'])
+        snippet = constants.apply_sed(transformer, snippet)
+        snippet = snippet.decode(ENCS['default'])
       if disable_libtool:
         snippet = snippet.replace('$gl_cond_libtool', 'false')
         snippet = snippet.replace('gl_libdeps', 'gltests_libdeps')
@@ -194,19 +201,24 @@ add AM_GNU_GETTEXT([external]) or similar to configure.ac.')
       pattern = compiler(regex, re.S | re.M)
       emit = pattern.sub(repl, emit)
     lines = [line for line in emit.split('\n') if line.strip()]
-    emit = '%s\n' % '\n'.join(lines)
+    emit = string()
+    if lines:
+      emit = '%s\n' % '\n'.join(lines)
     emit = constants.nlconvert(emit)
     if type(emit) is bytes:
       emit = emit.decode(ENCS['default'])
+    SNIPPETS[key] = emit
     return(emit)
     
   def autoconfSnippets(self, modules, moduletable, fileassistant,
-    verifier, toplevel, disable_libtool, disable_gettext, replace_auxdir):
+    verifier, toplevel, disable_libtool, disable_gettext, replace_auxdir,
+    file=None):
     '''GLEmiter.autoconfSnippets(modules, fileassistant,
       verifier, toplevel, disable_libtool, disable_gettext,
-      replace_auxdir) -> string
+      replace_auxdir, file=None) -> string
     
-    Collect and emit the autoconf snippets of a set of modules.
+    Collect and emit the autoconf snippets of a set of modules. If file is
+    given, snippets are written there one by one and empty string is returned.
     GLConfig: conddeps.
     
     basemodules argument represents list of modules; every module in this list
@@ -228,8 +240,9 @@ add AM_GNU_GETTEXT([external]) or similar to configure.ac.')
     disable_gettext is a bool variable; it tells whether to disable
       AM_GNU_GETTEXT invocations.
     replace_auxdir is a bool variable; it tells whether to replace
-      'build-aux' directory in AC_CONFIG_FILES.'''
-    emit = string()
+      'build-aux' directory in AC_CONFIG_FILES.
+    file is a file object or a GLSink instance.'''
+    emit = GLSink(file)
     for module in modules:
       if type(module) is not GLModule:
         raise(TypeError('each module must be a GLModule instance'))
@@ -256,103 +269,84 @@ add AM_GNU_GETTEXT([external]) or similar to configure.ac.')
     if type(replace_auxdir) is not bool:
       raise(TypeError('replace_auxdir must be a bool, not %s' % \
         type(replace_auxdir).__name__))
-    auxdir = self.config['auxdir']
     conddeps = self.config['conddeps']
     macro_prefix = self.config['macro_prefix']
+    if verifier == 1:
+      modules = [module for module in modules if module.isNonTests()]
+    elif verifier == 2:
+      modules = [module for module in modules if module.isTests()]
     if not conddeps:
       # Ignore the conditions, and enable all modules unconditionally.
       for module in modules:
-        if verifier == 0:
-          solution = True
-        elif verifier == 1:
-          solution = module.isNonTests()
-        elif verifier == 2:
-          solution = module.isTests()
-        if solution:
-          emit += self.autoconfSnippet(module, fileassistant, toplevel,
-            disable_libtool, disable_gettext, replace_auxdir, '  ')
+        emit += self.autoconfSnippet(module, fileassistant, toplevel,
+          disable_libtool, disable_gettext, replace_auxdir, '  ')
     else: # if conddeps
+      conditionals = [module for module in modules \
+        if moduletable.isConditional(module)]
       # Emit the autoconf code for the unconditional modules.
       for module in modules:
-        if verifier == 0:
-          solution = True
-        elif verifier == 1:
-          solution = module.isNonTests()
-        elif verifier == 2:
-          solution = module.isTests()
-        if solution:
-          if not moduletable.isConditional(module):
-            emit += self.autoconfSnippet(module, fileassistant, toplevel,
-              disable_libtool, disable_gettext, replace_auxdir, '  ')
+        if module not in conditionals:
+          emit += self.autoconfSnippet(module, fileassistant, toplevel,
+            disable_libtool, disable_gettext, replace_auxdir, '  ')
       # Initialize the shell variables indicating that the modules are enabled.
-      for module in modules:
-        if verifier == 0:
-          solution = True
-        elif verifier == 1:
-          solution = module.isNonTests()
-        elif verifier == 2:
-          solution = module.isTests()
-        if solution:
-          if moduletable.isConditional(module):
-            shellvar = module.getShellVar()
-            emit += '  %s=false\n' % module.getShellVar()
+      for module in conditionals:
+        emit += '  %s=false\n' % module.getShellVar(macro_prefix)
       # Emit the autoconf code for the conditional modules, each in a separate
       # function. This makes it possible to support cycles among conditional
       # modules.
+      for module in conditionals:
+        shellfunc = module.getShellFunc(macro_prefix)
+        shellvar = module.getShellVar(macro_prefix)
+        emit += '  %s ()\n' % shellfunc
+        emit += '  {\n'
+        emit += '    if ! $%s; then\n' % shellvar
+        emit += self.autoconfSnippet(module, fileassistant, toplevel,
+          disable_libtool, disable_gettext, replace_auxdir, '      ')
+        emit += '      %s=true\n' % shellvar
+        depmodules = [pair[0] for pair in module.getDependencies()]
+        # Intersect dependencies with the conditional modules list. The
+        # autoconf code for unconditional dependencies has already been
+        # emitted above and therefore is already executed when this code is
+        # run.
+        depmodules = [dep for dep in depmodules if dep in conditionals]
+        for depmodule in depmodules:
+          shellfunc = depmodule.getShellFunc(macro_prefix)
+          condition = moduletable.getCondition(module, depmodule)
+          if condition != None and condition != True:
+            emit += '      if %s; then\n' % condition
+            emit += '        %s\n' % shellfunc
+            emit += '      fi\n'
+          else: # if condition == None or condition == True
+            emit += '      %s\n' % shellfunc
+        emit += '    fi\n'
+        emit += '  }\n'
+      # Emit the dependencies from the unconditional to the conditional
+      # modules.
       for module in modules:
-        if verifier == 0:
-          solution = True
-        elif verifier == 1:
-          solution = module.isNonTests()
-        elif verifier == 2:
-          solution = module.isTests()
-        if solution:
-          if moduletable.isConditional(module):
-            shellfunc = module.getShellFunc()
-            shellvar = module.getShellVar()
-            emit += '  %s ()\n' % shellfunc
-            emit += '  {\n'
-            emit += '    if ! $%s; then\n' % shellvar
-            emit += self.autoconfSnippet(module, fileassistant, toplevel,
-              disable_libtool, disable_gettext, replace_auxdir, '      ')
-            emit += '      %s=true\n' % shellvar
-            dependencies = module.getDependencies()
-            depmodules = [pair[0] for pair in dependencies]
-            # Intersect dependencies with the modules list.
-            depmodules = [dep for dep in depmodules if dep in modules]
-            for depmodule in depmodules:
-              if moduletable.isConditional(depmodule):
-                shellfunc = depmodule.getShellFunc()
-                condition = moduletable.getCondition(module, depmodule)
-                if condition != None:
-                  emit += '  if %s; then\n' % condition
-                  emit += '    %s\n' % shellfunc
-                  emit += '  fi\n'
-                else: # if condition == None
-                  emit += '  %s\n' % shellfunc
-              else: # if not moduletable.isConditional(depmodule)
-                # The autoconf code for $dep has already been emitted above and
-                # therefore is already executed when this code is run.
-                pass
+        if module not in conditionals:
+          depmodules = [pair[0] for pair in module.getDependencies()]
+          depmodules = [dep for dep in depmodules if dep in conditionals]
+          for depmodule in depmodules:
+            shellfunc = depmodule.getShellFunc(macro_prefix)
+            condition = moduletable.getCondition(module, depmodule)
+            if condition != None and condition != True:
+              emit += '  if %s; then\n' % condition
+              emit += '    %s\n' % shellfunc
+              emit += '  fi\n'
+            else: # if condition == None or condition == True
+              emit += '  %s\n' % shellfunc
       # Define the Automake conditionals.
       emit += '  m4_pattern_allow([^%s_GNULIB_ENABLED_])\n' % macro_prefix
-      for module in modules:
-        if verifier == 0:
-          solution = True
-        elif verifier == 1:
-          solution = module.isNonTests()
-        elif verifier == 2:
-          solution = module.isTests()
-        if solution:
-          condname = module.getConditionalName()
-          shellvar = module.getShellVar()
-          emit += '  AM_CONDITIONAL([%s], [$%s])\n' % (condname, shellvar)
-    lines = [line for line in emit.split('\n') if line.strip()]
-    emit = '%s\n' % '\n'.join(lines)
-    emit = constants.nlconvert(emit)
-    if type(emit) is bytes:
-      emit = emit.decode(ENCS['default'])
-    return(emit)
+      for module in conditionals:
+        condname = module.getConditionalName(macro_prefix)
+        shellvar = module.getShellVar(macro_prefix)
+        emit += '  AM_CONDITIONAL([%s], [$%s])\n' % (condname, shellvar)
+    if not emit.length:
+      # Even if there are no snippets, the line is emitted.
+      emit += '\n'
+    return(emit.getvalue())
+  autoconfSnippets = \
+    GLProfiler.measure('GLEmiter.autoconfSnippets', autoconfSnippets)
     
   def po_Makevars(self):
     '''GLEmiter.po_Makevars() -> string
@@ -593,13 +587,91 @@ AC_DEFUN([%V1%_LIBSOURCES], [
       emit = emit.decode(ENCS['default'])
     return(constants.nlconvert(emit))
     
+  def _lib_snippets_(self, modules, moduletable, for_test):
+    '''GLEmiter._lib_snippets_(modules, moduletable, for_test) -> generator
+    
+    Generate the Makefile.am snippets of the non-tests modules for the library
+    Makefile as tuples of module and its snippet. Modules with empty snippets
+    are skipped. Snippets are generated one by one, so they are never kept in
+    memory all at once.
+    GLConfig: libname, libtool, conddeps, macro_prefix, include_guard_prefix,
+    auxdir, ac_version.'''
+    libname = self.config['libname']
+    libtool = self.config['libtool']
+    conddeps = self.config['conddeps']
+    macro_prefix = self.config['macro_prefix']
+    include_guard_prefix = self.config['include_guard_prefix']
+    auxdir = self.config['auxdir']
+    ac_version = self.config['ac_version']
+    if libtool:
+      libext = 'la'
+      perhapsLT = 'LT'
+      LD_flags = False
+    else: # if not libtool
+      libext = 'a'
+      perhapsLT = ''
+      LD_flags = True
+    if for_test:
+      # When creating a package for testing: Attempt to provoke failures,
+      # especially link errors, already during "make" rather than during
+      # "make check", because "make check" is not possible in a cross-compiling
+      # situation. Turn check_PROGRAMS into noinst_PROGRAMS.
+      check_PROGRAMS = True
+    else: # if not for_test
+      check_PROGRAMS = False
+    for module in modules:
+      if not module.isTests():
+        # Get conditional snippet, edit it and save to amsnippet1.
+        amsnippet1 = module.getAutomakeSnippet_Conditional()
+        amsnippet1 = amsnippet1.replace('lib_LIBRARIES', 'lib%_LIBRARIES')
+        amsnippet1 = amsnippet1.replace('lib_LTLIBRARIES', 'lib%_LTLIBRARIES')
+        if LD_flags:
+          pattern = compiler('lib_LDFLAGS[\t ]*\\+=(.*?)$', re.S | re.M)
+          amsnippet1 = pattern.sub('', amsnippet1)
+        pattern = compiler('lib_([A-Z][A-Z](?:.*?))', re.S | re.M)
+        amsnippet1 = pattern.sub('%s_%s_\\1' % (libname, libext), amsnippet1)
+        amsnippet1 = amsnippet1.replace('lib%_LIBRARIES', 'lib_LIBRARIES')
+        amsnippet1 = amsnippet1.replace('lib%_LTLIBRARIES', 'lib_LTLIBRARIES')
+        amsnippet1 = amsnippet1.replace('${gl_include_guard_prefix}',
+          include_guard_prefix)
+        if str(module) == 'alloca':
+          amsnippet1 += '%s_%s_LIBADD += @%sALLOCA@\n' % \
+            (libname, libext, perhapsLT)
+          amsnippet1 += '%s_%s_DEPENDENCIES += @%sALLOCA@\n' % \
+            (libname, libext, perhapsLT)
+        if check_PROGRAMS:
+          amsnippet1 = amsnippet1.replace('check_PROGRAMS', 'noinst_PROGRAMS')
+        
+        # Get unconditional snippet, edit it and save to amsnippet1.
+        amsnippet2 = module.getAutomakeSnippet_Unconditional(auxdir,
+          ac_version)
+        pattern = compiler('lib_([A-Z][A-Z](?:.*?))', re.S | re.M)
+        amsnippet2 = pattern.sub('%s_%s_\\1' % (libname, libext), amsnippet2)
+        if type(amsnippet1) is bytes:
+          amsnippet1 = amsnippet1.decode(ENCS['default'])
+        if type(amsnippet2) is bytes:
+          amsnippet2 = amsnippet1.decode(ENCS['default'])
+        if not (amsnippet1 +amsnippet2).isspace():
+          conditional = conddeps and moduletable.isConditional(module)
+          snippet = '## begin gnulib module %s\n' % str(module)
+          if conditional:
+            name = module.getConditionalName(macro_prefix)
+            snippet += 'if %s\n' % name
+          snippet += amsnippet1
+          if conditional:
+            snippet += 'endif\n'
+          snippet += amsnippet2
+          snippet += '## end   gnulib module %s\n\n' % str(module)
+          yield(tuple([module, snippet]))
+    
   def lib_Makefile_am(self, destfile, modules,
-    moduletable, makefiletable, actioncmd, for_test):
+    moduletable, makefiletable, actioncmd, for_test, file=None):
     '''GLEmiter.lib_Makefile_am(destfile, modules, moduletable, makefiletable,
-         actioncmd, for_test) -> tuple of string and bool
+         actioncmd, for_test, file=None) -> tuple of string and bool
     
     Emit the contents of the library Makefile. Returns string and a bool
-    variable which shows if subdirectories are used.
+    variable which shows if subdirectories are used. If file is given, the
+    contents are written there piece by piece and the string is empty.
     GLConfig: localdir, sourcebase, libname, pobase, auxdir, makefile, libtool,
     macro_prefix, podomain, conddeps, witness_c_macro.
     
@@ -610,7 +682,8 @@ AC_DEFUN([%V1%_LIBSOURCES], [
     actioncmd is a string variable, which represents the actioncmd; it can be
       an empty string e.g. when user wants to generate files for GLTestDir.
     for_test is a bool variable; it must be set to True if creating a package
-      for testing, False otherwise.'''
+      for testing, False otherwise.
+    file is a file object or a GLSink instance.'''
     if type(destfile) is bytes or type(destfile) is string:
       if type(destfile) is bytes:
         destfile = destfile.decode(ENCS['default'])
@@ -635,7 +708,7 @@ AC_DEFUN([%V1%_LIBSOURCES], [
     if type(for_test) is not bool:
       raise(TypeError('for_test must be a bool, not %s' % \
         type(for_test).__name__))
-    emit = string()
+    emit = GLSink(file)
     localdir = self.config['localdir']
     sourcebase = self.config['sourcebase']
     modcache = self.config['modcache']
@@ -666,14 +739,6 @@ AC_DEFUN([%V1%_LIBSOURCES], [
       libext = 'a'
       perhapsLT = ''
       LD_flags = True
-    if for_test:
-      # When creating a package for testing: Attempt to provoke failures,
-      # especially link errors, already during "make" rather than during
-      # "make check", because "make check" is not possible in a cross-compiling
-      # situation. Turn check_PROGRAMS into noinst_PROGRAMS.
-      check_PROGRAMS = True
-    else: # if not for_test
-      check_PROGRAMS = False
     emit += "## DO NOT EDIT! GENERATED AUTOMATICALLY!\n"
     emit += "## Process this file with automake to produce Makefile.in.\n"
     emit += self.copyright_notice()
@@ -681,59 +746,27 @@ AC_DEFUN([%V1%_LIBSOURCES], [
       if len(actioncmd) <= 3000:
         emit += "# Reproduce by: %s\n" % actioncmd
     emit += '\n'
-    uses_subdirs = False
     
-    # Modify allsnippets variable.
-    allsnippets = string()
-    for module in modules:
-      if not module.isTests():
-        # Get conditional snippet, edit it and save to amsnippet1.
-        amsnippet1 = module.getAutomakeSnippet_Conditional()
-        amsnippet1 = amsnippet1.replace('lib_LIBRARIES', 'lib%_LIBRARIES')
-        amsnippet1 = amsnippet1.replace('lib_LTLIBRARIES', 'lib%_LTLIBRARIES')
-        if LD_flags:
-          pattern = compiler('lib_LDFLAGS[\t ]*\\+=(.*?)$', re.S | re.M)
-          amsnippet1 = pattern.sub('', amsnippet1)
-        pattern = compiler('lib_([A-Z][A-Z](?:.*?))', re.S | re.M)
-        amsnippet1 = pattern.sub('%s_%s_\\1' % (libname, libext), amsnippet1)
-        amsnippet1 = amsnippet1.replace('lib%_LIBRARIES', 'lib_LIBRARIES')
-        amsnippet1 = amsnippet1.replace('lib%_LTLIBRARIES', 'lib_LTLIBRARIES')
-        amsnippet1 = amsnippet1.replace('${gl_include_guard_prefix}',
-          include_guard_prefix)
-        if str(module) == 'alloca':
-          amsnippet1 += '%s_%s_LIBADD += @%sALLOCA@\n' % \
-            (libname, libext, perhapsLT)
-          amsnippet1 += '%s_%s_DEPENDENCIES += @%sALLOCA@\n' % \
-            (libname, libext, perhapsLT)
-        if check_PROGRAMS:
-          amsnippet1 = amsnippet1.replace('check_PROGRAMS', 'noinst_PROGRAMS')
-        
-        # Get unconditional snippet, edit it and save to amsnippet1.
-        amsnippet2 = module.getAutomakeSnippet_Unconditional()
-        pattern = compiler('lib_([A-Z][A-Z](?:.*?))', re.S | re.M)
-        amsnippet2 = pattern.sub('%s_%s_\\1' % (libname, libext), amsnippet2)
-        if type(amsnippet1) is bytes:
-          amsnippet1 = amsnippet1.decode(ENCS['default'])
-        if type(amsnippet2) is bytes:
-          amsnippet2 = amsnippet1.decode(ENCS['default'])
-        if not (amsnippet1 +amsnippet2).isspace():
-          allsnippets += '## begin gnulib module %s\n' % str(module)
-          if conddeps:
-            if moduletable.isConditional(module):
-              name = module.getConditionalName()
-              allsnippets += 'if %s\n' % name
-          allsnippets += amsnippet1
-          if conddeps:
-            allsnippets += 'endif\n'
-          allsnippets += amsnippet2
-          allsnippets += '## end   gnulib module %s\n\n' % str(module)
-          
-          # Test whether there are some source files in subdirectories.
-          for file in module.getFiles():
-            if file.startswith('lib/') and file.endswith('.c') and \
-            file.count('/') > 1:
-              uses_subdirs = True
-              break
+    # Snippets are rendered twice: first to find out which variables and
+    # options they need, then to write them after the header.
+    uses_subdirs = False
+    pkgdata = False
+    insnippets = False
+    pattern_pkgdata = compiler('^pkgdata_DATA *\\+=', re.S | re.M)
+    regex = '^[a-zA-Z0-9_]*_%sLIBRARIES *\\+{0,1}= *%s.%s' % \
+      (perhapsLT, libname, libext)
+    pattern_library = compiler(regex, re.S | re.M)
+    for module, snippet in self._lib_snippets_(modules, moduletable, for_test):
+      if pattern_pkgdata.search(snippet):
+        pkgdata = True
+      if pattern_library.search(snippet):
+        insnippets = True
+      # Test whether there are some source files in subdirectories.
+      for name in module.getFiles(ac_version):
+        if name.startswith('lib/') and name.endswith('.c') and \
+        name.count('/') > 1:
+          uses_subdirs = True
+          break
     if not makefile:
       subdir_options = string()
       # If there are source files in subdirectories, prevent collision of the
@@ -753,8 +786,7 @@ AC_DEFUN([%V1%_LIBSOURCES], [
       #  * http://debbugs.gnu.org/10997
       #  * http://debbugs.gnu.org/11030
       # So we need this workaround.
-      pattern = compiler('^pkgdata_DATA *\\+=', re.S | re.M)
-      if pattern.findall(allsnippets):
+      if pkgdata:
         emit += 'pkgdata_DATA =\n'
       emit += 'EXTRA_DIST =\n'
       emit += 'BUILT_SOURCES =\n'
@@ -800,19 +832,14 @@ AC_DEFUN([%V1%_LIBSOURCES], [
     # One of the snippets or the user's Makefile.am already specifies an
     # installation location for the library. Don't confuse automake by saying
     # it should not be installed.
-    # First test if allsnippets already specify an installation location.
-    insnippets = False
+    # Whether snippets already specify an installation location was tested
+    # above. Then test if $sourcebase/Makefile.am (if it exists) specifies it.
     inmakefile = False
-    regex = '^[a-zA-Z0-9_]*_%sLIBRARIES *\\+{0,1}= *%s.%s' % \
-      (perhapsLT, libname, libext)
-    pattern = compiler(regex, re.S | re.M)
-    insnippets = bool(pattern.findall(allsnippets))
-    # Then test if $sourcebase/Makefile.am (if it exists) specifies it.
     path = joinpath(sourcebase, 'Makefile.am')
     if makefile and isfile(path):
       with codecs.open(path, 'rb', 'UTF-8') as file:
         data = file.read()
-      inmakefile = bool(pattern.findall(data))
+      inmakefile = bool(pattern_library.findall(data))
     if not any([insnippets, inmakefile]):
       # By default, the generated library should not be installed.
       emit += 'noinst_%sLIBRARIES += %s.%s\n' % (perhapsLT, libname, libext)
@@ -846,9 +873,9 @@ AC_DEFUN([%V1%_LIBSOURCES], [
     if pobase:
       emit += 'AM_CPPFLAGS += -DDEFAULT_TEXT_DOMAIN="%s-gnulib"\n' % podomain
       emit += '\n'
-    allsnippets = allsnippets.replace('$(top_srcdir)/build-aux/',
-      '$(top_srcdir)/%s/' % auxdir)
-    emit += allsnippets
+    for module, snippet in self._lib_snippets_(modules, moduletable, for_test):
+      emit += snippet.replace('$(top_srcdir)/build-aux/',
+        '$(top_srcdir)/%s/' % auxdir)
     emit += '\n'
     emit += 'mostlyclean-local: mostlyclean-generic\n'
     emit += '\t@for dir in \'\' $(MOSTLYCLEANDIRS); do \\\n'
@@ -857,19 +884,78 @@ AC_DEFUN([%V1%_LIBSOURCES], [
     emit += '\t  fi; \\\n'
     emit += '\tdone; \\\n'
     emit += '\t:\n'
-    emit = constants.nlconvert(emit)
-    if type(emit) is bytes:
-      emit = emit.decode(ENCS['default'])
-    result = tuple([emit, uses_subdirs])
+    result = tuple([emit.getvalue(), uses_subdirs])
     return(result)
+  lib_Makefile_am = \
+    GLProfiler.measure('GLEmiter.lib_Makefile_am', lib_Makefile_am)
+    
+  def _tests_snippets_(self, modules, for_test):
+    '''GLEmiter._tests_snippets_(modules, for_test) -> generator
+    
+    Generate the Makefile.am snippets of the modules for the tests Makefile as
+    tuples of module and its snippet. Modules with empty snippets are skipped.
+    Snippets are generated one by one, so they are never kept in memory all
+    at once.
+    GLConfig: libtool, include_guard_prefix, libtests, single_configure,
+    auxdir, ac_version.'''
+    libtool = self.config['libtool']
+    include_guard_prefix = self.config['include_guard_prefix']
+    libtests = self.config['libtests']
+    single_configure = self.config['single_configure']
+    auxdir = self.config['auxdir']
+    ac_version = self.config['ac_version']
+    if libtool:
+      perhapsLT = 'LT'
+      LD_flags = False
+    else: # if not libtool
+      perhapsLT = ''
+      LD_flags = True
+    if for_test:
+      # When creating a package for testing: Attempt to provoke failures,
+      # especially link errors, already during "make" rather than during
+      # "make check", because "make check" is not possible in a cross-compiling
+      # situation. Turn check_PROGRAMS into noinst_PROGRAMS.
+      check_PROGRAMS = True
+    else: # if not for_test
+      check_PROGRAMS = False
+    for module in modules:
+      if for_test and not single_configure:
+        flag = module.isTests()
+      else: # if for_test and not single_configure
+        flag = True
+      if flag:
+        snippet = module.getAutomakeSnippet(auxdir, ac_version)
+        snippet = snippet.replace('lib_LIBRARIES', 'lib%_LIBRARIES')
+        snippet = snippet.replace('lib_LTLIBRARIES', 'lib%_LTLIBRARIES')
+        if LD_flags:
+          pattern = compiler('lib_LDFLAGS[\t ]*\\+=(.*?)$', re.S | re.M)
+          snippet = pattern.sub('', snippet)
+        pattern = compiler('lib_([A-Z][A-Z](?:.*?))', re.S | re.M)
+        snippet = pattern.sub('libtests_a_\\1', snippet)
+        snippet = snippet.replace('lib%_LIBRARIES', 'lib_LIBRARIES')
+        snippet = snippet.replace('lib%_LTLIBRARIES', 'lib_LTLIBRARIES')
+        snippet = snippet.replace('${gl_include_guard_prefix}',
+          include_guard_prefix)
+        if check_PROGRAMS:
+          snippet = snippet.replace('check_PROGRAMS', 'noinst_PROGRAMS')
+        # Check if module is 'alloca'.
+        if libtests and str(module) == 'alloca':
+          snippet += 'libtests_a_LIBADD += @%sALLOCA@\n' % perhapsLT
+          snippet += 'libtests_a_DEPENDENCIES += @%sALLOCA@\n' % perhapsLT
+        
+        # Skip the contents if it's entirely empty.
+        if snippet.strip():
+          snippet = snippet.replace('\n\nEXTRA_DIST', '\nEXTRA_DIST')
+          yield(tuple([module, snippet]))
     
   def tests_Makefile_am(self, destfile, modules, makefiletable,
-    witness_macro, for_test):
+    witness_macro, for_test, file=None):
     '''GLEmiter.tests_Makefile_am(destfile, modules, makefiletable,
-         witness_c_macro, for_test) -> tuple of string and bool
+         witness_c_macro, for_test, file=None) -> tuple of string and bool
     
     Emit the contents of the tests Makefile. Returns string and a bool variable
-    which shows if subdirectories are used.
+    which shows if subdirectories are used. If file is given, the contents are
+    written there piece by piece and the string is empty.
     GLConfig: localdir, modules, libname, auxdir, makefile, libtool,
     sourcebase, m4base, testsbase, macro_prefix, witness_c_macro,
     single_configure, libtests.
@@ -882,7 +968,8 @@ AC_DEFUN([%V1%_LIBSOURCES], [
     actioncmd is a string variable, which represents the actioncmd; it can be
       an empty string e.g. when user wants to generate files for GLTestDir.
     for_test is a bool variable; it must be set to True if creating a package
-      for testing, False otherwise.'''
+      for testing, False otherwise.
+    file is a file object or a GLSink instance.'''
     if type(destfile) is bytes or type(destfile) is string:
       if type(destfile) is bytes:
         destfile = destfile.decode(ENCS['default'])
@@ -904,7 +991,7 @@ AC_DEFUN([%V1%_LIBSOURCES], [
     if type(for_test) is not bool:
       raise(TypeError('for_test must be a bool, not %s' % \
         type(for_test).__name__))
-    emit = string()
+    emit = GLSink(file)
     localdir = self.config['localdir']
     auxdir = self.config['auxdir']
     sourcebase = self.config['sourcebase']
@@ -932,14 +1019,6 @@ AC_DEFUN([%V1%_LIBSOURCES], [
       libext = 'a'
       perhapsLT = ''
       LD_flags = True
-    if for_test:
-      # When creating a package for testing: Attempt to provoke failures,
-      # especially link errors, already during "make" rather than during
-      # "make check", because "make check" is not possible in a cross-compiling
-      # situation. Turn check_PROGRAMS into noinst_PROGRAMS.
-      check_PROGRAMS = True
-    else: # if not for_test
-      check_PROGRAMS = False
     
     # Calculate testsbase_inverse
     counter = int()
@@ -954,60 +1033,25 @@ AC_DEFUN([%V1%_LIBSOURCES], [
     emit += "## Process this file with automake to produce Makefile.in.\n"
     emit += '%s\n' % self.copyright_notice()
     
+    # Snippets are rendered again when they are written after the header, and
+    # snippets of long-running tests are written after all other snippets.
     uses_subdirs = False
-    main_snippets = string()
-    longrun_snippets = string()
-    for module in modules:
-      if for_test and not single_configure:
-        flag = module.isTests()
-      else: # if for_test and not single_configure
-        flag = True
-      if flag:
-        snippet = module.getAutomakeSnippet()
-        snippet = snippet.replace('lib_LIBRARIES', 'lib%_LIBRARIES')
-        snippet = snippet.replace('lib_LTLIBRARIES', 'lib%_LTLIBRARIES')
-        if LD_flags:
-          pattern = compiler('lib_LDFLAGS[\t ]*\\+=(.*?)$', re.S | re.M)
-          snippet = pattern.sub('', snippet)
-        pattern = compiler('lib_([A-Z][A-Z](?:.*?))', re.S | re.M)
-        snippet = pattern.sub('libtests_a_\\1', snippet)
-        snippet = snippet.replace('lib%_LIBRARIES', 'lib_LIBRARIES')
-        snippet = snippet.replace('lib%_LTLIBRARIES', 'lib_LTLIBRARIES')
-        snippet = snippet.replace('${gl_include_guard_prefix}',
-          include_guard_prefix)
-        if check_PROGRAMS:
-          snippet = snippet.replace('check_PROGRAMS', 'noinst_PROGRAMS')
-        # Check if module is 'alloca'.
-        if libtests and str(module) == 'alloca':
-          snippet += 'libtests_a_LIBADD += @%sALLOCA@\n' % perhapsLT
-          snippet += 'libtests_a_DEPENDENCIES += @%sALLOCA@\n' % perhapsLT
-        
-        # Skip the contents if it's entirely empty.
-        if snippet.strip():
-          # Check status of the module.
-          status = module.getStatus()
-          islongrun = False
-          for word in status:
-            if word == 'longrunning-test':
-              islongrun = True
-              break
-          if not islongrun:
-            snippet = snippet.replace('\n\nEXTRA_DIST', '\nEXTRA_DIST')
-            main_snippets += '## begin gnulib module %s\n' % str(module)
-            main_snippets += snippet
-            main_snippets += '## end   gnulib module %s\n\n' % str(module)
-          else: # if islongrunning
-            snippet = snippet.replace('\n\nEXTRA_DIST', '\nEXTRA_DIST')
-            longrun_snippets += '## begin gnulib module %s\n' % str(module)
-            longrun_snippets += snippet
-            longrun_snippets += '## end gnulib module %s\n' % str(module)
-          
-          # Test whether there are some source files in subdirectories.
-          for file in module.getFiles():
-            if file.startswith('lib/') and file.endswith('.c') and \
-            file.count('/') > 1:
-              uses_subdirs = True
-              break
+    pkgdata = False
+    longrun_modules = list()
+    pattern = compiler('^pkgdata_DATA *\\+=', re.S | re.M)
+    for module, snippet in self._tests_snippets_(modules, for_test):
+      if module.getStatusMask() & STATUS['longrunning-test']:
+        longrun_modules += [module]
+      if pattern.search(snippet):
+        pkgdata = True
+      # Test whether there are some source files in subdirectories.
+      for name in module.getFiles(ac_version):
+        if name.startswith('lib/') and name.endswith('.c') and \
+        name.count('/') > 1:
+          uses_subdirs = True
+          break
+    main_modules = [module for module in modules \
+      if module not in longrun_modules]
     
     # Generate dependencies here, since it eases the debugging of test failures.
     # If there are source files in subdirectories, prevent collision of the
@@ -1043,9 +1087,7 @@ AC_DEFUN([%V1%_LIBSOURCES], [
     #  * http://debbugs.gnu.org/10997
     #  * http://debbugs.gnu.org/11030
     # So we need this workaround.
-    pattern = compiler('^pkgdata_DATA *\\+=', re.S | re.M)
-    if bool(pattern.findall(main_snippets)) or \
-    bool(pattern.findall(longrun_snippets)):
+    if pkgdata:
       emit += 'pkgdata_DATA =\n'
     
     emit += 'EXTRA_DIST =\n'
@@ -1115,11 +1157,16 @@ AC_DEFUN([%V1%_LIBSOURCES], [
     # EXEEXT is defined by AC_PROG_CC through autoconf.
     # srcdir is defined by autoconf and automake.
     emit += "TESTS_ENVIRONMENT += EXEEXT='@EXEEXT@' srcdir='$(srcdir)'\n\n"
-    main_snippets = main_snippets.replace('$(top_srcdir)/build-aux/',
-      '$(top_srcdir)/%s/' % auxdir)
-    longrun_snippets = longrun_snippets.replace('$(top_srcdir)/build-aux/',
-      '$(top_srcdir)/%s/' % auxdir)
-    emit += main_snippets +longrun_snippets
+    for module, snippet in self._tests_snippets_(main_modules, for_test):
+      emit += '## begin gnulib module %s\n' % str(module)
+      emit += snippet.replace('$(top_srcdir)/build-aux/',
+        '$(top_srcdir)/%s/' % auxdir)
+      emit += '## end   gnulib module %s\n\n' % str(module)
+    for module, snippet in self._tests_snippets_(longrun_modules, for_test):
+      emit += '## begin gnulib module %s\n' % str(module)
+      emit += snippet.replace('$(top_srcdir)/build-aux/',
+        '$(top_srcdir)/%s/' % auxdir)
+      emit += '## end gnulib module %s\n' % str(module)
     emit += '# Clean up after Solaris cc.\n'
     emit += 'clean-local:\n'
     emit += '\trm -rf SunWS_cache\n\n'
@@ -1130,9 +1177,65 @@ AC_DEFUN([%V1%_LIBSOURCES], [
     emit += '\t  fi; \\\n'
     emit += '\tdone; \\\n'
     emit += '\t:\n'
-    emit = constants.nlconvert(emit)
-    if type(emit) is bytes:
-      emit = emit.decode(ENCS['default'])
-    result = tuple([emit, uses_subdirs])
+    result = tuple([emit.getvalue(), uses_subdirs])
     return(result)
+  tests_Makefile_am = \
+    GLProfiler.measure('GLEmiter.tests_Makefile_am', tests_Makefile_am)
+
+
 
+#===============================================================================
+# Define GLSink class
+#===============================================================================
+class GLSink(object):
+  '''GLSink is the destination of the text generated by emitters. Every piece
+  of text which is added to the sink is converted to the line endings of this
+  platform and written to the given file at once; if there is no file, pieces
+  are collected in the list and joined only once. So the generated file is
+  never kept in memory as a whole and it is never built by the repeated
+  concatenation of strings. Emitters add the text using += operator.'''
+    
+  def __init__(self, file=None):
+    '''GLSink.__init__(file=None) -> GLSink
+    
+    Create new GLSink instance which writes to the given file object or to
+    the sink which has write method. If file is None, the text is collected
+    and can be obtained using getvalue method.'''
+    if file != None and not hasattr(file, 'write'):
+      raise(TypeError('file must have write method, not %s' % \
+        type(file).__name__))
+    self.file = file
+    self.chunks = list()
+    self.length = 0 # Count of characters which were written
+    
+  def __repr__(self):
+    '''x.__repr__() <==> repr(x)'''
+    result = '<pygnulib.GLSink %s>' % hex(id(self))
+    return(result)
+    
+  def __iadd__(self, text):
+    '''x.__iadd__(y) <==> x += y'''
+    self.write(text)
+    return(self)
+    
+  def write(self, text):
+    '''GLSink.write(text)
+    
+    Convert line endings of the given text and write it to the sink.'''
+    if type(text) is bytes:
+      text = text.decode(ENCS['default'])
+    text = constants.nlconvert(text)
+    self.length += len(text)
+    if self.file != None:
+      self.file.write(text)
+    else: # if self.file == None
+      self.chunks += [text]
+    
+  def getvalue(self):
+    '''GLSink.getvalue() -> string
+    
+    Return the collected text. If sink writes to the file, nothing is
+    collected and empty string is returned.'''
+    result = string().join(self.chunks)
+    self.chunks = [result]
+    return(result)
@@ -9,11 +9,15 @@ import re
 import sys
 import codecs
 import shutil
+import hashlib
 import filecmp
+import threading
 import subprocess as sp
 from . import constants
 from .GLError import GLError
 from .GLConfig import GLConfig
+from .GLModuleDatabase import GLModuleDatabase
+from .GLProfiler import GLProfiler
 
 
 #===============================================================================
@@ -45,6 +49,15 @@ isdir = os.path.isdir
 isfile = os.path.isfile
 normpath = os.path.normpath
 relpath = os.path.relpath
+DIGESTS = dict() # (path, mtime, size) -> digest
+PATCHED = dict() # (original digest, diff digest) -> patched data
+WRITTEN = dict() # temporary file -> (original digest, diff digest)
+LOCK = threading.RLock() # Serializes writes of the temporary files
+MANIFEST = \
+[ # Begin the list of manifest fields
+  'dest', 'source', 'srcmtime', 'srcsize', 'srcdigest', 'transformation',
+  'output', 'destmtime', 'destsize',
+] # Finish the list of manifest fields
 
 
 #===============================================================================
@@ -54,7 +67,7 @@ class GLFileSystem(object):
   '''GLFileSystem class is used to create virtual filesystem, which is based on
   the gnulib directory and directory specified by localdir argument. Its main
   method lookup(file) is used to find file in these directories or combine it
-  using Linux 'patch' utility.'''
+  using the diff file from localdir.'''
   
   def __init__(self, config):
     '''Create new GLFileSystem instance. The only argument is localdir,
@@ -72,45 +85,122 @@ class GLFileSystem(object):
   def lookup(self, name):
     '''GLFileSystem.lookup(name) -> tuple
     
-    Lookup a file in gnulib and localdir directories or combine it using Linux
-    'patch' utility. If file was found, method returns string, else it raises
-    GLError telling that file was not found. Function also returns flag which
-    indicates whether file is a temporary file.
-    GLConfig: localdir.'''
+    Lookup a file in gnulib and localdir directories or combine it using the
+    diff file from localdir. If file was found, method returns string, else it
+    raises GLError telling that file was not found. Function also returns flag
+    which indicates whether file is a temporary file.
+    GLConfig: localdir, tempdir.'''
     if type(name) is bytes or type(name) is string:
       if type(name) is bytes:
         name = name.decode(ENCS['default'])
     else: # if name has not bytes or string type
       raise(TypeError(
-        'name must be a string, not %s' % type(module).__name__))
+        'name must be a string, not %s' % type(name).__name__))
     # If name exists in localdir, then we use it
     path_gnulib = joinpath(DIRS['root'], name)
     path_local = joinpath(self.config['localdir'], name)
     path_diff = joinpath(self.config['localdir'], '%s.diff' % name)
-    path_temp = joinpath(self.config['tempdir'], name)
-    try: # Try to create directories
-      os.makedirs(os.path.dirname(path_temp))
-    except OSError as error:
-      pass # Skip errors if directory exists
-    if isfile(path_temp):
-      os.remove(path_temp)
     if self.config['localdir'] and isfile(path_local):
       result = (path_local, False)
     else: # if path_local does not exist
       if isfile(path_gnulib):
         if self.config['localdir'] and isfile(path_diff):
-          shutil.copy(path_gnulib, path_temp)
-          command = 'patch -s "%s" < "%s"' % (path_temp, path_diff)
-          try: # Try to apply patch
-            sp.check_call(command, shell=True)
-          except sp.CalledProcessError as error:
-            raise(GLError(2, name))
+          path_temp = joinpath(self.config['tempdir'], name)
+          self.patch(name, path_gnulib, path_diff, path_temp)
           result = (path_temp, True)
         else: # if path_diff does not exist
           result = (path_gnulib, False)
       else: # if path_gnulib does not exist
         raise(GLError(1, name))
     return(result)
+  lookup = GLProfiler.measure('GLFileSystem.lookup', lookup)
+    
+  def patch(self, name, original, diff, temp):
+    '''GLFileSystem.patch(name, original, diff, temp)
+    
+    Write the original file patched with the diff file to the temporary file.
+    Unified diffs are applied in-process; 'patch' utility is used only if diff
+    does not apply exactly. Results are memoized by the digests of original
+    and diff for the life of the process and, if module caching is enabled,
+    in the module database, so repeated lookups cost nothing. This method is
+    thread-safe.
+    GLConfig: modcache.'''
+    with LOCK: # Other threads may look up the same file
+      key = tuple([self._digest_(original), self._digest_(diff)])
+      if WRITTEN.get(temp) == key and isfile(temp):
+        return # Temporary file is up to date
+      database = None
+      if self.config['modcache']:
+        path = joinpath(DIRS['cache'], 'modules.db')
+        database = GLModuleDatabase.open(path)
+      data = PATCHED.get(key)
+      if data == None and database != None:
+        data = database.fetch('patch:%s:%s' % key, None)
+      if data == None:
+        GLProfiler.count('patches applied')
+        with open(original, 'rb') as file:
+          data = file.read()
+        with open(diff, 'rb') as file:
+          data = constants.apply_patch(data, file.read())
+        if data == None:
+          data = self._patch_(name, original, diff, temp)
+        if database != None:
+          database.store('patch:%s:%s' % key, None, data)
+        PATCHED[key] = data
+      try: # Try to create directories
+        os.makedirs(os.path.dirname(temp))
+      except OSError as error:
+        pass # Skip errors if directory exists
+      if isfile(temp):
+        os.remove(temp)
+      with open(temp, 'wb') as file:
+        file.write(data)
+      WRITTEN[temp] = key
+      GLProfiler.count('files written')
+      GLProfiler.count('bytes written', len(data))
+  patch = GLProfiler.measure('GLFileSystem.patch', patch)
+    
+  def _patch_(self, name, original, diff, temp):
+    '''GLFileSystem._patch_(name, original, diff, temp) -> bytes
+    
+    Apply diff using 'patch' utility and return the patched data.'''
+    try: # Try to create directories
+      os.makedirs(os.path.dirname(temp))
+    except OSError as error:
+      pass # Skip errors if directory exists
+    if isfile(temp):
+      os.remove(temp)
+    shutil.copy(original, temp)
+    WRITTEN.pop(temp, None)
+    try: # Try to apply patch
+      with open(diff, 'rb') as file:
+        process = sp.Popen(['patch', '-s', temp], stdin=file,
+          stdout=sp.PIPE, stderr=sp.PIPE)
+        stdout, stderr = process.communicate()
+    except Exception as error:
+      raise(GLError(2, name))
+    # Output goes through sys.stdout and sys.stderr, so it is grouped with
+    # the other messages of the import by GLImport.executeAll.
+    sys.stdout.write(stdout.decode(ENCS['shell'], 'replace'))
+    sys.stderr.write(stderr.decode(ENCS['shell'], 'replace'))
+    if process.returncode != 0:
+      raise(GLError(2, name))
+    with open(temp, 'rb') as file:
+      result = file.read()
+    return(result)
+    
+  def _digest_(self, path):
+    '''GLFileSystem._digest_(path) -> string
+    
+    Return SHA-1 digest of the given file. Digests are remembered by path,
+    modification time and size, so unchanged files are read only once.'''
+    stat = os.stat(path)
+    key = tuple([path, getattr(stat, 'st_mtime_ns', stat.st_mtime),
+      stat.st_size])
+    if key not in DIGESTS:
+      with open(path, 'rb') as file:
+        DIGESTS[key] = hashlib.sha1(file.read()).hexdigest()
+    return(DIGESTS[key])
 
 
 #===============================================================================
@@ -119,8 +209,9 @@ class GLFileSystem(object):
 class GLFileAssistant(object):
   '''GLFileAssistant is used to help with file processing.'''
   
-  def __init__(self, config, transformers=dict()):
-    '''Create GLFileAssistant instance.'''
+  def __init__(self, config, transformers=dict(), buffered=False):
+    '''Create GLFileAssistant instance. If buffered is True, messages are not
+    printed but collected, so they can be printed later using getMessages.'''
     if type(config) is not GLConfig:
       raise(TypeError('config must be a GLConfig, not %s' % \
         type(config).__name__))
@@ -138,6 +229,9 @@ class GLFileAssistant(object):
         else: # if value has not bytes or string type
           raise(TypeError('transformers[%s] must be a string, not %s' % \
             (key, type(value).__name__)))
+    if type(buffered) is not bool:
+      raise(TypeError('buffered must be a bool, not %s' % \
+        type(buffered).__name__))
     self.original = None
     self.rewritten = None
     self.added = list()
@@ -145,12 +239,45 @@ class GLFileAssistant(object):
     self.config = config
     self.transformers = transformers
     self.filesystem = GLFileSystem(self.config)
+    self.messages = None
+    if buffered:
+      self.messages = list()
+    self.manifest = None
     
   def __repr__(self):
     '''x.__repr__() <==> repr(x)'''
     result = '<pygnulib.GLFileAssistant %s>' % hex(id(self))
     return(result)
     
+  def _print_(self, message):
+    '''GLFileAssistant._print_(message)
+    
+    Print message or remember it if GLFileAssistant is buffered.'''
+    if self.messages == None:
+      print(message)
+    else: # if self.messages != None
+      self.messages += [message]
+    
+  def setManifest(self, manifest):
+    '''GLFileAssistant.setManifest(manifest)
+    
+    Set GLManifest which is used to skip the files which are up to date and to
+    record the files which were written. None disables the manifest.'''
+    if type(manifest) is not GLManifest and manifest != None:
+      raise(TypeError('manifest must be a GLManifest, not %s' % \
+        type(manifest).__name__))
+    self.manifest = manifest
+    
+  def getMessages(self):
+    '''GLFileAssistant.getMessages() -> list
+    
+    Return the list of messages which were collected and forget them.'''
+    result = list()
+    if self.messages != None:
+      result = list(self.messages)
+      self.messages = list()
+    return(result)
+    
   def tmpfilename(self, path):
     '''GLFileAssistant.tmpfilename() -> string
     
@@ -167,7 +294,11 @@ class GLFileAssistant(object):
       result = joinpath(self.config['destdir'], '%s.tmp' % path)
       dirname = os.path.dirname(result)
       if dirname and not isdir(dirname):
-        os.makedirs(dirname)
+        try: # Try to create directories
+          os.makedirs(dirname)
+        except OSError as error:
+          if not isdir(dirname):
+            raise(error)
     else: # if self.config['dryrun']
       # Put the new contents of $file in a file in a temporary directory
       # (because the directory of "$file" might not exist).
@@ -175,7 +306,11 @@ class GLFileAssistant(object):
       result = joinpath(tempdir, '%s.tmp' % os.path.basename(path))
       dirname = os.path.dirname(result)
       if not isdir(dirname):
-        os.makedirs(dirname)
+        try: # Try to create directories
+          os.makedirs(dirname)
+        except OSError as error:
+          if not isdir(dirname):
+            raise(error)
     if type(result) is bytes:
       result = bytes.decode(ENCS['default'])
     return(result)
@@ -238,7 +373,7 @@ class GLFileAssistant(object):
     elif rewritten == None:
       raise(TypeError('rewritten must be set before applying the method'))
     if not self.config['dryrun']:
-      print('Copying file %s' % rewritten)
+      self._print_('Copying file %s' % rewritten)
       loriginal = joinpath(self.config['localdir'], original)
       if (symbolic or (lsymbolic and lookedup == loriginal)) \
       and not tmpflag and filecmp.cmp(lookedup, tmpfile):
@@ -249,7 +384,7 @@ class GLFileAssistant(object):
         except Exception as error:
           raise(GLError(17, original))
     else: # if self.config['dryrun']
-      print('Copy file %s' % rewritten)
+      self._print_('Copy file %s' % rewritten)
     
   def update(self, lookedup, tmpflag, tmpfile, already_present):
     '''GLFileAssistant.update(lookedup, tmpflag, tmpfile, already_present)
@@ -282,12 +417,13 @@ class GLFileAssistant(object):
     if not filecmp.cmp(basepath, tmpfile):
       if not self.config['dryrun']:
         if already_present:
-          print('Updating file %s (backup in %s)' % (basename, backupname))
+          self._print_('Updating file %s (backup in %s)' % \
+            (basename, backupname))
         else: # if not already_present
           message = 'Replacing file '
           message += '%s (non-gnulib code backed up in ' % basename
           message += '%s) !!' % backupname
-          print(message)
+          self._print_(message)
         if isfile(backuppath):
           os.remove(backuppath)
         try: # Try to replace the given file
@@ -300,16 +436,18 @@ class GLFileAssistant(object):
           constants.link_if_changed(lookedup, basepath)
         else: # if any of these conditions is not met
           try: # Try to move file
-            if exist(basepath):
+            if os.path.lexists(basepath):
               os.remove(basepath)
-            shutil.move(tmpfile, rewritten)
+            shutil.move(tmpfile, basepath)
           except Exception as error:
             raise(GLError(17, original))
       else: # if self.config['dryrun']
         if already_present:
-          print('Update file %s (backup in %s)' % (rewritten, backup))
+          self._print_('Update file %s (backup in %s)' % \
+            (rewritten, backupname))
         else: # if not already_present
-          print('Replace file %s (backup in %s)' % (rewritten, backup))
+          self._print_('Replace file %s (backup in %s)' % \
+            (rewritten, backupname))
     
   def add_or_update(self, already_present):
     '''GLFileAssistant.add_or_update(already_present)
@@ -328,15 +466,10 @@ class GLFileAssistant(object):
     if original.startswith('tests=lib/'):
       xoriginal = constants.substart('tests=lib/', 'lib/', original)
     lookedup, tmpflag = self.filesystem.lookup(xoriginal)
-    tmpfile = self.tmpfilename(rewritten)
     sed_transform_lib_file = self.transformers.get('lib', '')
     sed_transform_build_aux_file = self.transformers.get('aux', '')
     sed_transform_main_lib_file = self.transformers.get('main', '')
     sed_transform_testsrelated_lib_file = self.transformers.get('tests', '')
-    try: # Try to copy lookedup file to tmpfile
-      shutil.copy(lookedup, tmpfile)
-    except Exception as error:
-      raise(GLError(15, lookedup))
     transformer = string()
     if original.startswith('lib/'):
       if sed_transform_main_lib_file:
@@ -347,23 +480,59 @@ class GLFileAssistant(object):
     elif original.startswith('tests=lib/'):
       if sed_transform_testsrelated_lib_file:
         transformer = sed_transform_testsrelated_lib_file
+    # Symbolic links depend on the same options as transformations do.
+    transformation = '%s\n%s\n%s' % (transformer, self.config['symbolic'],
+      self.config['lsymbolic'])
+    transformation = hashlib.sha1(transformation.encode(ENCS['default']))
+    transformation = transformation.hexdigest()
+    path = joinpath(self.config['destdir'], rewritten)
+    if self.manifest != None and not self.config['dryrun'] \
+    and self.manifest.check(rewritten, lookedup, transformation, path):
+      return # Destination file is up to date
+    tmpfile = self.tmpfilename(rewritten)
+    try: # Try to copy lookedup file to tmpfile
+      with open(lookedup, 'rb') as file:
+        data = file.read()
+    except Exception as error:
+      raise(GLError(15, lookedup))
+    GLProfiler.count('files read')
+    GLProfiler.count('bytes read', len(data))
+    original_data = data
+    source = hashlib.sha1(data).hexdigest()
     if transformer:
-      args = ['sed', '-e', transformer]
-      stdin = codecs.open(lookedup, 'rb', 'UTF-8')
       try: # Try to transform file
-        data = sp.check_output(args, stdin=stdin, shell=False)
-        data = data.decode(ENCS['shell'])
+        with GLProfiler.phase('GLFileAssistant.sed'):
+          data = constants.apply_sed(transformer, data)
       except Exception as error:
         raise(GLError(16, lookedup))
-      with codecs.open(tmpfile, 'wb', 'UTF-8') as file:
-        file.write(data)
-    path = joinpath(self.config['destdir'], rewritten)
+    try: # Try to write tmpfile
+      if data != original_data:
+        with open(tmpfile, 'wb') as file:
+          file.write(data)
+        shutil.copymode(lookedup, tmpfile)
+        method = 'write'
+      else: # if file was not transformed
+        # Files which are not patched may be linked instead of copied.
+        method = constants.copy_file(lookedup, tmpfile,
+          self.config['copymode'], not tmpflag)
+    except Exception as error:
+      raise(GLError(15, lookedup))
+    GLProfiler.count('files written')
+    GLProfiler.count('files written by %s' % method)
+    GLProfiler.count('bytes written', len(data))
     if isfile(path):
       self.update(lookedup, tmpflag, tmpfile, already_present)
-      os.remove(tmpfile)
+      if isfile(tmpfile):
+        os.remove(tmpfile)
     else: # if not isfile(path)
       self.add(lookedup, tmpflag, tmpfile)
       self.addFile(rewritten)
+    if self.manifest != None and not self.config['dryrun']:
+      output = hashlib.sha1(data).hexdigest()
+      self.manifest.record(rewritten, lookedup, source, transformation,
+        output, path)
+  add_or_update = \
+    GLProfiler.measure('GLFileAssistant.add_or_update', add_or_update)
     
   def super_update(self, basename, tmpfile):
     '''GLFileAssistant.super_update(basename, tmpfile) -> tuple
@@ -399,3 +568,154 @@ class GLFileAssistant(object):
     result = tuple([basename, backupname, result_flag])
     return(result)
 
+
+#===============================================================================
+# Define GLManifest class
+#===============================================================================
+class GLManifest(object):
+  '''GLManifest is a record of the files written by gnulib-tool. For every
+  destination file it remembers the source file with its modification time,
+  size and digest, the digest of the transformation and the digest of the
+  output together with modification time and size of the destination file.
+  It is used to skip the files whose source, transformation and destination
+  did not change since the last run, so a no-op update only needs stat. The
+  manifest contains absolute paths and timestamps of one gnulib checkout, so
+  it must not be committed; GLImport adds it to .gitignore or .cvsignore.'''
+  
+  def __init__(self, path):
+    '''GLManifest.__init__(path) -> GLManifest
+    
+    Create GLManifest instance and read the existing manifest from the given
+    path, if any. Malformed lines are ignored.'''
+    if type(path) is bytes or type(path) is string:
+      if type(path) is bytes:
+        path = path.decode(ENCS['default'])
+    else: # if path has not bytes or string type
+      raise(TypeError('path must be a string, not %s' % type(path).__name__))
+    self.path = path
+    self.table = dict()
+    self.changed = False
+    if isfile(path):
+      with codecs.open(path, 'rb', 'UTF-8') as file:
+        for line in file:
+          fields = line.rstrip('\n').split('\t')
+          if line.startswith('#') or len(fields) != len(MANIFEST):
+            continue
+          entry = dict(zip(MANIFEST, fields))
+          for key in ['srcmtime', 'srcsize', 'destmtime', 'destsize']:
+            if not entry[key].isdigit():
+              break
+            entry[key] = int(entry[key])
+          else: # if all numbers are valid
+            self.table[entry['dest']] = entry
+    
+  def __repr__(self):
+    '''x.__repr__() <==> repr(x)'''
+    result = '<pygnulib.GLManifest %s>' % hex(id(self))
+    return(result)
+    
+  def _stamp_(self, path):
+    '''GLManifest._stamp_(path) -> tuple
+    
+    Return tuple of modification time and size of the given file or symlink.'''
+    stat = os.lstat(path)
+    mtime = getattr(stat, 'st_mtime_ns', int(stat.st_mtime *1000000000))
+    result = tuple([mtime, stat.st_size])
+    return(result)
+    
+  def _digest_(self, path):
+    '''GLManifest._digest_(path) -> string
+    
+    Return SHA-1 digest of the contents of the given file.'''
+    with open(path, 'rb') as file:
+      result = hashlib.sha1(file.read()).hexdigest()
+    return(result)
+    
+  def check(self, dest, source, transformation, path):
+    '''GLManifest.check(dest, source, transformation, path) -> bool
+    
+    Check whether destination file dest, which is found at path, is up to date:
+    source file has the same contents as recorded, transformation digest is the
+    same and destination still has the recorded output. Files are only read if
+    their modification time or size differ from the recorded ones.'''
+    entry = self.table.get(dest)
+    if entry == None or entry['transformation'] != transformation:
+      return(False)
+    try: # Try to stat files
+      srcstamp = self._stamp_(source)
+      deststamp = self._stamp_(path)
+    except OSError as error:
+      return(False)
+    if source != entry['source'] \
+    or srcstamp != (entry['srcmtime'], entry['srcsize']):
+      if self._digest_(source) != entry['srcdigest']:
+        return(False)
+    if deststamp != (entry['destmtime'], entry['destsize']):
+      if os.path.islink(path) or deststamp[1] != entry['destsize'] \
+      or self._digest_(path) != entry['output']:
+        return(False)
+    # Remember the new stamps, so the next check needs only stat.
+    entry = dict(entry)
+    entry['source'] = source
+    entry['srcmtime'], entry['srcsize'] = srcstamp
+    entry['destmtime'], entry['destsize'] = deststamp
+    if entry != self.table[dest]:
+      self.table[dest] = entry
+      self.changed = True
+    return(True)
+    
+  def record(self, dest, source, srcdigest, transformation, output, path):
+    '''GLManifest.record(dest, source, srcdigest, transformation, output, path)
+    
+    Record that destination file dest, which is found at path, was written
+    from the source file with the given digests of source, transformation and
+    output.'''
+    try: # Try to stat files
+      srcstamp = self._stamp_(source)
+      deststamp = self._stamp_(path)
+    except OSError as error:
+      self.remove(dest)
+      return
+    entry = dict()
+    entry['dest'] = dest
+    entry['source'] = source
+    entry['srcmtime'], entry['srcsize'] = srcstamp
+    entry['srcdigest'] = srcdigest
+    entry['transformation'] = transformation
+    entry['output'] = output
+    entry['destmtime'], entry['destsize'] = deststamp
+    self.table[dest] = entry
+    self.changed = True
+    
+  def remove(self, dest):
+    '''GLManifest.remove(dest)
+    
+    Forget the given destination file.'''
+    if dest in self.table:
+      self.table.pop(dest)
+      self.changed = True
+    
+  def keep(self, files):
+    '''GLManifest.keep(files)
+    
+    Forget all destination files which are not in the given list.'''
+    files = set(files)
+    for dest in sorted(self.table):
+      if dest not in files:
+        self.remove(dest)
+    
+  def save(self):
+    '''GLManifest.save()
+    
+    Write manifest to disk if it was changed.'''
+    if not self.changed:
+      return
+    lines = ['# Generated by gnulib-tool. Do not edit.']
+    for dest in sorted(self.table):
+      entry = self.table[dest]
+      lines += ['\t'.join([string(entry[key]) for key in MANIFEST])]
+    temp = '%s.tmp' % self.path
+    with codecs.open(temp, 'wb', 'UTF-8') as file:
+      file.write('%s\n' % '\n'.join(lines))
+    os.rename(temp, self.path)
+    self.changed = False
@@ -10,8 +10,11 @@ import sys
 import locale
 import codecs
 import shutil
+import hashlib
 import filecmp
+import threading
 import subprocess as sp
+from concurrent import futures
 from . import constants
 from .GLError import GLError
 from .GLConfig import GLConfig
@@ -20,8 +23,11 @@ from .GLModuleSystem import GLModuleTable
 from .GLModuleSystem import GLModuleSystem
 from .GLFileSystem import GLFileSystem
 from .GLFileSystem import GLFileAssistant
+from .GLFileSystem import GLManifest
 from .GLMakefileTable import GLMakefileTable
 from .GLEmiter import GLEmiter
+from .GLEmiter import GLSink
+from .GLProfiler import GLProfiler
 
 
 #===============================================================================
@@ -83,7 +89,6 @@ class GLImport(object):
     # Initialize some values.
     self.cache = GLConfig()
     self.config = config.copy()
-    os.rmdir(self.cache['tempdir'])
     
     # Get cached auxdir and libtool from configure.ac/in.
     self.cache.setAuxDir('.')
@@ -249,8 +254,7 @@ class GLImport(object):
       
       # Update configuration dictionary.
       self.config.update(self.cache)
-      for key in config.keys():
-        value = config[key]
+      for key, value in config.dictionary().items():
         if not config.isdefault(key, value):
           self.config.update_key(config, key)
       self.config.setModules(modules)
@@ -264,7 +268,7 @@ class GLImport(object):
     self.emiter = GLEmiter(self.config)
     self.filesystem = GLFileSystem(self.config)
     self.modulesystem = GLModuleSystem(self.config)
-    self.moduletable = GLModuleTable(self.config, list())
+    self.moduletable = GLModuleTable(self.config, list(), self.modulesystem)
     self.makefiletable = GLMakefileTable(self.config)
     
   def __repr__(self):
@@ -272,6 +276,23 @@ class GLImport(object):
     result = '<pygnulib.GLImport %s>' % hex(id(self))
     return(result)
     
+  def getModuleSystem(self):
+    '''GLImport.getModuleSystem() -> GLModuleSystem
+    
+    Return the module system which is used to find modules.'''
+    return(self.modulesystem)
+    
+  def setModuleSystem(self, modulesystem):
+    '''GLImport.setModuleSystem(modulesystem)
+    
+    Use the given module system, e.g. the one which is shared with other
+    imports, instead of the own one. Must be called before prepare.'''
+    if type(modulesystem) is not GLModuleSystem:
+      raise(TypeError('modulesystem must be a GLModuleSystem, not %s' % \
+        type(modulesystem).__name__))
+    self.modulesystem = modulesystem
+    self.moduletable = GLModuleTable(self.config, list(), self.modulesystem)
+    
   def rewrite_old_files(self, files):
     '''GLImport.rewrite_old_files(files) -> list
     
@@ -530,14 +551,18 @@ gnulib-tool.m4 macro invocations:\n''' % actioncmd
     if type(emit) is bytes:
       emit = emit.decode(ENCS['default'])
     return(constants.nlconvert(emit))
+  gnulib_cache = GLProfiler.measure('GLImport.gnulib_cache', gnulib_cache)
     
-  def gnulib_comp(self, files):
-    '''GLImport.gnulib_comp(files) -> string
+  def gnulib_comp(self, files, file=None):
+    '''GLImport.gnulib_comp(files, file=None) -> string
     
-    Emit the contents of generated $m4base/gnulib-comp.m4 file.
+    Emit the contents of generated $m4base/gnulib-comp.m4 file. If file is
+    given, the contents are written there piece by piece and empty string is
+    returned.
     GLConfig: destdir, localdir, tests, sourcebase, m4base, pobase, docbase,
-    testsbase, conddeps, libtool, macro_prefix, podomain, vc_files.'''
-    emit = string()
+    testsbase, conddeps, libtool, macro_prefix, podomain, vc_files,
+    ac_version.'''
+    emit = GLSink(file)
     assistant = self.assistant
     moduletable = self.moduletable
     destdir = self.config['destdir']
@@ -560,6 +585,7 @@ gnulib-tool.m4 macro invocations:\n''' % actioncmd
     configure_ac = self.config['configure_ac']
     vc_files = self.config['vc_files']
     libtests = self.config['libtests']
+    ac_version = self.config['ac_version']
     modules = [str(module) for module in moduletable['base']]
     avoids = [str(avoid) for avoid in moduletable['avoids']]
     emit += '# DO NOT EDIT! GENERATED AUTOMATICALLY!\n'
@@ -585,7 +611,7 @@ AC_DEFUN([%s_EARLY],
     uses_subdirs = False
     for module in moduletable['main']:
       # Test whether there are some source files in subdirectories.
-      for file in module.getFiles():
+      for file in module.getFiles(ac_version):
         if file.startswith('lib/') and file.endswith('.c') and \
         file.count('/') > 1:
           uses_subdirs = True
@@ -622,8 +648,8 @@ AC_DEFUN([%s_INIT],
       emit += '  m4_pushdef([gl_MODULE_INDICATOR_CONDITION], [%s])\n' % \
         witness_c_macro
     # Emit main autoconf snippets.
-    emit += self.emiter.autoconfSnippets(moduletable['main'],
-      moduletable, assistant, 0, True, False, True, replace_auxdir)
+    self.emiter.autoconfSnippets(moduletable['main'],
+      moduletable, assistant, 0, True, False, True, replace_auxdir, emit)
     if witness_c_macro:
       emit += '  m4_popdef([gl_MODULE_INDICATOR_CONDITION])\n'
     emit += '  # End of code from modules\n'
@@ -647,8 +673,8 @@ abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ | LC_ALL=C sed -e \
     emit += '  m4_pushdef([gl_MODULE_INDICATOR_CONDITION], '
     emit += '[$gl_module_indicator_condition])\n'
     # Emit tests autoconf snippets.
-    emit += self.emiter.autoconfSnippets(moduletable['tests'],
-      moduletable, assistant, 0, True, True, True, replace_auxdir)
+    self.emiter.autoconfSnippets(moduletable['tests'],
+      moduletable, assistant, 0, True, True, True, replace_auxdir, emit)
     emit += '  m4_popdef([gl_MODULE_INDICATOR_CONDITION])\n'
     emit += self.emiter.initmacro_end('%stests' % macro_prefix)
     # _LIBDEPS and _LTLIBDEPS variables are not needed if this library is
@@ -671,9 +697,8 @@ abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ | LC_ALL=C sed -e \
 AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
     emit += '  %s\n' % '\n  '.join(files)
     emit += '])\n'
-    if type(emit) is bytes:
-      emit = emit.decode(ENCS['default'])
-    return(emit)
+    return(emit.getvalue())
+  gnulib_comp = GLProfiler.measure('GLImport.gnulib_comp', gnulib_comp)
     
   def _done_dir_(self, directory, dirs_added, dirs_removed):
     '''GLImport._done_dir_(directory, dirs_added, dirs_removed)
@@ -711,9 +736,10 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
         dirs_ignore = sorted(set(srcdata.split('\n')))
         dirs_ignore = [line for line in dirs_ignore if line.strip()]
         srcdata = '\n'.join(sorted(set(dirs_ignore))).strip()
+        dirs_added = ['%s%s' % (anchor, d) for d in dirs_added]
+        dirs_removed = ['%s%s' % (anchor, d) for d in dirs_removed]
         dirs_ignore += [d for d in dirs_added if d not in dirs_ignore]
-        dirs_ignore = [d for d in dirs_ignore if d in dirs_removed]
-        dirs_ignore = ['%s%s' % (anchor, d) for d in dirs_ignore]
+        dirs_ignore = [d for d in dirs_ignore if d not in dirs_removed]
         dirs_ignore = sorted(set(dirs_ignore))
         destdata = '\n'.join(sorted(set(dirs_ignore))).strip()
         if srcdata != destdata:
@@ -723,6 +749,7 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
             result = string()
             with codecs.open(srcpath, 'wb', 'UTF-8') as file:
               file.write(destdata)
+              file.write('\n')
           else: # if self.config['dryrun']
             print('Updating %s (backup in %s)' % (srcpath, backupname))
     else: # if not isfile(srcpath)
@@ -738,6 +765,190 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
             file.write('\n')
         else: # if self.config['dryrun']
           print('Create %s' % srcpath)
+  _update_ignorelist_ = \
+    GLProfiler.measure('GLImport._update_ignorelist_', _update_ignorelist_)
+    
+  def _add_or_update_(self, tasks, transformers):
+    '''GLImport._add_or_update_(tasks, transformers) -> list
+    
+    Add or update files, where every task is a tuple of the rewritten file
+    name, the original file name and the already_present flag. If more than
+    one job is allowed, lookups, transformations, comparisons and writes are
+    done concurrently, every task with its own GLFileAssistant; the messages
+    are printed in the order of tasks anyway. Return the list of added files.
+    GLConfig: jobs.'''
+    jobs = self.config['jobs']
+    if jobs == 1 or len(tasks) < 2:
+      for rewritten, original, already_present in tasks:
+        self.assistant.setOriginal(original)
+        self.assistant.setRewritten(rewritten)
+        self.assistant.add_or_update(already_present)
+      result = self.assistant.getFiles()
+      return(result)
+    # Output which the worker threads write, e.g. of patch, belongs to the
+    # output of this import.
+    captures = [tuple([stream, stream.getCapture()]) \
+      for stream in [sys.stdout, sys.stderr] if type(stream) is GLOutput]
+    def process(task):
+      rewritten, original, already_present = task
+      for stream, chunks in captures:
+        stream.setCapture(chunks)
+      assistant = GLFileAssistant(self.config, transformers, True)
+      assistant.setManifest(self.assistant.manifest)
+      assistant.setOriginal(original)
+      assistant.setRewritten(rewritten)
+      assistant.add_or_update(already_present)
+      return(assistant)
+    result = list()
+    with futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+      for assistant in executor.map(process, tasks):
+        for message in assistant.getMessages():
+          print(message)
+        result += assistant.getFiles()
+    return(result)
+  _add_or_update_ = \
+    GLProfiler.measure('GLImport._add_or_update_', _add_or_update_)
+    
+  def _closure_(self, base_modules):
+    '''GLImport._closure_(base_modules) -> tuple
+    
+    Return the final module list, the main module list and the tests-related
+    module list. If module caching is enabled, these lists are stored in the
+    module database with the dependencies and the stamps of every module file
+    which was used, keyed by the relevant configuration. If nothing changed
+    since the last run, the stored lists are used as is; otherwise only the
+    changed modules are parsed again, and the stored dependencies of the other
+    modules are reused. Licenses and notices of the main modules are stored
+    too, so the license check and the notices of prepare() do not need the
+    module descriptions of the unchanged modules. Lists are always computed
+    again for conddeps, since the transitive closure also records the
+    conditions. Stored lists of the configurations which are not used anymore
+    are dropped by the database.
+    GLConfig: localdir, avoids, testflags, conddeps, modcache.'''
+    database = self.modulesystem.getDatabase()
+    if database != None:
+      fingerprint = \
+      [ # Begin the list of the relevant configuration
+        DIRS['root'], self.config['localdir'],
+        sorted([str(module) for module in base_modules]),
+        sorted([str(module) for module in self.moduletable.getAvoids()]),
+        sorted(set(self.config['testflags'])), self.config['conddeps'],
+      ] # Finish the list of the relevant configuration
+      fingerprint = repr(fingerprint).encode(ENCS['default'])
+      key = 'closure:%s' % hashlib.sha1(fingerprint).hexdigest()
+      state = database.fetch(key, None)
+      if state != None and 'licenses' not in state:
+        state = None # Closure was stored without licenses and notices
+      if state != None:
+        find = self.modulesystem.find
+        stamps = state['stamps']
+        changed = [name for name in stamps \
+          if self.modulesystem.getStamp(name) != stamps[name]]
+        for name in state['licenses']:
+          if name not in changed:
+            module = find(name)
+            module.cache['license'] = state['licenses'][name]
+            module.cache['notice'] = state['notices'][name]
+        if not changed and not self.config['conddeps']:
+          result = tuple([[find(name) for name in state[part]] \
+            for part in ['final', 'main', 'tests']])
+          return(result)
+        # Stored state may be shared, so it is never modified.
+        edges = dict(state['edges'])
+        for name in changed:
+          edges.pop(name, None)
+        self.moduletable.setEdges(edges)
+    final_modules = self.moduletable.transitive_closure(base_modules)
+    main_modules, tests_modules = \
+      self.moduletable.transitive_closure_separately(base_modules,
+        final_modules)
+    if database != None:
+      # Dummy module may be added to the main modules later.
+      licensed = [str(module) for module in main_modules]
+      if self.modulesystem.exists('dummy'):
+        licensed += ['dummy']
+      edges = self.moduletable.getEdges()
+      names = set(edges)
+      names.update(licensed)
+      for name in edges:
+        if not name.endswith('-tests'):
+          names.add('%s-tests' % name)
+        names.update([depmodule for depmodule, condition in edges[name]])
+      state = dict()
+      state['stamps'] = \
+        dict([(name, self.modulesystem.getStamp(name)) for name in names])
+      state['edges'] = edges
+      state['final'] = [str(module) for module in final_modules]
+      state['main'] = [str(module) for module in main_modules]
+      state['tests'] = [str(module) for module in tests_modules]
+      state['licenses'] = dict()
+      state['notices'] = dict()
+      for name in licensed:
+        module = self.modulesystem.find(name)
+        state['licenses'][name] = module.getLicense_Raw()
+        state['notices'][name] = module.getNotice()
+      database.store(key, None, state)
+    result = tuple([final_modules, main_modules, tests_modules])
+    return(result)
+  _closure_ = GLProfiler.measure('GLImport._closure_', _closure_)
+    
+  def sed_transformers(lgpl, copyrights, config_h):
+    '''GLImport.sed_transformers(lgpl, copyrights, config_h) -> dict
+    
+    Return sed scripts which prepare() applies to the imported files: 'lib'
+    for library files, 'main' for library files of the main modules, 'tests'
+    for library files which go into testsbase and 'aux' for auxiliary files.
+    The scripts change the license notices according to lgpl and copyrights;
+    if config_h is True, they also replace the HAVE_CONFIG_H conditionals.'''
+    # Determine script to apply to imported library files.
+    lgpl2gpl = '''
+      s/GNU Lesser General/GNU General/g
+      s/Lesser General Public License/General Public License/g
+      s/GNU Library General/GNU General/g
+      s/Library General Public License/General Public License/g
+      s/version 2\\(.1\\)\\{0,1\\}\\([ ,]\\)/version 3\\2/g'''
+    sed_transform_lib_file = string()
+    if config_h:
+      sed_transform_lib_file += '''
+        s/^#ifdef[\t ]*HAVE_CONFIG_H[\t ]*$/#if 1/
+      '''
+    sed_transform_main_lib_file = sed_transform_lib_file
+    if copyrights:
+      if lgpl: # if lgpl is enabled
+        if lgpl == 3:
+          sed_transform_main_lib_file += '''
+            s/GNU General/GNU Lesser General/g
+            s/General Public License/Lesser General Public License/g
+            s/Lesser Lesser General Public License/Lesser General Public''' \
+              +' License/g'
+        elif lgpl == 2:
+          sed_transform_main_lib_file += '''
+            s/GNU General/GNU Lesser General/g
+            s/General Public License/Lesser General Public License/g
+            s/Lesser Lesser General Public License/Lesser General Public''' \
+              +''' License/g
+            s/version [23]\\([ ,]\\)/version 2.1\\1/g'''
+      else: # if lgpl is disabled
+        sed_transform_main_lib_file += lgpl2gpl
+
+    # Determine script to apply to auxiliary files that go into $auxdir/.
+    sed_transform_build_aux_file = string()
+    if copyrights:
+      sed_transform_build_aux_file += lgpl2gpl
+
+    # Determine script to apply to library files that go into $testsbase/.
+    sed_transform_testsrelated_lib_file = sed_transform_lib_file
+    if copyrights:
+      sed_transform_testsrelated_lib_file += lgpl2gpl
+    
+    # Construct transformers.
+    transformers = dict()
+    transformers['lib'] = string(sed_transform_lib_file)
+    transformers['aux'] = string(sed_transform_build_aux_file)
+    transformers['main'] = string(sed_transform_main_lib_file)
+    transformers['tests'] = string(sed_transform_testsrelated_lib_file)
+    return(transformers)
+  sed_transformers = staticmethod(sed_transformers)
     
   def prepare(self):
     '''Make all preparations before the execution of the code.
@@ -771,7 +982,7 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
     
     # Perform transitive closure.
     self.moduletable.setAvoids(avoids)
-    final_modules = self.moduletable.transitive_closure(base_modules)
+    final_modules, main_modules, tests_modules = self._closure_(base_modules)
     
     # Show final module list.
     if verbose >= 0:
@@ -788,11 +999,6 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
         else: # if str(module) not in self.config.getModules()
           print('    %s' % module)
     
-    # Separate modules into main_modules and tests_modules.
-    modules = self.moduletable.transitive_closure_separately(
-      base_modules, final_modules)
-    main_modules, tests_modules = modules
-    
     # Transmit base_modules, final_modules, main_modules and tests_modules.
     self.moduletable.setBaseModules(base_modules)
     self.moduletable.setFinalModules(final_modules)
@@ -811,7 +1017,7 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
     # Determine whether a $testsbase/libtests.a is needed.
     libtests = False
     for module in tests_modules:
-      files = module.getFiles()
+      files = module.getFiles(ac_version)
       for file in files:
         if file.startswith('lib/'):
           libtests = True
@@ -832,18 +1038,19 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
       'unmodifiable license text']
     compatibilities[3] = ['LGPL', 'LGPLv2+', 'LGPLv3+']
     compatibilities[2] = ['LGPLv2+']
-    if lgpl:
-      for module in main_modules:
-        license = module.getLicense()
-        if license not in compatibilities['all']:
-          if lgpl == 3 or lgpl == True:
-            if license not in compatibilities[3]:
-              listing.append(tuple([str(module), license]))
-          elif lgpl == 2:
-            if license not in compatibilities[2]:
-              listing.append(tuple([str(module), license]))
-      if listing:
-        raise(GLError(11, listing))
+    with GLProfiler.phase('GLImport.license'):
+      if lgpl:
+        for module in main_modules:
+          license = module.getLicense(self.config['errors'])
+          if license not in compatibilities['all']:
+            if lgpl == 3 or lgpl == True:
+              if license not in compatibilities[3]:
+                listing.append(tuple([str(module), license]))
+            elif lgpl == 2:
+              if license not in compatibilities[2]:
+                listing.append(tuple([str(module), license]))
+        if listing:
+          raise(GLError(11, listing))
     
     # Print notices from modules.
     for module in main_modules:
@@ -855,46 +1062,9 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
         notice = pattern.sub('  \\1', notice)
         print(notice)
 
-    # Determine script to apply to imported library files.
-    lgpl2gpl = '''
-      s/GNU Lesser General/GNU General/g
-      s/Lesser General Public License/General Public License/g
-      s/GNU Library General/GNU General/g
-      s/Library General Public License/General Public License/g
-      s/version 2\\(.1\\)\\{0,1\\}\\([ ,]\\)/version 3\\2/g'''
-    sed_transform_lib_file = string()
-    if 'config-h' in [str(module) for module in main_modules]:
-      sed_transform_lib_file += '''
-        s/^#ifdef[\t ]*HAVE_CONFIG_H[\t ]*$/#if 1/
-      '''
-    sed_transform_main_lib_file = sed_transform_lib_file
-    if copyrights:
-      if lgpl: # if lgpl is enabled
-        if lgpl == 3:
-          sed_transform_main_lib_file += '''
-            s/GNU General/GNU Lesser General/g
-            s/General Public License/Lesser General Public License/g
-            s/Lesser Lesser General Public License/Lesser General Public''' \
-              +' License/g'
-        elif lgpl == 2:
-          sed_transform_main_lib_file += '''
-            s/GNU General/GNU Lesser General/g
-            s/General Public License/Lesser General Public License/g
-            s/Lesser Lesser General Public License/Lesser General Public''' \
-              +'''License/g
-            s/version [23]\\([ ,]\\)/version 2.1\\1/g'''
-      else: # if lgpl is disabled
-        sed_transform_main_lib_file += lgpl2gpl
-
-    # Determine script to apply to auxiliary files that go into $auxdir/.
-    sed_transform_build_aux_file = string()
-    if copyrights:
-      sed_transform_build_aux_file += lgpl2gpl
-
-    # Determine script to apply to library files that go into $testsbase/.
-    sed_transform_testsrelated_lib_file = sed_transform_lib_file
-    if copyrights:
-      sed_transform_testsrelated_lib_file += lgpl2gpl
+    # Determine scripts to apply to imported files.
+    config_h = 'config-h' in [str(module) for module in main_modules]
+    transformers = self.sed_transformers(lgpl, copyrights, config_h)
     
     # Determine the final file lists.
     main_filelist, tests_filelist = \
@@ -921,12 +1091,7 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
     if isfile(path):
       old_files += [joinpath('m4', 'gnulib-tool.m4')]
     
-    # Construct tables and transformers.
-    transformers = dict()
-    transformers['lib'] = string(sed_transform_lib_file)
-    transformers['aux'] = string(sed_transform_build_aux_file)
-    transformers['main'] = string(sed_transform_main_lib_file)
-    transformers['tests'] = string(sed_transform_testsrelated_lib_file)
+    # Construct tables.
     old_table = list()
     new_table = list()
     for src in old_files:
@@ -951,6 +1116,7 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
     # Return the result.
     result = tuple([filetable, transformers])
     return(result)
+  prepare = GLProfiler.measure('GLImport.prepare', prepare)
     
   def execute(self, filetable, transformers):
     '''Perform operations on the lists of files, which are given in a special
@@ -1008,8 +1174,11 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
         else: # if self.config['dryrun']
           print('Create directory %s' % directory)
     
-    # Create GLFileAssistant instance to process files.
+    # Create GLFileAssistant instance to process files. The manifest of the
+    # previous run is used to skip the files which are up to date.
     self.assistant = GLFileAssistant(self.config, transformers)
+    manifest = GLManifest(joinpath(destdir, m4base, 'gnulib-manifest'))
+    self.assistant.setManifest(manifest)
     
     # Files which are in filetable['old'] and not in filetable['new'].
     # They will be removed and added to filetable['removed'] list.
@@ -1037,29 +1206,28 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
     already_present = False
     pairs = [f for f in filetable['new'] if f not in filetable['old']]
     pairs = sorted(set(pairs))
-    for pair in pairs:
-      original = pair[1]
-      rewritten = pair[0]
-      self.assistant.setOriginal(original)
-      self.assistant.setRewritten(rewritten)
-      self.assistant.add_or_update(already_present)
+    tasks = [tuple([pair[0], pair[1], already_present]) for pair in pairs]
     
     # Files which are in filetable['new'] and in filetable['old'].
     # They will be added/updated and added to filetable['added'] list.
     already_present = True
     pairs = [f for f in filetable['new'] if f in filetable['old']]
     pairs = sorted(set(pairs))
-    for pair in pairs:
-      original = pair[1]
-      rewritten = pair[0]
-      self.assistant.setOriginal(original)
-      self.assistant.setRewritten(rewritten)
-      self.assistant.add_or_update(already_present)
+    tasks += [tuple([pair[0], pair[1], already_present]) for pair in pairs]
     
     # Add files which were added to the list of filetable['added'].
-    filetable['added'] += self.assistant.getFiles()
+    filetable['added'] += self._add_or_update_(tasks, transformers)
     filetable['added'] = sorted(set(filetable['added']))
     
+    # Update the manifest of the written files. Manifest refers to the local
+    # gnulib checkout, so it is ignored by version control like the copied
+    # files, unlike gnulib-cache.m4.
+    manifest.keep([pair[0] for pair in filetable['new']])
+    if not self.config['dryrun']:
+      if not isfile(manifest.path):
+        filetable['added'] += [joinpath(m4base, 'gnulib-manifest')]
+      manifest.save()
+    
     # Determine include_guard_prefix.
     include_guard_prefix = self.config['include_guard_prefix']
     
@@ -1095,11 +1263,10 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
     # Create library makefile.
     basename = joinpath(sourcebase, makefile_am)
     tmpfile = self.assistant.tmpfilename(basename)
-    emit, uses_subdirs = self.emiter.lib_Makefile_am(basename,
-      self.moduletable['main'], self.moduletable, self.makefiletable,
-      actioncmd, for_test)
     with codecs.open(tmpfile, 'wb', 'UTF-8') as file:
-      file.write(emit)
+      emit, uses_subdirs = self.emiter.lib_Makefile_am(basename,
+        self.moduletable['main'], self.moduletable, self.makefiletable,
+        actioncmd, for_test, file)
     filename, backup, flag = self.assistant.super_update(basename, tmpfile)
     if flag == 1:
         if not self.config['dryrun']:
@@ -1123,7 +1290,7 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
         tmpfile = self.assistant.tmpfilename(joinpath(pobase, file))
         path = joinpath('build-aux', 'po', file)
         lookedup, flag = filesystem.lookup(path)
-        shutil.move(lookedup, tmpfile)
+        shutil.copy(lookedup, tmpfile)
         basename = joinpath(pobase, file)
         filename, backup, flag = self.assistant.super_update(basename, tmpfile)
         if flag == 1:
@@ -1187,17 +1354,22 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
       TP_RSYNC_URI = 'translationproject.org::tp/latest/'
       if not self.config['dryrun']:
         print('Fetching gnulib PO files from %s' % TP_URL)
-        os.chdir(joinpath(destdir, pobase))
+        podir = joinpath(destdir, pobase)
         cmd = 'if type rsync 2>/dev/null | grep / > /dev/null; '
         cmd += 'then echo 1; else echo 0; fi'
         result = sp.check_output(cmd, shell=True)
         result = bool(int(result))
         if result: # use rsync
-          args = ['rsync', '-Lrtz', '%sgulib/' % TP_RSYNC_URI, '.']
+          args = ['rsync', '-Lrtz', '%sgnulib/' % TP_RSYNC_URI, '.']
         else: # use wget
-          args = ['wget', '--quiet', '-r', '-l1', '-nd', '-np', 'A.po',
-            '%sgnulib' % TP_URL]
-        sp.call(args, shell=True)
+          args = ['wget', '--quiet', '-r', '-l1', '-nd', '-np', '-A.po',
+            '%sgnulib/' % TP_URL]
+        process = sp.Popen(args, cwd=podir, stdout=sp.PIPE, stderr=sp.PIPE)
+        stdout, stderr = process.communicate()
+        # Output goes through sys.stdout and sys.stderr, so it is grouped
+        # with the other messages of this import by executeAll.
+        sys.stdout.write(stdout.decode(ENCS['shell'], 'replace'))
+        sys.stderr.write(stderr.decode(ENCS['shell'], 'replace'))
       else: # if self.config['dryrun']
         print('Fetch gnulib PO files from %s' % TP_URL)
       
@@ -1256,9 +1428,12 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
     # Create m4/gnulib-comp.m4.
     basename = joinpath(m4base, 'gnulib-comp.m4')
     tmpfile = self.assistant.tmpfilename(basename)
-    emit = self.gnulib_comp(filetable['all'])
     with codecs.open(tmpfile, 'wb', 'UTF-8') as file:
-      file.write(emit)
+      self.gnulib_comp(filetable['all'], file)
+    if self.config['dryrun']:
+      # Contents of the new file are shown, since it will not be created.
+      with codecs.open(tmpfile, 'rb', 'UTF-8') as file:
+        emit = file.read()
     filename, backup, flag = self.assistant.super_update(basename, tmpfile)
     if flag == 1:
       if not self.config['dryrun']:
@@ -1283,11 +1458,10 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
     if inctests:
       basename = joinpath(testsbase, makefile_am)
       tmpfile = self.assistant.tmpfilename(basename)
-      emit, uses_subdirs = self.emiter.lib_Makefile_am(basename,
-        self.moduletable['tests'], self.moduletable, self.makefiletable,
-        actioncmd, for_test)
       with codecs.open(tmpfile, 'wb', 'UTF-8') as file:
-        file.write(emit)
+        emit, uses_subdirs = self.emiter.lib_Makefile_am(basename,
+          self.moduletable['tests'], self.moduletable, self.makefiletable,
+          actioncmd, for_test, file)
       filename, backup, flag = self.assistant.super_update(basename, tmpfile)
       if flag == 1:
         if not self.config['dryrun']:
@@ -1306,7 +1480,7 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
     # Update the .cvsignore and .gitignore files.
     ignorelist = list()
     filetable['added'] = sorted(set(filetable['added']))
-    filetable['removed'] = sorted(set(filetable['added']))
+    filetable['removed'] = sorted(set(filetable['removed']))
     for file in filetable['added']:
       directory, basename = os.path.split(file)
       ignorelist += [tuple([directory, '|A|', basename])]
@@ -1316,7 +1490,7 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
     last_dir = string()
     last_dirs_added = list()
     last_dirs_removed = list()
-    for row in ignorelist:
+    for row in sorted(ignorelist):
       next_dir = row[0]
       operand = row[1]
       filename = row[2]
@@ -1330,7 +1504,10 @@ AC_DEFUN([%s_FILE_LIST], [\n''' % macro_prefix
       elif operand == '|R|':
         last_dirs_removed += [filename]
     self._done_dir_(last_dir, last_dirs_added, last_dirs_removed)
-    exit()
+    # Return instead of exiting, so that the caller can go on with the next
+    # import; the final messages below are not ported yet.
+    self.config.removeTempDir()
+    return
     
     # Finish the work.
     print('Finished.\n')
@@ -1419,5 +1596,154 @@ in <library>_a_LDFLAGS or <library>_la_LDFLAGS when linking a library.''')
       (macro_prefix, configure_ac, position_early_after))
     print('  - invoke %s_INIT in %s.' % \
       (macro_prefix, configure_ac))
-    sp.call(['rm', '-rf', self.config['tempdir']], shell=False)
+    self.config.removeTempDir()
+  execute = GLProfiler.measure('GLImport.execute', execute)
+    
+  def executeAll(configs, mode):
+    '''GLImport.executeAll(configs, mode)
+    
+    Perform the import for every given configuration, e.g. for every m4base
+    which --update found in the package. Imports which use the same local
+    directory share one module system, so every module is found and parsed
+    only once; patched files are shared by all imports anyway. Shared modules
+    get the values which differ between imports, like macro_prefix, auxdir
+    and ac_version, from their callers. Up to jobs imports run concurrently
+    and the rest of jobs is shared between them for copying files. Messages
+    of every import are collected and printed as one group, in the order of
+    configurations; output of the commands which an import runs, like patch
+    and the PO fetch, is collected too. If some import fails, the error is
+    raised after all groups are printed.
+    GLConfig: localdir, modcache, errors, jobs.'''
+    importers = [GLImport(config, mode) for config in configs]
+    if not importers:
+      return
+    modulesystems = dict()
+    for importer in importers:
+      config = importer.config
+      key = importer.getModuleSystem()._key_()
+      if key not in modulesystems:
+        # Shared module system has its own temporary directory, since every
+        # import removes its directory when it is done.
+        config = config.copy()
+        config.resetTempDir()
+        modulesystems[key] = GLModuleSystem(config)
+      importer.setModuleSystem(modulesystems[key])
+    jobs = min([importer.config['jobs'] for importer in importers])
+    workers = max(1, min(jobs, len(importers)))
+    try: # Try to perform imports
+      if workers == 1:
+        for importer in importers:
+          filetable, transformers = importer.prepare()
+          importer.execute(filetable, transformers)
+        return
+      stdout = GLOutput(sys.stdout)
+      stderr = GLOutput(sys.stderr)
+      def process(importer):
+        stdout.capture()
+        stderr.capture()
+        error = None
+        try: # Try to perform import
+          filetable, transformers = importer.prepare()
+          importer.execute(filetable, transformers)
+        except Exception as exception:
+          error = exception
+        return(tuple([stdout.release(), stderr.release(), error]))
+      for importer in importers:
+        importer.config.setJobs(max(1, jobs // workers))
+      errors = list()
+      sys.stdout, sys.stderr = stdout, stderr
+      try: # Try to run imports in threads
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+          for output, messages, error in executor.map(process, importers):
+            stdout.stream.write(output)
+            stdout.stream.flush()
+            stderr.stream.write(messages)
+            stderr.stream.flush()
+            if error != None:
+              errors += [error]
+      finally: # Restore standard streams
+        sys.stdout, sys.stderr = stdout.stream, stderr.stream
+      if errors:
+        raise(errors[0])
+    finally: # Remove temporary directories of shared module systems
+      for modulesystem in modulesystems.values():
+        modulesystem.config.removeTempDir()
+  executeAll = staticmethod(executeAll)
+
 
+#===============================================================================
+# Define GLOutput class
+#===============================================================================
+class GLOutput(object):
+  '''GLOutput replaces the standard output or error while several imports run
+  concurrently. Text written by the thread which captures its output is kept
+  aside until the thread releases it, so the output of every import can be
+  printed as one group; text written by other threads goes directly to the
+  original stream.'''
+    
+  def __init__(self, stream):
+    '''GLOutput.__init__(stream) -> GLOutput
+    
+    Create new GLOutput instance which wraps the given stream.'''
+    self.stream = stream
+    self.local = threading.local()
+    
+  def __repr__(self):
+    '''x.__repr__ <==> repr(x)'''
+    result = '<pygnulib.GLOutput %s>' % hex(id(self))
+    return(result)
+    
+  def __getattr__(self, name):
+    '''x.__getattr__(name) <==> x.name'''
+    return(getattr(self.stream, name))
+    
+  def capture(self):
+    '''GLOutput.capture()
+    
+    Start collecting the text written by the current thread.'''
+    self.local.chunks = list()
+    
+  def release(self):
+    '''GLOutput.release() -> string
+    
+    Stop collecting the text written by the current thread and return it.'''
+    chunks = getattr(self.local, 'chunks', None)
+    self.local.chunks = None
+    result = string().join(chunks or list())
+    return(result)
+    
+  def getCapture(self):
+    '''GLOutput.getCapture() -> list or None
+    
+    Return the list which collects the text written by the current thread or
+    None if the current thread does not capture its output.'''
+    result = getattr(self.local, 'chunks', None)
+    return(result)
+    
+  def setCapture(self, chunks):
+    '''GLOutput.setCapture(chunks)
+    
+    Collect the text written by the current thread into the given list, which
+    was returned by getCapture in another thread; if chunks is None, write the
+    text to the original stream. This way the worker threads of an import add
+    their output to the output of the import.'''
+    self.local.chunks = chunks
+    
+  def write(self, text):
+    '''GLOutput.write(text) -> int
+    
+    Write text to the original stream or collect it, if the current thread
+    captures its output.'''
+    chunks = getattr(self.local, 'chunks', None)
+    if chunks == None:
+      return(self.stream.write(text))
+    chunks += [text]
+    return(len(text))
+    
+  def flush(self):
+    '''GLOutput.flush()
+    
+    Flush the original stream, unless the current thread captures its
+    output.'''
+    if getattr(self.local, 'chunks', None) == None:
+      self.stream.flush()
@@ -131,6 +131,8 @@ Usage: gnulib-tool --list
        gnulib-tool --extract-applicability module
        gnulib-tool --extract-filelist module
        gnulib-tool --extract-dependencies module
+       gnulib-tool --extract-dependents module
+       gnulib-tool --extract-recursive-dependents module
        gnulib-tool --extract-autoconf-snippet module
        gnulib-tool --extract-automake-snippet module
        gnulib-tool --extract-include-directive module
@@ -138,12 +140,16 @@ Usage: gnulib-tool --list
        gnulib-tool --extract-license module
        gnulib-tool --extract-maintainer module
        gnulib-tool --extract-tests-module module
+       gnulib-tool --extract-json [--fields=field1,...,fieldN] [module1 ...]
        gnulib-tool --copy-file file [destination]
+       gnulib-tool --server socket
 
 Operation modes:
 
       --list                print the available module names
-      --find                find the modules which contain the specified file
+      --find                find the modules which contain the specified file;
+                            filename may be a directory name ending with '/'
+                            or a wildcard pattern like 'lib/*printf*'
       --import              import the given modules into the current package
       --add-import          augment the list of imports from gnulib into the
                             current package, by adding the given modules;
@@ -171,6 +177,11 @@ Operation modes:
       --extract-applicability      extract the applicability
       --extract-filelist           extract the list of files
       --extract-dependencies       extract the dependencies
+      --extract-dependents         extract the modules which depend on the
+                                   given module
+      --extract-recursive-dependents
+                                   extract the modules which depend on the
+                                   given module directly or indirectly
       --extract-autoconf-snippet   extract the snippet for configure.ac
       --extract-automake-snippet   extract the snippet for library makefile
       --extract-include-directive  extract the #include directive
@@ -179,7 +190,14 @@ Operation modes:
                                    under lib/
       --extract-maintainer         report the maintainer(s) inside gnulib
       --extract-tests-module       report the unit test module, if it exists
+      --extract-json               report the given fields of every given
+                                   module, all modules by default, as one
+                                   JSON object per line
       --copy-file                  copy a file that is not part of any module
+      --server              serve the requests over the given Unix socket;
+                            gnulib-tool forwards its arguments to the server
+                            if GNULIB_TOOL_SOCKET environment variable is set
+                            to the path of the socket
       --help                Show this help text.
       --version             Show version and authorship information.
 
@@ -195,10 +213,21 @@ General options:
       --no-cache-modules    Disable module caching optimization.
       --verbose             Increase verbosity. May be repeated.
       --quiet               Decrease verbosity. May be repeated.
+      --profile             Print wall time and CPU time of every phase and
+                            the counts of subprocesses, files and bytes read
+                            and written to the standard error at exit.
+      --trace=FILE          Write the phases to FILE as Chrome trace events in
+                            JSON format, e.g. for chrome://tracing or Perfetto.
 
 Options for --import, --add/remove-import, --update:
 
       --dry-run             Only print what would have been done.
+      --jobs=N              Copy and transform up to N files concurrently;
+                            for --update of a package with several m4 base
+                            directories, update up to N of them concurrently;
+                            for --create-megatestdir and --megatest, create
+                            up to N scratch packages concurrently.
+                            If N is 0, use the number of processors.
 
 Options for --import, --add/remove-import,
             --create-[mega]testdir, --[mega]test:
@@ -274,12 +303,40 @@ Options for --create-[mega]testdir, --[mega]test:
       --single-configure    Generate a single configure file, not a separate
                             configure file for the tests directory.
 
+Options for --extract-json:
+
+      --fields=LIST         Report only the given comma-separated fields:
+                            name, description, comment, status, notice,
+                            applicability, files, dependencies,
+                            autoconf-early, autoconf, automake, include, link,
+                            license, maintainer and tests-module.
+
+Options for --test, --megatest:
+
+      --results=FILE        Save wall time and exit status of every configure,
+                            make, make check and make distclean run to FILE
+                            in JSON format. The scratch packages are tested
+                            concurrently as far as --jobs allows; the rest of
+                            the jobs is passed to make as -j option.
+
+Options for --megatest, --create-megatestdir:
+
+      --config-cache        Share the configure cache between the scratch
+                            packages of --megatest and do-autobuild script of
+                            --create-megatestdir, so every feature test is run
+                            only once.
+
 Options for --import, --add/remove-import, --update,
             --create-[mega]testdir, --[mega]test:
 
   -s, --symbolic, --symlink Make symbolic links instead of copying files.
       --local-symlink       Make symbolic links instead of copying files, only
                             for files from the local override directory.
+      --copy-mode=MODE      Copy files in the given way: 'reflink' clones
+                            them, 'hardlink' makes hard links to the files
+                            which are neither patched nor transformed, 'copy'
+                            makes plain copies and 'auto' (the default) tries
+                            reflink, then in-kernel copy, then plain copy.
 
 Options for --import, --add/remove-import, --update:
 
@@ -0,0 +1,256 @@
+#!/usr/bin/python
+# encoding: UTF-8
+
+#===============================================================================
+# Define global imports
+#===============================================================================
+import os
+import sys
+import mmap
+import struct
+import atexit
+import marshal
+import tempfile
+from . import constants
+
+
+#===============================================================================
+# Define module information
+#===============================================================================
+__author__ = constants.__author__
+__license__ = constants.__license__
+__copyright__ = constants.__copyright__
+
+
+#===============================================================================
+# Define global constants
+#===============================================================================
+PYTHON3 = constants.PYTHON3
+NoneType = type(None)
+APP = constants.APP
+DIRS = constants.DIRS
+ENCS = constants.ENCS
+UTILS = constants.UTILS
+FILES = constants.FILES
+MODES = constants.MODES
+TESTS = constants.TESTS
+compiler = constants.compiler
+joinpath = constants.joinpath
+cleaner = constants.cleaner
+string = constants.string
+isabs = os.path.isabs
+isdir = os.path.isdir
+isfile = os.path.isfile
+normpath = os.path.normpath
+relpath = os.path.relpath
+# Marshal format depends on the version of Python, so it is a part of magic.
+MAGIC = ('PYGNULIB-MODULES 3 %d %d.%d\n' % \
+  (marshal.version, sys.version_info[0], sys.version_info[1])).encode('ASCII')
+HEADER = struct.Struct('<QQ')
+DATABASES = dict() # Opened databases
+GENERATIONS = 32 # Entries which were not used in so many saves are dropped
+
+
+#===============================================================================
+# Define GLModuleDatabase class
+#===============================================================================
+class GLModuleDatabase(object):
+  '''GLModuleDatabase is a persistent on-disk storage of the parsed module
+  descriptions. Every entry is keyed by the absolute path to the module file
+  and remembers mtime and size of that file, so the stale entries are simply
+  ignored and overwritten. Data derived from many modules can be stored too,
+  using an arbitrary key and stamp. Every save of the database starts a new
+  generation; such entries remember the generation in which they were last
+  used and are dropped when they are not used for GENERATIONS generations.
+  Database is a single binary file: magic line, length of the index, current
+  generation, marshalled index and marshalled entries. The file is mapped to
+  memory and only the requested entries are unmarshalled.'''
+    
+  def __init__(self, path):
+    '''GLModuleDatabase.__init__(path) -> GLModuleDatabase
+    
+    Create new GLModuleDatabase instance and load the existing database from
+    the given path, if any. Unreadable or incompatible database is treated as
+    an empty one. Modified database is saved when the interpreter exits.'''
+    if type(path) is bytes or type(path) is string:
+      if type(path) is bytes:
+        path = path.decode(ENCS['default'])
+    else: # if path has not bytes or string type
+      raise(TypeError('path must be a string, not %s' % type(path).__name__))
+    self.path = path
+    self.index = dict() # key -> (stamp, offset, length, generation)
+    self.entries = dict() # key -> (stamp, data)
+    self.used = dict() # key -> generation
+    self.generation = 0
+    self.mapping = None
+    self.offset = 0
+    self.dirty = False
+    self.readonly = False
+    self.shared = False
+    self.objects = dict() # key -> (stamp, object)
+    self._load_()
+    atexit.register(self.save)
+    
+  def __repr__(self):
+    '''x.__repr__ <==> repr(x)'''
+    result = '<pygnulib.GLModuleDatabase %s>' % hex(id(self))
+    return(result)
+    
+  def _load_(self):
+    '''GLModuleDatabase._load_()
+    
+    Map the database file to memory and read its index.'''
+    try: # Try to read database
+      with open(self.path, 'rb') as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+      start = len(MAGIC)
+      if mapping[:start] == MAGIC:
+        length, generation = \
+          HEADER.unpack(mapping[start:start +HEADER.size])
+        start += HEADER.size
+        self.index = marshal.loads(mapping[start:start +length])
+        self.offset = start +length
+        self.mapping = mapping
+        self.generation = generation
+      else: # if database has another format
+        mapping.close()
+    except Exception as error:
+      self.index = dict()
+      self.mapping = None
+    
+  def _stamp_(self, path):
+    '''GLModuleDatabase._stamp_(path) -> tuple
+    
+    Return tuple of modification time and size of the given file.'''
+    stat = os.stat(path)
+    mtime = getattr(stat, 'st_mtime_ns', stat.st_mtime)
+    result = tuple([mtime, stat.st_size])
+    return(result)
+    
+  def get(self, path):
+    '''GLModuleDatabase.get(path) -> object or None
+    
+    Return the stored data for the given module file or None if database has
+    no entry for this file or if the entry is stale.'''
+    result = None
+    if path in self.entries or path in self.index:
+      try: # Try to stat module file
+        stamp = self._stamp_(path)
+      except OSError as error:
+        return(result)
+      result = self.fetch(path, stamp)
+    return(result)
+    
+  def set(self, path, value):
+    '''GLModuleDatabase.set(path, value)
+    
+    Store data for the given module file. Value must be marshallable.'''
+    try: # Try to stat module file
+      stamp = self._stamp_(path)
+    except OSError as error:
+      return
+    self.store(path, stamp, value)
+    
+  def fetch(self, key, stamp):
+    '''GLModuleDatabase.fetch(key, stamp) -> object or None
+    
+    Return the data stored with the given key or None if there is no such
+    entry or if it was stored with another stamp. If database is shared, e.g.
+    by the requests to the server, the data is unmarshalled only once and the
+    same object is returned every time, so it must not be modified.'''
+    if key in self.objects and self.objects[key][0] == stamp:
+      return(self.objects[key][1])
+    result = None
+    if key in self.entries:
+      oldstamp, data = self.entries[key]
+      if oldstamp == stamp:
+        result = marshal.loads(data)
+    elif key in self.index:
+      oldstamp, offset, length, generation = self.index[key]
+      if oldstamp == stamp:
+        offset += self.offset
+        result = marshal.loads(self.mapping[offset:offset +length])
+        # Entry is marked as used only when it becomes old, so the database
+        # is not written just because it was read.
+        if key not in self.used and \
+        generation <= self.generation -GENERATIONS //2:
+          self.used[key] = self.generation
+          self.dirty = True
+    if self.shared and result != None:
+      self.objects[key] = tuple([stamp, result])
+    return(result)
+    
+  def store(self, key, stamp, value):
+    '''GLModuleDatabase.store(key, stamp, value)
+    
+    Store data with the given key and stamp. Both stamp and value must be
+    marshallable. Keys which are absolute paths are reserved for files.'''
+    self.entries[key] = tuple([stamp, marshal.dumps(value)])
+    self.dirty = True
+    if self.shared:
+      self.objects[key] = tuple([stamp, value])
+    
+  def save(self):
+    '''GLModuleDatabase.save()
+    
+    Write database to disk if it was modified. Entries of the module files
+    which do not exist anymore are dropped; other entries, e.g. patched files
+    and module closures, are dropped if they were not used for GENERATIONS
+    generations. The database file is replaced atomically, so concurrent
+    readers always see a consistent state. Errors are ignored, since database
+    is only an optimization. Read-only database, e.g. the snapshot used by
+    worker processes, is never written.'''
+    if not self.dirty or self.readonly:
+      return
+    index = dict()
+    blobs = list()
+    offset = 0
+    keys = sorted(set(list(self.index) +list(self.entries)))
+    for key in keys:
+      if key in self.entries:
+        stamp, data = self.entries[key]
+        generation = self.generation
+      else: # if key in self.index
+        stamp, start, length, generation = self.index[key]
+        generation = self.used.get(key, generation)
+        if isabs(key):
+          if not isfile(key):
+            continue
+        elif generation <= self.generation -GENERATIONS:
+          continue
+        start += self.offset
+        data = self.mapping[start:start +length]
+      index[key] = tuple([stamp, offset, len(data), generation])
+      blobs += [data]
+      offset += len(data)
+    data = marshal.dumps(index)
+    dirname = os.path.dirname(self.path)
+    temp = None
+    try: # Try to write database
+      if not isdir(dirname):
+        os.makedirs(dirname)
+      fd, temp = tempfile.mkstemp(dir=dirname)
+      with os.fdopen(fd, 'wb') as file:
+        file.write(MAGIC)
+        file.write(HEADER.pack(len(data), self.generation +1))
+        file.write(data)
+        for blob in blobs:
+          file.write(blob)
+      if hasattr(os, 'replace'):
+        os.replace(temp, self.path)
+      else: # if not hasattr(os, 'replace')
+        os.rename(temp, self.path)
+      self.dirty = False
+    except Exception as error:
+      if temp and isfile(temp):
+        os.remove(temp)
+    
+  def open(path):
+    '''GLModuleDatabase.open(path) -> GLModuleDatabase
+    
+    Return the shared database instance for the given path, so every module
+    system within one process works with the same in-memory state.'''
+    if path not in DATABASES:
+      DATABASES[path] = GLModuleDatabase(path)
+    return(DATABASES[path])
+  open = staticmethod(open)
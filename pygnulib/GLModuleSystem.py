@@ -7,13 +7,17 @@
 import os
 import re
 import sys
+import stat
 import codecs
+import fnmatch
 import hashlib
 import subprocess as sp
 from . import constants
 from .GLError import GLError
 from .GLConfig import GLConfig
 from .GLFileSystem import GLFileSystem
+from .GLModuleDatabase import GLModuleDatabase
+from .GLProfiler import GLProfiler
 
 
 #===============================================================================
@@ -36,6 +40,8 @@ UTILS = constants.UTILS
 FILES = constants.FILES
 MODES = constants.MODES
 TESTS = constants.TESTS
+STATUS = constants.STATUS
+FIELDS = constants.FIELDS
 compiler = constants.compiler
 joinpath = constants.joinpath
 cleaner = constants.cleaner
@@ -46,6 +52,16 @@ isfile = os.path.isfile
 normpath = os.path.normpath
 relpath = os.path.relpath
 filter_filelist = constants.filter_filelist
+SECTIONS = \
+[ # Begin list of the sections of module description
+  'Description', 'Comment', 'Status', 'Notice', 'Applicability', 'Files',
+  'Depends-on', 'configure.ac-early', 'configure.ac', 'Makefile.am',
+  'Include', 'Link', 'License', 'Maintainer',
+] # Finish list of the sections of module description
+HEADER = compiler('^(%s):$' % \
+  '|'.join([section.replace('.', '\\.') for section in SECTIONS]))
+NAME = compiler(joinpath('modules', '(.*?)$'))
+SYSTEMS = dict() # Warm module systems, e.g. of the server
 
 
 #===============================================================================
@@ -60,19 +76,62 @@ class GLModuleSystem(object):
     
     Create new GLModuleSystem instance. Some functions use GLFileSystem class
     to look up a file in localdir or gnulib directories, or combine it through
-    'patch' utility.'''
+    'patch' utility. Every module is created only once: GLModuleSystem keeps
+    the registry of the found modules, so the same GLModule instance with all
+    its parsed data is shared between all its dependents. If the warm module
+    system with the same localdir, modcache and errors was shared, the new
+    instance starts with its modules and indices.'''
     self.args = dict()
+    self.modules = dict() # (path, patched) -> GLModule
+    self.dependents = None # Reverse dependency index
+    self.owners = None # Inverted index of files
     if type(config) is not GLConfig:
       raise(TypeError('config must be a GLConfig, not %s' % \
         type(config).__name__))
     self.config = config
     self.filesystem = GLFileSystem(self.config)
+    warm = SYSTEMS.get(self._key_())
+    if warm != None:
+      self.modules = warm.modules
+      self.dependents = warm.dependents
+      self.owners = warm.owners
     
   def __repr__(self):
     '''x.__repr__ <==> repr(x)'''
     result = '<pygnulib.GLModuleSystem %s>' % hex(id(self))
     return(result)
     
+  def _key_(self):
+    '''GLModuleSystem._key_() -> tuple
+    
+    Return the values of the configuration which modules and indices of this
+    module system depend on; module systems with the same key can share them.
+    GLConfig: localdir, modcache, errors.'''
+    result = tuple([DIRS['root'], self.config['localdir'],
+      self.config['modcache'], self.config['errors']])
+    return(result)
+    
+  def share(self):
+    '''GLModuleSystem.share()
+    
+    Make the found modules and the built indices of this module system the
+    starting point of every module system which is created later with the
+    same localdir, modcache and errors. Server uses it to hand its warm
+    module system to the requests.'''
+    SYSTEMS[self._key_()] = self
+    
+  def getDatabase(self):
+    '''GLModuleSystem.getDatabase() -> GLModuleDatabase or None
+    
+    Return the persistent database of the parsed module descriptions or None
+    if module caching optimization is disabled.
+    GLConfig: modcache.'''
+    result = None
+    if self.config['modcache']:
+      path = joinpath(DIRS['cache'], 'modules.db')
+      result = GLModuleDatabase.open(path)
+    return(result)
+    
   def exists(self, module):
     '''GLModuleSystem.exists(module) -> bool
     
@@ -100,7 +159,9 @@ class GLModuleSystem(object):
   def find(self, module):
     '''GLModuleSystem.find(module) -> GLModule
     
-    Find the given module.'''
+    Find the given module. Modules are interned by the resolved path and
+    patched flag, so the repeated calls return the same GLModule instance,
+    even if they come from different threads.'''
     if type(module) is bytes or string:
       if type(module) is bytes:
         module = module.decode(ENCS['default'])
@@ -109,7 +170,12 @@ class GLModuleSystem(object):
         'module must be a string, not %s' % type(module).__name__))
     if self.exists(module):
       path, istemp = self.filesystem.lookup(joinpath('modules', module))
-      result = GLModule(self.config, path, istemp)
+      key = tuple([os.path.realpath(path), istemp])
+      if key not in self.modules:
+        # Module system may be shared by threads; the first instance wins.
+        module = GLModule(self.config, path, istemp, self)
+        self.modules.setdefault(key, module)
+      result = self.modules[key]
       return(result)
     else: # if not self.exists(module)
       if self.config['errors']:
@@ -118,62 +184,267 @@ class GLModuleSystem(object):
         sys.stderr.write('gnulib-tool: warning: ')
         sys.stderr.write('file %s does not exist\n' % str(module))
     
-  def list(self):
-    '''GLModuleSystem.list() -> list
-   
-    Return the available module names as tuple. We could use a combination
-    of os.walk() function and re module. However, it takes too much time to
-    complete, so this version uses subprocess to run shell commands.'''
-    result = string()
-    listing = list()
+  def list(self, lazy=False):
+    '''GLModuleSystem.list([lazy]) -> list
+    
+    Return the sorted list of the available module names. If lazy is True,
+    return generator which yields every module name once in the order in which
+    modules were found. Both gnulib and localdir modules directories are
+    scanned in-process, the current directory is never changed.
+    GLConfig: localdir.'''
+    if type(lazy) is not bool:
+      raise(TypeError('lazy must be a bool, not %s' % type(lazy).__name__))
+    generator = self._iterate_()
+    if lazy:
+      return(generator)
+    listing = sorted(set(generator))
+    return(listing)
+    
+  def getDependents(self, module, recursive=False):
+    '''GLModuleSystem.getDependents(module[, recursive]) -> list
+    
+    Return the sorted list of tuples of module name and condition for the
+    modules which directly depend on the given module. If recursive is True,
+    return the sorted list of names of all modules which depend on the given
+    module directly or indirectly.
+    GLConfig: localdir, modcache.'''
+    if type(module) is bytes or type(module) is string:
+      if type(module) is bytes:
+        module = module.decode(ENCS['default'])
+    else: # if module has not bytes or string type
+      raise(TypeError('module must be a string, not %s' % \
+        type(module).__name__))
+    if type(recursive) is not bool:
+      raise(TypeError('recursive must be a bool, not %s' % \
+        type(recursive).__name__))
+    index = self.getReverseIndex()
+    if not recursive:
+      result = [tuple(pair) for pair in index.get(module, list())]
+      return(sorted(result))
+    result = set()
+    inmodules = [module]
+    while inmodules:
+      dependents = set()
+      for inmodule in inmodules:
+        for dependent, condition in index.get(inmodule, list()):
+          if dependent not in result:
+            dependents.add(dependent)
+      result.update(dependents)
+      inmodules = sorted(dependents)
+    result.discard(module)
+    return(sorted(result))
+    
+  def getReverseIndex(self):
+    '''GLModuleSystem.getReverseIndex() -> dict
+    
+    Return the dictionary which maps module name to the list of modules which
+    directly depend on it; every item is a list of dependent module name and
+    condition. If module caching is enabled, the index is stored in the module
+    database together with the fingerprint of all module files, so it is built
+    again only when some module is added, removed or modified.
+    GLConfig: localdir, modcache.'''
+    if self.dependents == None:
+      database = self.getDatabase()
+      if database:
+        key = 'dependents:%s:%s' % (DIRS['root'], self.config['localdir'])
+        fingerprint = self._fingerprint_()
+        self.dependents = database.fetch(key, fingerprint)
+      if self.dependents == None:
+        index = dict()
+        for name in self.list():
+          module = self.find(name)
+          if module == None:
+            continue
+          for depmodule, condition in module.getDependencies_Raw():
+            if depmodule not in index:
+              index[depmodule] = list()
+            index[depmodule] += [[name, condition]]
+        self.dependents = index
+        if database:
+          database.store(key, fingerprint, index)
+    return(self.dependents)
+    
+  def getFileIndex(self):
+    '''GLModuleSystem.getFileIndex() -> dict
+    
+    Return the dictionary which maps every file listed in the Files section of
+    some module description to the sorted list of modules which contain it.
+    All modules are indexed, including -tests modules and the modules from
+    localdir. If module caching is enabled, the index is stored in the module
+    database together with the fingerprint of all module files, in the same
+    way as the reverse dependency index.
+    GLConfig: localdir, modcache.'''
+    if self.owners == None:
+      database = self.getDatabase()
+      if database:
+        key = 'files:%s:%s' % (DIRS['root'], self.config['localdir'])
+        fingerprint = self._fingerprint_()
+        self.owners = database.fetch(key, fingerprint)
+      if self.owners == None:
+        index = dict()
+        names = list()
+        for name in self.list():
+          names += [name]
+          if self.exists('%s-tests' % name):
+            names += ['%s-tests' % name]
+        for name in names:
+          module = self.find(name)
+          if module == None:
+            continue
+          for file in module.getFiles_Raw():
+            if file not in index:
+              index[file] = list()
+            index[file] += [name]
+        for file in index:
+          index[file] = sorted(set(index[file]))
+        self.owners = index
+        if database:
+          database.store(key, fingerprint, index)
+    return(self.owners)
+    
+  def findFile(self, query):
+    '''GLModuleSystem.findFile(query) -> list
+    
+    Return the sorted list of names of the modules which contain the file
+    given by query. Query is either the file name, e.g. lib/stdio.in.h, or
+    the directory name which ends with a slash, e.g. m4/, which matches all
+    files inside this directory, or the shell-style wildcard pattern, e.g.
+    lib/*printf*.c.
+    GLConfig: localdir, modcache.'''
+    if type(query) is bytes or type(query) is string:
+      if type(query) is bytes:
+        query = query.decode(ENCS['default'])
+    else: # if query has not bytes or string type
+      raise(TypeError('query must be a string, not %s' % \
+        type(query).__name__))
+    index = self.getFileIndex()
+    if [char for char in '*?[' if char in query]:
+      pattern = compiler(fnmatch.translate(query))
+      files = [file for file in index if pattern.match(file)]
+    elif query.endswith('/'):
+      files = [file for file in index if file.startswith(query)]
+    else: # if query is the file name
+      files = [query] if query in index else list()
+    result = set()
+    for file in files:
+      result.update(index[file])
+    return(sorted(result))
+    
+  def getStamp(self, module):
+    '''GLModuleSystem.getStamp(module) -> tuple
+    
+    Return modification times and sizes of the files which define the given
+    module: module file in gnulib, module file in localdir and diff file in
+    localdir. Every missing file is represented by None.
+    GLConfig: localdir.'''
+    localdir = self.config['localdir']
+    paths = [joinpath(DIRS['root'], 'modules', module)]
+    if localdir:
+      paths += [joinpath(localdir, 'modules', module)]
+      paths += [joinpath(localdir, 'modules', '%s.diff' % module)]
+    result = list()
+    for path in paths:
+      try: # Try to stat file
+        filestat = os.stat(path)
+      except OSError as error:
+        result += [None]
+        continue
+      mtime = getattr(filestat, 'st_mtime_ns', filestat.st_mtime)
+      result += [tuple([mtime, filestat.st_size])]
+    return(tuple(result))
+    
+  def _fingerprint_(self):
+    '''GLModuleSystem._fingerprint_() -> string
+    
+    Return the digest of names, modification times and sizes of all files in
+    gnulib and localdir modules directories.
+    GLConfig: localdir.'''
+    directories = [DIRS['root']]
     localdir = self.config['localdir']
-    find_args = ['find', 'modules', '-type', 'f', '-print']
-    sed_args = \
-    [
-      'sed',
-      '-e', r's,^modules/,,',
-      '-e', r'/^CVS\//d',
-      '-e', r'/\/CVS\//d',
-      '-e', r'/^ChangeLog$/d',
-      '-e', r'/\/ChangeLog$/d',
-      '-e', r'/^COPYING$/d',
-      '-e', r'/\/COPYING$/d',
-      '-e', r'/^README$/d',
-      '-e', r'/\/README$/d',
-      '-e', r'/^TEMPLATE$/d',
-      '-e', r'/^TEMPLATE-EXTENDED$/d',
-      '-e', r'/^TEMPLATE-TESTS$/d',
-      '-e', r'/^\..*/d',
-      '-e', r'/~$/d',
-      '-e', r'/-tests$/d',
-    ]
-    
-    # Read modules from gnulib root directory.
-    os.chdir(constants.DIRS['root'])
-    find = sp.Popen(find_args, stdout=sp.PIPE)
-    result += find.stdout.read().decode(ENCS['shell'])
-    
-    # Read modules from local directory.
     if localdir and isdir(joinpath(localdir, 'modules')):
-      os.chdir(localdir)
-      find = sp.Popen(find_args, stdout=sp.PIPE)
-      result += find.stdout.read().decode(ENCS['shell'])
-      sed_args += ['-e', r's,\.diff$,,']
-    
-    # Save the list of the modules to file.
-    os.chdir(DIRS['cwd'])
-    path = joinpath(self.config['tempdir'], 'list')
-    with codecs.open(path, 'wb', 'UTF-8') as file:
-      file.write(result)
-    
-    # Filter the list of the modules.
-    stdin = codecs.open(path, 'rb', 'UTF-8')
-    sed = sp.Popen(sed_args, stdin=stdin, stdout=sp.PIPE)
-    result = sed.stdout.read().decode(ENCS['shell'])
-    stdin.close(); os.remove(path)
-    listing = [line for line in result.split('\n') if line.strip()]
-    listing = sorted(set(listing))
-    return(listing)
+      directories += [localdir]
+    digest = hashlib.sha1()
+    for directory in directories:
+      directory = joinpath(directory, 'modules')
+      for name in sorted(self._walk_(directory)):
+        filestat = os.lstat(joinpath(directory, name))
+        mtime = getattr(filestat, 'st_mtime_ns', filestat.st_mtime)
+        line = '%s\0%s\0%s\0%s\n' % \
+          (directory, name, mtime, filestat.st_size)
+        digest.update(line.encode(ENCS['system']))
+    result = digest.hexdigest()
+    return(result)
+    
+  def _iterate_(self):
+    '''GLModuleSystem._iterate_() -> generator
+    
+    Yield the available module names. This is a generator which is used by
+    the GLModuleSystem.list method.
+    GLConfig: localdir.'''
+    directories = [DIRS['root']]
+    localdir = self.config['localdir']
+    if localdir and isdir(joinpath(localdir, 'modules')):
+      directories += [localdir]
+    names = set()
+    for directory in directories:
+      for name in self._walk_(joinpath(directory, 'modules')):
+        if not self._filter_(name):
+          continue
+        if len(directories) > 1 and name.endswith('.diff'):
+          name = name[:-len('.diff')]
+        if name not in names:
+          names.add(name)
+          yield(name)
+    
+  def _walk_(self, directory):
+    '''GLModuleSystem._walk_(directory) -> generator
+    
+    Yield paths of all regular files inside the given directory and its
+    subdirectories, relative to this directory. Symbolic links are not
+    followed, like find -type f does.'''
+    stack = [string()]
+    while stack:
+      prefix = stack.pop()
+      path = joinpath(directory, prefix)
+      try: # Try to read directory
+        if hasattr(os, 'scandir'):
+          entries = \
+          [ # Begin to collect entries
+            tuple([entry.name, entry.is_dir(follow_symlinks=False),
+              entry.is_file(follow_symlinks=False)])
+            for entry in os.scandir(path)
+          ] # Finish to collect entries
+        else: # if not hasattr(os, 'scandir')
+          entries = list()
+          for name in os.listdir(path):
+            mode = os.lstat(joinpath(path, name)).st_mode
+            entries += [tuple([name, stat.S_ISDIR(mode), stat.S_ISREG(mode)])]
+      except OSError as error:
+        continue
+      for name, isdir_entry, isfile_entry in entries:
+        if prefix:
+          name = '%s/%s' % (prefix, name)
+        if isdir_entry:
+          stack += [name]
+        elif isfile_entry:
+          yield(name)
+    
+  def _filter_(self, name):
+    '''GLModuleSystem._filter_(name) -> bool
+    
+    Check whether the given path relative to the modules directory is a module
+    description file. CVS directories, ChangeLog, COPYING, README, templates,
+    hidden files, backup files and -tests modules are skipped.'''
+    parts = name.split('/')
+    if 'CVS' in parts[:-1]:
+      return(False)
+    if parts[-1] in ['ChangeLog', 'COPYING', 'README']:
+      return(False)
+    if name in ['TEMPLATE', 'TEMPLATE-EXTENDED', 'TEMPLATE-TESTS']:
+      return(False)
+    if name.startswith('.') or name.endswith('~') or name.endswith('-tests'):
+      return(False)
+    return(True)
 
 
 #===============================================================================
@@ -184,15 +455,17 @@ class GLModule(object):
   path. GLModule can get all information about module, get its dependencies,
   files, etc.'''
   
-  def __init__(self, config, module, patched=False):
-    '''GLModule.__init__(config, module[, patched]) -> GLModule
+  def __init__(self, config, module, patched=False, modulesystem=None):
+    '''GLModule.__init__(config, module[, patched[, modulesystem]]) -> GLModule
     
     Create new GLModule instance. Arguments are module and patched, where
     module is a string representing the path to the module and patched is a
-    bool indicating that module was created after applying patch.'''
+    bool indicating that module was created after applying patch. If
+    modulesystem is given, it is used to find the dependencies of the module;
+    otherwise new GLModuleSystem instance is created.'''
     self.args = dict()
     self.cache = dict()
-    self.content = string()
+    self.sections = None
     if type(config) is not GLConfig:
       raise(TypeError('config must be a GLConfig, not %s' % \
         type(config).__name__))
@@ -205,16 +478,16 @@ class GLModule(object):
     if type(patched) is not bool:
       raise(TypeError('patched must be a bool, not %s' % \
         type(module).__name__))
+    if modulesystem == None:
+      modulesystem = GLModuleSystem(config)
+    elif type(modulesystem) is not GLModuleSystem:
+      raise(TypeError('modulesystem must be a GLModuleSystem, not %s' % \
+        type(modulesystem).__name__))
     self.module = module
     self.patched = patched
     self.config = config
-    self.filesystem = GLFileSystem(self.config)
-    self.modulesystem = GLModuleSystem(self.config)
-    with codecs.open(module, 'rb', 'UTF-8') as file:
-      self.content = file.read()
-    self.regex ='(?:Description:|Comment:|Status:|Notice:|Applicability:|\
-Files:|Depends-on:|configure\\.ac-early:|configure\\.ac:|Makefile\\.am:|\
-Include:|Link:|License:|Maintainer:)'
+    self.modulesystem = modulesystem
+    self.filesystem = self.modulesystem.filesystem
     
   def __eq__(self, module):
     '''x.__eq__(y) <==> x==y'''
@@ -286,9 +559,10 @@ Include:|Link:|License:|Maintainer:)'
     '''GLModule.getName() -> string
     
     Return the name of the module.'''
-    pattern = compiler(joinpath('modules', '(.*?)$'))
-    result = pattern.findall(self.module)[0]
-    return(result)
+    if 'name' not in self.cache:
+      result = NAME.findall(self.module)[0]
+      self.cache['name'] = result
+    return(self.cache['name'])
     
   def isPatched(self):
     '''GLModule.isPatched() -> bool
@@ -322,91 +596,133 @@ Include:|Link:|License:|Maintainer:)'
     result = self.modulesystem.find(self.getTestsName())
     return(result)
     
-  def getShellFunc(self):
-    '''GLModule.getShellFunc() -> string
+  def _identifier_(self):
+    '''GLModule._identifier_() -> string
+    
+    Return the part of shell function, shell variable and conditional names
+    which identifies the module: the module name itself if it consists only of
+    ASCII letters, digits and underscores, or MD5 sum of the name otherwise.
+    It does not depend on configuration, so it is computed only once.'''
+    if 'identifier' not in self.cache:
+      result = str(self)
+      nonascii = \
+      [ # Begin to filter non-ascii chars
+        char for char in result if char not in '%s_' % constants.ALPHANUMERIC
+      ] # Finish to filter non-ascii chars
+      if nonascii:
+        result = ('%s\n' % result).encode(ENCS['default'])
+        result = hashlib.md5(result).hexdigest()
+      self.cache['identifier'] = result
+    return(self.cache['identifier'])
+    
+  def getShellFunc(self, macro_prefix=None):
+    '''GLModule.getShellFunc([macro_prefix]) -> string
     
     Computes the shell function name that will contain the m4 macros for the
-    module.'''
-    isalnum = True
-    macro_prefix = self.config['macro_prefix']
-    for char in str(module):
-      if char not in constants.ALPHANUMERIC:
-        isalnum = False
-        break
-    if isalnum:
-      module = str(self)
-    else: # if not isalnum
-      module = '%s\n' % str(self)
-      if type(module) is string:
-        module = module.encode(ENCS['default'])
-      module = hashlib.md5(module).hexdigest()
-    result = 'func_%s_gnulib_m4code_%s' % (macro_prefix, module)
-    if type(result) is bytes:
-      result = result.decode(ENCS['default'])
+    module. If macro_prefix is None, it is taken from the configuration.
+    GLConfig: macro_prefix.'''
+    if macro_prefix == None:
+      macro_prefix = self.config['macro_prefix']
+    result = 'func_%s_gnulib_m4code_%s' % (macro_prefix, self._identifier_())
     return(result)
     
-  def getShellVar(self):
-    '''GLModule.getShellVar() -> string
+  def getShellVar(self, macro_prefix=None):
+    '''GLModule.getShellVar([macro_prefix]) -> string
     
     Compute the shell variable name the will be set to true once the m4 macros
-    for the module have been executed.'''
-    isalnum = True
-    macro_prefix = self.config['macro_prefix']
-    for char in str(module):
-      if char not in constants.ALPHANUMERIC:
-        isalnum = False
-        break
-    if isalnum:
-      module = str(self)
-    else: # if not isalnum
-      module = '%s\n' % str(self)
-      if type(module) is string:
-        module = module.encode(ENCS['default'])
-      module = hashlib.md5(module).hexdigest()
-    result = '%s_gnulib_enabled_%s' % (macro_prefix, module)
-    if type(result) is bytes:
-      result = result.decode(ENCS['default'])
+    for the module have been executed. If macro_prefix is None, it is taken
+    from the configuration.
+    GLConfig: macro_prefix.'''
+    if macro_prefix == None:
+      macro_prefix = self.config['macro_prefix']
+    result = '%s_gnulib_enabled_%s' % (macro_prefix, self._identifier_())
     return(result)
     
-  def getConditionalName(self):
-    '''GLModule.getConditionalName() -> string
+  def getConditionalName(self, macro_prefix=None):
+    '''GLModule.getConditionalName([macro_prefix]) -> string
     
-    Return the automake conditional name.
+    Return the automake conditional name. If macro_prefix is None, it is taken
+    from the configuration.
     GLConfig: macro_prefix.'''
-    macro_prefix = self.config['macro_prefix']
-    nonascii = \
-    [ # Begin to filter non-ascii chars
-      char for char in self.getName() if char not in \
-      'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_'
-    ] # Finish to filter non-ascii chars
-    if nonascii:
-      name = self.getName().encode(ENCS['default'])
-      name = hashlib.md5(name).hexdigest()
-      conditional = '%s_GNULIB_ENABLED_%s' % (macro_prefix, name)
-    else: # if not nonascii
-      result = '%s_GNULIB_ENABLED_%s' (macro_prefix, name)
-    if type(result) is bytes:
-      result = result.decode(ENCS['default'])
+    if macro_prefix == None:
+      macro_prefix = self.config['macro_prefix']
+    result = '%s_GNULIB_ENABLED_%s' % (macro_prefix, self._identifier_())
+    return(result)
+    
+  def getSections(self):
+    '''GLModule.getSections() -> dict
+    
+    Return the dictionary which maps every section name of the module
+    description to its raw text. The module description is read and split
+    into sections only once; all other methods obtain their data from here.
+    Unless module was patched, sections are also taken from and stored to the
+    persistent module database, so the file is parsed only when it changes.
+    GLConfig: modcache.'''
+    if self.sections is None:
+      database = None
+      if not self.patched:
+        database = self.modulesystem.getDatabase()
+      if database:
+        path = os.path.abspath(self.module)
+        self.sections = database.get(path)
+      if self.sections is None:
+        with GLProfiler.phase('GLModule.parse'):
+          with codecs.open(self.module, 'rb', 'UTF-8') as file:
+            content = file.read()
+          self.sections = self._parse_(content)
+        GLProfiler.count('modules parsed')
+        if database:
+          database.set(path, self.sections)
+      else: # if sections were found in database
+        GLProfiler.count('modules from database')
+    return(self.sections)
+    
+  def _parse_(self, content):
+    '''GLModule._parse_(content) -> dict
+    
+    Split the content of the module description into sections. Section text
+    includes the rest of the header line and every following line up to the
+    next header; if section occurs several times, the last one is used.'''
+    result = dict()
+    section = None
+    parts = list()
+    content = content.replace('\r\n', '\n')
+    for line in content.split('\n'):
+      match = HEADER.match(line)
+      if match:
+        if section != None:
+          result[section] = ''.join(parts)
+        section = match.group(1)
+        parts = ['\n']
+      elif section != None:
+        parts += ['%s\n' % line]
+    if section != None:
+      result[section] = ''.join(parts)
+    return(result)
+    
+  def getSection(self, section):
+    '''GLModule.getSection(section) -> string
+    
+    Return raw text of the given section or empty string if module has no
+    such section.'''
+    if type(section) is bytes or type(section) is string:
+      if type(section) is bytes:
+        section = section.decode(ENCS['default'])
+    else: # if section has not bytes or string type
+      raise(TypeError('section must be a string, not %s' % \
+        type(section).__name__))
+    sections = self.getSections()
+    result = string()
+    if section in sections:
+      result = sections[section]
     return(result)
     
   def getDescription(self):
     '''GLModule.getDescription() -> string
     
     Return description of the module.'''
-    section = 'Description:'
     if 'description' not in self.cache:
-      if section not in self.content:
-        result = string()
-      else: # if section in self.content
-        pattern = '^%s[\t ]*(.*?)%s' % (section, self.regex)
-        pattern = compiler(pattern, re.S | re.M)
-        result = pattern.findall(self.content)
-        if type(result) is list:
-          if not result:
-            result = string()
-          else: # if result
-            result = result[-1]
-      result = result.strip()
+      result = self.getSection('Description').strip()
       self.cache['description'] = result
     return(self.cache['description'])
     
@@ -414,20 +730,8 @@ Include:|Link:|License:|Maintainer:)'
     '''GLModule.getComment() -> string
     
     Return comment to module.'''
-    section = 'Comment:'
     if 'comment' not in self.cache:
-      if section not in self.content:
-        result = string()
-      else: # if section in self.content
-        pattern = '^%s[\t ]*(.*?)%s' % (section, self.regex)
-        pattern = compiler(pattern, re.S | re.M)
-        result = pattern.findall(self.content)
-        if type(result) is list:
-          if not result:
-            result = string()
-          else: # if result
-            result = result[-1]
-      result = result.strip()
+      result = self.getSection('Comment').strip()
       self.cache['comment'] = result
     return(self.cache['comment'])
     
@@ -435,51 +739,34 @@ Include:|Link:|License:|Maintainer:)'
     '''GLModule.getStatus() -> string
     
     Return module status.'''
-    section = 'Status:'
     if 'status' not in self.cache:
-      if section not in self.content:
-        result = string()
-      else: # if section in self.content
-        snippet = self.content.split(section)[-1]
-        snippet = snippet.replace('\r\n', '\n')
-        lines = ['%s\n' % line for line in snippet.split('\n')]
-        parts = list()
-        for line in lines:
-          regex = '^(Description|Comment|Status|Notice|Applicability|'
-          regex += 'Files|Depends-on|configure\\.ac-early|configure\\.ac|'
-          regex += 'Makefile\\.am|Include|Link|License|Maintainer):$'
-          pattern = compiler(regex)
-          findflag = pattern.findall(line)
-          if findflag:
-            break
-          parts += [line]
-        result = [part.strip() for part in parts if part.strip()]
+      snippet = self.getSection('Status')
+      result = [line.strip() for line in snippet.split('\n') if line.strip()]
       self.cache['status'] = list(result)
     return(list(self.cache['status']))
     
+  def getStatusMask(self):
+    '''GLModule.getStatusMask() -> int
+    
+    Return module status as a combination of the STATUS bit masks. Module
+    is excluded from the transitive closure if its status mask intersects
+    the excluded status mask of the configuration.'''
+    if 'status-mask' not in self.cache:
+      result = 0
+      for word in self.getStatus():
+        if word in STATUS:
+          result |= STATUS[word]
+        elif word.endswith('-test'):
+          result |= STATUS['all-test']
+      self.cache['status-mask'] = result
+    return(self.cache['status-mask'])
+    
   def getNotice(self):
     '''GLModule.getNotice() -> string
     
     Return notice to module.'''
-    section = 'Notice:'
     if 'notice' not in self.cache:
-      if section not in self.content:
-        result = string()
-      else: # if section in self.content
-        snippet = self.content.split(section)[-1]
-        snippet = snippet.replace('\r\n', '\n')
-        lines = ['%s\n' % line for line in snippet.split('\n')]
-        parts = list()
-        for line in lines:
-          regex = '^(Description|Comment|Status|Notice|Applicability|'
-          regex += 'Files|Depends-on|configure\\.ac-early|configure\\.ac|'
-          regex += 'Makefile\\.am|Include|Link|License|Maintainer):$'
-          pattern = compiler(regex)
-          findflag = pattern.findall(line)
-          if findflag:
-            break
-          parts += [line]
-        result = ''.join(parts)
+      result = self.getSection('Notice')
       self.cache['notice'] = result
     return(self.cache['notice'])
     
@@ -487,26 +774,9 @@ Include:|Link:|License:|Maintainer:)'
     '''GLModule.getApplicability() -> string
     
     Return applicability of module.'''
-    section = 'Applicability:'
     if 'applicability' not in self.cache:
-      if section not in self.content:
-        result = string()
-      else: # if section in self.content
-        snippet = self.content.split(section)[-1]
-        snippet = snippet.replace('\r\n', '\n')
-        lines = ['%s\n' % line for line in snippet.split('\n')]
-        parts = list()
-        for line in lines:
-          regex = '^(Description|Comment|Status|Notice|Applicability|'
-          regex += 'Files|Depends-on|configure\\.ac-early|configure\\.ac|'
-          regex += 'Makefile\\.am|Include|Link|License|Maintainer):$'
-          pattern = compiler(regex)
-          findflag = pattern.findall(line)
-          if findflag:
-            break
-          parts += [line]
-        parts = [part.strip() for part in parts]
-        result = ''.join(parts)
+      snippet = self.getSection('Applicability')
+      result = ''.join([line.strip() for line in snippet.split('\n')])
       if not result.strip():
         if self.getName().endswith('-tests'):
           result = 'tests'
@@ -518,104 +788,75 @@ Include:|Link:|License:|Maintainer:)'
       self.cache['applicability'] = result
     return(self.cache['applicability'])
     
-  def getFiles(self):
-    '''GLModule.getFiles() -> list
+  def getFiles(self, ac_version=None):
+    '''GLModule.getFiles([ac_version]) -> list
     
-    Return list of files.
+    Return list of files. If ac_version is None, it is taken from the
+    configuration.
     GLConfig: ac_version.'''
-    ac_version = self.config['ac_version']
-    section = 'Files:'
-    result = list()
-    if 'files' not in self.cache:
-      if section not in self.content:
-        result = list()
-      else: # if section in self.content
-        snippet = self.content.split(section)[-1]
-        snippet = snippet.replace('\r\n', '\n')
-        lines = ['%s\n' % line for line in snippet.split('\n')]
-        parts = list()
-        for line in lines:
-          regex = '^(Description|Comment|Status|Notice|Applicability|'
-          regex += 'Files|Depends-on|configure\\.ac-early|configure\\.ac|'
-          regex += 'Makefile\\.am|Include|Link|License|Maintainer):$'
-          pattern = compiler(regex)
-          findflag = pattern.findall(line)
-          if findflag:
-            break
-          parts += [line]
-        result = [part.strip() for part in parts if part.strip()]
+    if ac_version == None:
+      ac_version = self.config['ac_version']
+    key = tuple(['files', ac_version])
+    if key not in self.cache:
+      result = self.getFiles_Raw()
       result += [joinpath('m4', '00gnulib.m4')]
       result += [joinpath('m4', 'gnulib-common.m4')]
       if ac_version == 2.59:
         result += [joinpath('m4', 'onceonly.m4')]
-      self.cache['files'] = list(result)
-    return(list(self.cache['files']))
+      self.cache[key] = list(result)
+    return(list(self.cache[key]))
+    
+  def getFiles_Raw(self):
+    '''GLModule.getFiles_Raw() -> list
+    
+    Return list of files which are listed in the Files section, without the
+    files which every module implies.'''
+    snippet = self.getSection('Files')
+    result = [line.strip() for line in snippet.split('\n') if line.strip()]
+    return(result)
     
   def getDependencies(self):
     '''GLModule.getDependencies() -> list
     
     Return list of dependencies.
     GLConfig: localdir.'''
-    localdir = self.config['localdir']
     result = list()
-    section = 'Depends-on:'
     if 'dependencies' not in self.cache:
-      if section not in self.content:
-        depmodules = list()
-      else: # if section in self.content
-        snippet = self.content.split(section)[-1]
-        snippet = snippet.replace('\r\n', '\n')
-        lines = ['%s\n' % line for line in snippet.split('\n')]
-        parts = list()
-        for line in lines:
-          regex = '^(Description|Comment|Status|Notice|Applicability|'
-          regex += 'Files|Depends-on|configure\\.ac-early|configure\\.ac|'
-          regex += 'Makefile\\.am|Include|Link|License|Maintainer):$'
-          pattern = compiler(regex)
-          findflag = pattern.findall(line)
-          if findflag:
-            break
-          parts += [line]
-        modules = ''.join(parts)
-        modules = [line for line in modules.split('\n') if line.strip()]
-        modules = [module for module in modules if not module.startswith('#')]
-        for line in modules:
-          split = [part for part in line.split(' ') if part.strip()]
-          if len(split) == 1:
-            module = line.strip()
-            condition = None
-          else: # if len(split) != 1
-            module = split[0]
-            condition = split[1]
-            if type(condition) is bytes:
-              condition = condition.decode(ENCS['default'])
-          result += [tuple([self.modulesystem.find(module), condition])]
+      for module, condition in self.getDependencies_Raw():
+        result += [tuple([self.modulesystem.find(module), condition])]
       self.cache['dependencies'] = result
     return(list(self.cache['dependencies']))
     
+  def getDependencies_Raw(self):
+    '''GLModule.getDependencies_Raw() -> list
+    
+    Return list of dependencies as tuples of module name and condition. The
+    dependencies are not looked up, so this method is cheap.'''
+    result = list()
+    if 'dependencies-raw' not in self.cache:
+      snippet = self.getSection('Depends-on')
+      modules = [line for line in snippet.split('\n') if line.strip()]
+      modules = [module for module in modules if not module.startswith('#')]
+      for line in modules:
+        split = line.split(None, 1)
+        if len(split) == 1:
+          module = line.strip()
+          condition = None
+        else: # if len(split) != 1
+          module = split[0]
+          condition = split[1].strip()
+          if type(condition) is bytes:
+            condition = condition.decode(ENCS['default'])
+        result += [tuple([module, condition])]
+      self.cache['dependencies-raw'] = result
+    return(list(self.cache['dependencies-raw']))
+    
   def getAutoconfSnippet_Early(self):
     '''GLModule.getAutoconfSnippet_Early() -> string
     
     Return autoconf-early snippet.'''
-    section = 'configure.ac-early:'
     if 'autoconf-early' not in self.cache:
-      if section not in self.content:
-        result = string()
-      else: # if section in self.content
-        snippet = self.content.split(section)[-1]
-        snippet = snippet.replace('\r\n', '\n')
-        lines = ['%s\n' % line for line in snippet.split('\n')]
-        parts = list()
-        for line in lines:
-          regex = '^(Description|Comment|Status|Notice|Applicability|'
-          regex += 'Files|Depends-on|configure\\.ac-early|configure\\.ac|'
-          regex += 'Makefile\\.am|Include|Link|License|Maintainer):$'
-          pattern = compiler(regex)
-          findflag = pattern.findall(line)
-          if findflag:
-            break
-          parts += [line]
-        result = ''.join(parts)
+      result = self.getSection('configure.ac-early')
       self.cache['autoconf-early'] = result
     return(self.cache['autoconf-early'])
     
@@ -623,32 +864,16 @@ Include:|Link:|License:|Maintainer:)'
     '''GLModule.getAutoconfSnippet() -> string
     
     Return autoconf snippet.'''
-    section = 'configure.ac:'
     if 'autoconf' not in self.cache:
-      if section not in self.content:
-        result = string()
-      else: # if section in self.content
-        snippet = self.content.split(section)[-1]
-        snippet = snippet.replace('\r\n', '\n')
-        lines = ['%s\n' % line for line in snippet.split('\n')]
-        parts = list()
-        for line in lines:
-          regex = '^(Description|Comment|Status|Notice|Applicability|'
-          regex += 'Files|Depends-on|configure\\.ac-early|configure\\.ac|'
-          regex += 'Makefile\\.am|Include|Link|License|Maintainer):$'
-          pattern = compiler(regex)
-          findflag = pattern.findall(line)
-          if findflag:
-            break
-          parts += [line]
-        result = ''.join(parts)
+      result = self.getSection('configure.ac')
       self.cache['autoconf'] = result
     return(self.cache['autoconf'])
     
-  def getAutomakeSnippet(self):
-    '''getAutomakeSnippet() -> string
+  def getAutomakeSnippet(self, auxdir=None, ac_version=None):
+    '''getAutomakeSnippet([auxdir[, ac_version]]) -> string
     
-    Get automake snippet.
+    Get automake snippet. If auxdir or ac_version is None, it is taken from
+    the configuration.
     GLConfig: auxdir, ac_version.'''
     result = string() # Define stack variable
     conditional = self.getAutomakeSnippet_Conditional()
@@ -656,46 +881,34 @@ Include:|Link:|License:|Maintainer:)'
       result += self.getAutomakeSnippet_Conditional()
     else: # if not conditional.strip()
       result += '\n'
-    result += self.getAutomakeSnippet_Unconditional()
+    result += self.getAutomakeSnippet_Unconditional(auxdir, ac_version)
     return(result)
     
   def getAutomakeSnippet_Conditional(self):
     '''GLModule.getAutomakeSnippet_Conditional() -> string
     
     Return conditional automake snippet.'''
-    section = 'Makefile.am:'
     if 'makefile-conditional' not in self.cache:
-      if section not in self.content:
-        result = string()
-      else: # if section in self.content
-        snippet = self.content.split(section)[-1]
-        snippet = snippet.replace('\r\n', '\n')
-        lines = ['%s\n' % line for line in snippet.split('\n')]
-        parts = list()
-        for line in lines:
-          regex = '^(Description|Comment|Status|Notice|Applicability|'
-          regex += 'Files|Depends-on|configure\\.ac-early|configure\\.ac|'
-          regex += 'Makefile\\.am|Include|Link|License|Maintainer):$'
-          pattern = compiler(regex)
-          findflag = pattern.findall(line)
-          if findflag:
-            break
-          parts += [line]
-        result = ''.join(parts)
+      result = self.getSection('Makefile.am')
       self.cache['makefile-conditional'] = result
     return(self.cache['makefile-conditional'])
     
-  def getAutomakeSnippet_Unconditional(self):
-    '''GLModule.getAutomakeSnippet_Unconditional() -> string
+  def getAutomakeSnippet_Unconditional(self, auxdir=None, ac_version=None):
+    '''GLModule.getAutomakeSnippet_Unconditional([auxdir[,
+      ac_version]]) -> string
     
-    Return unconditional automake snippet.
+    Return unconditional automake snippet. If auxdir or ac_version is None,
+    it is taken from the configuration.
     GLConfig: auxdir, ac_version.'''
-    auxdir = self.config['auxdir']
-    ac_version = self.config['ac_version']
+    if auxdir == None:
+      auxdir = self.config['auxdir']
+    if ac_version == None:
+      ac_version = self.config['ac_version']
     result = string()
-    if 'makefile-unconditional' not in self.cache:
+    key = tuple(['makefile-unconditional', auxdir, ac_version])
+    if key not in self.cache:
       if self.isTests():
-        files = self.getFiles()
+        files = self.getFiles(ac_version)
         extra_files = filter_filelist(constants.NL, files,
           'tests/', '', 'tests/', '').split(constants.NL)
         extra_files = sorted(set(extra_files))
@@ -713,7 +926,7 @@ Include:|Link:|License:|Maintainer:)'
           mentioned_files = [f.strip() for f in mentioned_files]
           mentioned_files = [f for f in mentioned_files if f != '']
           mentioned_files = sorted(set(mentioned_files))
-        all_files = self.getFiles()
+        all_files = self.getFiles(ac_version)
         lib_files = filter_filelist(constants.NL, all_files,
           'lib/', '', 'lib/', '').split(constants.NL)
         extra_files = [f for f in lib_files if f not in mentioned_files]
@@ -748,32 +961,15 @@ Include:|Link:|License:|Maintainer:)'
           result += string('EXTRA_DIST += %s' % top_files)
           result += '\n\n'
       result = constants.nlconvert(result)
-      self.cache['makefile-unconditional'] = result
-    return(self.cache['makefile-unconditional'])
+      self.cache[key] = result
+    return(self.cache[key])
     
   def getInclude(self):
     '''GLModule.getInclude() -> string
     
     Return include directive.'''
-    section = 'Include:'
     if 'include' not in self.cache:
-      if section not in self.content:
-        result = string()
-      else: # if section in self.content
-        snippet = self.content.split(section)[-1]
-        snippet = snippet.replace('\r\n', '\n')
-        lines = ['%s\n' % line for line in snippet.split('\n')]
-        parts = list()
-        for line in lines:
-          regex = '^(Description|Comment|Status|Notice|Applicability|'
-          regex += 'Files|Depends-on|configure\\.ac-early|configure\\.ac|'
-          regex += 'Makefile\\.am|Include|Link|License|Maintainer):$'
-          pattern = compiler(regex)
-          findflag = pattern.findall(line)
-          if findflag:
-            break
-          parts += [line]
-        result = ''.join(parts)
+      result = self.getSection('Include')
       result = result.strip()
       pattern = compiler('^(["<].*?[>"])', re.S | re.M)
       result = pattern.sub('#include \\1', result)
@@ -784,39 +980,28 @@ Include:|Link:|License:|Maintainer:)'
     '''GLModule.getLink() -> string
     
     Return link directive.'''
-    section = 'Link:'
     if 'link' not in self.cache:
-      if section not in self.content:
-        result = string()
-      else: # if section in self.content
-        snippet = self.content.split(section)[-1]
-        snippet = snippet.replace('\r\n', '\n')
-        lines = ['%s\n' % line for line in snippet.split('\n')]
-        parts = list()
-        for line in lines:
-          regex = '^(Description|Comment|Status|Notice|Applicability|'
-          regex += 'Files|Depends-on|configure\\.ac-early|configure\\.ac|'
-          regex += 'Makefile\\.am|Include|Link|License|Maintainer):$'
-          pattern = compiler(regex)
-          findflag = pattern.findall(line)
-          if findflag:
-            break
-          parts += [line]
-        parts = [part.strip() for part in parts if part.strip()]
-        result = ''.join(parts)
+      snippet = self.getSection('Link')
+      parts = [line.strip() for line in snippet.split('\n') if line.strip()]
+      result = ''.join(parts)
       self.cache['link'] = result
     return(self.cache['link'])
     
-  def getLicense(self):
-    '''GLModule.getLicense(self) -> string
+  def getLicense(self, errors=None):
+    '''GLModule.getLicense([errors]) -> string
     
-    Get license and warn user if module lacks a license.'''
+    Get license and warn user if module lacks a license; if errors is True,
+    raise an error instead. If errors is None, it is taken from the
+    configuration.
+    GLConfig: errors.'''
+    if errors == None:
+      errors = self.config['errors']
     license = self.getLicense_Raw()
     if not self.isTests():
       if not license:
-        if self.config['errors']:
+        if errors:
           raise(GLError(18, string(self)))
-        else: # if not self.config['errors']
+        else: # if not errors
           sys.stderr.write('gnulib-tool: warning: ')
           sys.stderr.write('module %s lacks a license\n' % str(self))
     if not license:
@@ -827,20 +1012,8 @@ Include:|Link:|License:|Maintainer:)'
     '''GLModule.getLicense_Raw() -> string
     
     Return module license.'''
-    section = 'License:'
     if 'license' not in self.cache:
-      if section not in self.content:
-        result = string()
-      else: # if section in self.content
-        pattern = '^%s[\t ]*(.*?)%s' % (section, self.regex)
-        pattern = compiler(pattern, re.S | re.M)
-        result = pattern.findall(self.content)
-        if type(result) is list:
-          if not result:
-            result = string()
-          else: # if result
-            result = result[-1]
-      result = result.strip()
+      result = self.getSection('License').strip()
       self.cache['license'] = result
     return(self.cache['license'])
     
@@ -848,28 +1021,48 @@ Include:|Link:|License:|Maintainer:)'
     '''GLModule.getMaintainer() -> string
     
     Return maintainer directive.'''
-    section = 'Maintainer:'
     if 'maintainer' not in self.cache:
-      if section not in self.content:
-        result = string()
-      else: # if section in self.content
-        snippet = self.content.split(section)[-1]
-        snippet = snippet.replace('\r\n', '\n')
-        lines = ['%s\n' % line for line in snippet.split('\n')]
-        parts = list()
-        for line in lines:
-          regex = '^(Description|Comment|Status|Notice|Applicability|'
-          regex += 'Files|Depends-on|configure\\.ac-early|configure\\.ac|'
-          regex += 'Makefile\\.am|Include|Link|License|Maintainer):$'
-          pattern = compiler(regex)
-          findflag = pattern.findall(line)
-          if findflag:
-            break
-          parts += [line]
-        result = ''.join(parts)
-      result = result.strip()
+      result = self.getSection('Maintainer').strip()
       self.cache['maintainer'] = result
     return(self.cache['maintainer'])
+    
+  def getFields(self, fields=None):
+    '''GLModule.getFields([fields]) -> dict
+    
+    Return the dictionary which maps every given field name to its value; by
+    default, all FIELDS are returned. Dependencies are returned as the list of
+    module name and condition and they are not looked up; license is returned
+    as is, without warning; tests-module is None if there is no such module.'''
+    if fields == None:
+      fields = FIELDS
+    getters = dict()
+    getters['name'] = self.getName
+    getters['description'] = self.getDescription
+    getters['comment'] = self.getComment
+    getters['status'] = self.getStatus
+    getters['notice'] = self.getNotice
+    getters['applicability'] = self.getApplicability
+    getters['files'] = self.getFiles
+    getters['dependencies'] = self.getDependencies_Raw
+    getters['autoconf-early'] = self.getAutoconfSnippet_Early
+    getters['autoconf'] = self.getAutoconfSnippet
+    getters['automake'] = self.getAutomakeSnippet
+    getters['include'] = self.getInclude
+    getters['link'] = self.getLink
+    getters['license'] = self.getLicense_Raw
+    getters['maintainer'] = self.getMaintainer
+    result = dict()
+    for field in fields:
+      if field == 'tests-module':
+        result[field] = None
+        if self.isNonTests() and \
+        self.modulesystem.exists(self.getTestsName()):
+          result[field] = self.getTestsName()
+      elif field in getters:
+        result[field] = getters[field]()
+      else: # if field is unknown
+        raise(KeyError('unknown field: %s' % repr(field)))
+    return(result)
 
 
 #===============================================================================
@@ -878,8 +1071,8 @@ Include:|Link:|License:|Maintainer:)'
 class GLModuleTable(object):
   '''GLModuleTable is used to work with the list of the modules.'''
   
-  def __init__(self, config, avoids=list()):
-    '''GLModuleTable.__init__(config, avoids) -> GLModuleTable
+  def __init__(self, config, avoids=list(), modulesystem=None):
+    '''GLModuleTable.__init__(config, avoids[, modulesystem]) -> GLModuleTable
     
     Create new GLModuleTable instance. If modules are specified, then add
     every module from iterable as unconditional module. If avoids is specified,
@@ -888,8 +1081,11 @@ class GLModuleTable(object):
     don't add module which status is in the testflags. If conddeps are enabled,
     then store condition for each dependency if it has a condition.
     The only necessary argument is localdir, which is needed just to create
-    modulesystem instance to look for dependencies.'''
+    modulesystem instance to look for dependencies. The caller may pass its
+    own modulesystem instead, so the found modules are shared with it.'''
     self.avoids = list() # Avoids
+    self.edges = dict() # Module name -> list of dependency names and conditions
+    self.resolved = dict() # Module name -> list of GLModules and conditions
     self.dependers = dict() # Dependencies
     self.conditionals = dict() # Conditional modules
     self.unconditionals = dict() # Unconditional modules
@@ -904,9 +1100,14 @@ class GLModuleTable(object):
       if type(avoid) is not GLModule:
         raise(TypeError('each avoid must be a GLModule instance'))
       self.avoids += [avoids]
+    if modulesystem == None:
+      modulesystem = GLModuleSystem(config)
+    elif type(modulesystem) is not GLModuleSystem:
+      raise(TypeError('modulesystem must be a GLModuleSystem, not %s' % \
+        type(modulesystem).__name__))
     self.config = config
-    self.filesystem = GLFileSystem(self.config)
-    self.modulesystem = GLModuleSystem(self.config)
+    self.modulesystem = modulesystem
+    self.filesystem = self.modulesystem.filesystem
     
   def __repr__(self):
     '''x.__repr__() <==> repr(x)'''
@@ -948,8 +1149,8 @@ class GLModuleTable(object):
         type(condition).__name__))
     if not str(module) in self.unconditionals:
       if str(module) not in self.dependers:
-        self.dependers[module] = list()
-      self.dependers[module] += [module]
+        self.dependers[str(module)] = list()
+      self.dependers[str(module)] += [str(parent)]
       key = '%s---%s' % (str(parent), str(module))
       self.conditionals[key] = condition
     
@@ -991,6 +1192,52 @@ class GLModuleTable(object):
       result = self.conditionals[key]
     return(result)
     
+  def getDependencies(self, module):
+    '''GLModuleTable.getDependencies(module) -> list
+    
+    Return list of dependencies of the given module as tuples of GLModule and
+    condition. Dependency names are remembered by the module name, so they
+    may be taken from the previous run using setEdges. Found dependencies are
+    remembered too, so every module is looked up only once.'''
+    if type(module) is not GLModule:
+      raise(TypeError('module must be a GLModule, not %s' % \
+        type(module).__name__))
+    name = str(module)
+    if name not in self.edges:
+      self.edges[name] = list(module.getDependencies_Raw())
+      self.resolved[name] = module.getDependencies()
+    if name not in self.resolved:
+      self.resolved[name] = \
+      [ # Begin the list of dependencies
+        tuple([self.modulesystem.find(depmodule), condition])
+        for depmodule, condition in self.edges[name]
+      ] # Finish the list of dependencies
+    result = list(self.resolved[name])
+    return(result)
+    
+  def getEdges(self):
+    '''GLModuleTable.getEdges() -> dict
+    
+    Return the dictionary which maps name of every module handled by the
+    transitive closure to the list of its dependency names and conditions.'''
+    result = dict()
+    for name in self.edges:
+      result[name] = list(self.edges[name])
+    return(result)
+    
+  def setEdges(self, edges):
+    '''GLModuleTable.setEdges(edges)
+    
+    Use the given dependency names and conditions instead of the ones from
+    the module descriptions; edges is a dictionary returned by getEdges. The
+    caller is responsible for passing only the modules which did not change.'''
+    if type(edges) is not dict:
+      raise(TypeError('edges must be a dict, not %s' % type(edges).__name__))
+    for name in edges:
+      self.edges[name] = [tuple(edge) for edge in edges[name]]
+      if name in self.resolved:
+        self.resolved.pop(name)
+    
   def transitive_closure(self, modules):
     '''GLModuleTable.transitive_closure(modules) -> list
     
@@ -1004,86 +1251,62 @@ class GLModuleTable(object):
     for module in modules:
       if type(module) is not GLModule:
         raise(TypeError('each module must be a GLModule instance'))
-    handledmodules = list()
-    inmodules = modules
-    outmodules = list()
+    handledmodules = set()
+    inmodules = list(modules)
+    outmodules = set()
+    excluded = self.config.getExcludedStatusMask()
     if self.config['conddeps']:
       for module in modules:
         self.addUnconditional(module)
     while inmodules:
       inmodules_this_round = inmodules
-      inmodules = list()
+      inmodules = set()
       for module in inmodules_this_round:
-        outmodules += [module]
+        outmodules.add(module)
         if self.config['conddeps']:
+          # A module whose Makefile.am snippet contains a reference to an
+          # automake conditional cannot be used conditionally, since automake
+          # does not support nested conditionals.
           automake_snippet = \
             module.getAutomakeSnippet_Conditional()
-          pattern = compiler('^if')
-          if not pattern.findall(automake_snippet):
+          if compiler('^if ', re.M).search(automake_snippet):
             self.addUnconditional(module)
           conditional = self.isConditional(module)
-        dependencies = module.getDependencies()
-        depmodules = [pair[0] for pair in dependencies]
-        conditions = [pair[1] for pair in dependencies]
+        dependencies = self.getDependencies(module)
         if TESTS['tests'] in self.config['testflags']:
           testsname = module.getTestsName()
           if self.modulesystem.exists(testsname):
             testsmodule = self.modulesystem.find(testsname)
-            depmodules += [testsmodule]
-            conditions += [None]
-        for depmodule in depmodules:
-          include = True
-          includes = list()
-          status = depmodule.getStatus()
-          for word in status:
-            if word == 'obsolete':
-              if TESTS['obsolete'] in self.config['testflags'] or \
-              TESTS['all-test'] in self.config['testflags']:
-                includes += [False]
-            elif word == 'c++-test':
-              if TESTS['c++-test'] in self.config['testflags'] or \
-              TESTS['all-test'] in self.config['testflags']:
-                includes += [False]
-            elif word == 'longrunning-test':
-              if TESTS['longrunning-test'] in self.config['testflags'] or \
-              TESTS['all-test'] in self.config['testflags']:
-                includes += [False]
-            elif word == 'privileged-test':
-              if TESTS['privileged-test'] in self.config['testflags'] or \
-              TESTS['all-test'] in self.config['testflags']:
-                includes += [False]
-            elif word == 'all-test':
-              if TESTS['all-test'] in self.config['testflags'] or \
-              TESTS['all-test'] in self.config['testflags']:
-                includes += [False]
-            else: # if any other word
-              if word.endswith('-tests'):
-                if TESTS['all-test'] in self.config['testflags']:
-                  includes += [False]
-            include = any(includes)
+            dependencies += [tuple([testsmodule, None])]
+        # If module depends on the same module several times, the condition
+        # of the first dependency is used.
+        conditions = dict()
+        for depmodule, condition in dependencies:
+          if depmodule not in conditions:
+            conditions[depmodule] = condition
+        for depmodule, condition in dependencies:
+          include = not depmodule.getStatusMask() & excluded
           if include and depmodule not in self.avoids:
-            inmodules += [depmodule]
+            inmodules.add(depmodule)
             if self.config['conddeps']:
-              index = depmodules.index(depmodule)
-              condition = conditions[index]
+              condition = conditions[depmodule]
               if condition:
+                # Condition is written in brackets after the module name.
+                if condition.startswith('[') and condition.endswith(']'):
+                  condition = condition[1:-1].strip()
                 self.addConditional(module, depmodule, condition)
               else: # if condition
                 if conditional:
                   self.addConditional(module, depmodule, True)
                 else: # if not conditional
-                  self.addUnconditional(module)
-      listing = list() # Create empty list
-      inmodules = sorted(set(inmodules))
-      handledmodules = sorted(set(handledmodules +inmodules_this_round))
-      inmodules = \
-      [ # Begin to filter inmodules
-        module for module in inmodules if module not in handledmodules
-      ] # Finish to filter inmodules
-      inmodules = sorted(set(inmodules))
-    modules = sorted(set(outmodules))
+                  self.addUnconditional(depmodule)
+      handledmodules.update(inmodules_this_round)
+      inmodules = sorted(inmodules.difference(handledmodules))
+    modules = sorted(outmodules)
     self.modules = modules
     return(list(modules))
+  transitive_closure = \
+    GLProfiler.measure('GLModuleTable.transitive_closure', transitive_closure)
     
   def transitive_closure_separately(self, basemodules, finalmodules):
     '''GLModuleTable.transitive_closure_separately(*args, **kwargs) -> tuple
@@ -1125,6 +1348,9 @@ class GLModuleTable(object):
       self.config.setTestFlags(testflags)
     result = tuple([main_modules, tests_modules])
     return(result)
+  transitive_closure_separately = \
+    GLProfiler.measure('GLModuleTable.transitive_closure_separately',
+      transitive_closure_separately)
     
   def add_dummy(self, modules):
     '''GLModuleTable.add_dummy(modules) -> list
@@ -1138,7 +1364,7 @@ class GLModuleTable(object):
     for module in modules:
       if type(module) is not GLModule:
         raise(TypeError('each module must be a GLModule instance'))
-      snippet = module.getAutomakeSnippet()
+      snippet = module.getAutomakeSnippet(auxdir, ac_version)
       snippet = snippet.replace('\\\n', '')
       pattern = compiler('^lib_SOURCES[\t ]*\\+=[\t ]*(.*?)$', re.S | re.M)
       files = pattern.findall(snippet)
@@ -1164,7 +1390,7 @@ class GLModuleTable(object):
     for module in modules:
       if type(module) is not GLModule:
         raise(TypeError('each module must be a GLModule instance'))
-    listings = [module.getFiles() for module in modules]
+    listings = [module.getFiles(ac_version) for module in modules]
     for listing in listings:
       for file in listing:
         if file not in filelist:
@@ -1189,6 +1415,8 @@ class GLModuleTable(object):
     ] # Finish to sort filelist
     result = tuple([main_filelist, tests_filelist])
     return(result)
+  filelist_separately = \
+    GLProfiler.measure('GLModuleTable.filelist_separately', filelist_separately)
     
   def getAvoids(self):
     '''GLModuleTable.getAvoids() -> list
@@ -0,0 +1,320 @@
+#!/usr/bin/python
+# encoding: UTF-8
+
+#===============================================================================
+# Define global imports
+#===============================================================================
+import os
+import sys
+import json
+import time
+import threading
+import subprocess as sp
+from . import constants
+
+
+#===============================================================================
+# Define module information
+#===============================================================================
+__author__ = constants.__author__
+__license__ = constants.__license__
+__copyright__ = constants.__copyright__
+
+
+#===============================================================================
+# Define global constants
+#===============================================================================
+PYTHON3 = constants.PYTHON3
+NoneType = type(None)
+APP = constants.APP
+DIRS = constants.DIRS
+ENCS = constants.ENCS
+UTILS = constants.UTILS
+FILES = constants.FILES
+MODES = constants.MODES
+TESTS = constants.TESTS
+compiler = constants.compiler
+joinpath = constants.joinpath
+cleaner = constants.cleaner
+string = constants.string
+isabs = os.path.isabs
+isdir = os.path.isdir
+isfile = os.path.isfile
+normpath = os.path.normpath
+relpath = os.path.relpath
+LOCK = threading.Lock() # Phases and counters are recorded from many threads
+POPEN = sp.Popen # Original class which is restored when profiler stops
+walltime = getattr(time, 'perf_counter', time.time)
+cputime = getattr(time, 'thread_time', time.process_time)
+
+
+#===============================================================================
+# Define GLProfiler class
+#===============================================================================
+class GLProfiler(object):
+  '''GLProfiler records the wall time and CPU time of the phases of gnulib-tool
+  together with counters like the number of subprocesses and of files and
+  bytes which were read and written. Instrumented code calls the static
+  methods GLProfiler.phase, GLProfiler.measure and GLProfiler.count, which do
+  nothing unless some profiler is started, so the instrumentation is almost
+  free in normal runs. CPU time of the phase is the time of its thread.'''
+    
+  current = None # Started profiler, if any
+    
+  def __init__(self, summary=True, trace=None):
+    '''GLProfiler.__init__(summary=True, trace=None) -> GLProfiler
+    
+    Create new GLProfiler instance. If summary is True, report prints the
+    table of phases and counters to the standard error; if trace is the path
+    to the file, report writes the phases there as Chrome trace events.'''
+    if type(summary) is not bool:
+      raise(TypeError('summary must be a bool, not %s' % \
+        type(summary).__name__))
+    if type(trace) is bytes or type(trace) is string:
+      if type(trace) is bytes:
+        trace = trace.decode(ENCS['default'])
+    elif trace != None:
+      raise(TypeError('trace must be a string, not %s' % \
+        type(trace).__name__))
+    self.summary = summary
+    self.trace = trace
+    self.phases = dict() # name -> [calls, wall, cpu]
+    self.counters = dict() # name -> value
+    self.events = list() # (name, thread, start, wall, cpu)
+    self.started = None
+    self.stopped = None
+    
+  def __repr__(self):
+    '''x.__repr__ <==> repr(x)'''
+    result = '<pygnulib.GLProfiler %s>' % hex(id(self))
+    return(result)
+    
+  def start(self):
+    '''GLProfiler.start()
+    
+    Make this profiler the current one and install the wrapper of Popen class,
+    which counts and times the subprocesses.'''
+    self.started = walltime()
+    self.cpustarted = time.process_time()
+    GLProfiler.current = self
+    sp.Popen = GLPopen
+    
+  def stop(self):
+    '''GLProfiler.stop()
+    
+    Stop recording and restore the original Popen class.'''
+    if GLProfiler.current is self:
+      GLProfiler.current = None
+      sp.Popen = POPEN
+    if self.stopped == None:
+      self.stopped = walltime()
+      self.cpustopped = time.process_time()
+    
+  def record(self, name, start, wall, cpu):
+    '''GLProfiler.record(name, start, wall, cpu)
+    
+    Record one run of the given phase, which was started at the given time
+    and took the given wall time and CPU time in seconds.'''
+    thread = threading.current_thread().ident
+    with LOCK:
+      if name not in self.phases:
+        self.phases[name] = [0, 0.0, 0.0]
+      phase = self.phases[name]
+      phase[0] += 1
+      phase[1] += wall
+      phase[2] += cpu
+      self.events += [tuple([name, thread, start, wall, cpu])]
+    
+  def add(self, name, value):
+    '''GLProfiler.add(name, value)
+    
+    Add the given value to the counter with the given name.'''
+    with LOCK:
+      self.counters[name] = self.counters.get(name, 0) +value
+    
+  def getSummary(self):
+    '''GLProfiler.getSummary() -> string
+    
+    Return the table of phases, sorted by the wall time, and of counters.
+    Times of the nested phases are included in the times of outer phases.'''
+    stopped = self.stopped if self.stopped != None else walltime()
+    cpustopped = self.cpustopped if self.stopped != None \
+      else time.process_time()
+    lines = list()
+    lines += ['%-44s %7s %10s %10s' % ('Phase', 'Calls', 'Wall', 'CPU')]
+    phases = sorted(self.phases.items(), key=lambda pair: -pair[1][1])
+    for name, (calls, wall, cpu) in phases:
+      lines += ['%-44s %7d %9.3fs %9.3fs' % (name, calls, wall, cpu)]
+    lines += ['%-44s %7s %9.3fs %9.3fs' % ('Total', '',
+      stopped -self.started, cpustopped -self.cpustarted)]
+    if self.counters:
+      lines += ['']
+      lines += ['%-44s %29s' % ('Counter', 'Value')]
+      for name in sorted(self.counters):
+        lines += ['%-44s %29d' % (name, self.counters[name])]
+    result = '\n'.join(lines) +'\n'
+    return(result)
+    
+  def getTrace(self):
+    '''GLProfiler.getTrace() -> dict
+    
+    Return the phases as Chrome trace events, which can be loaded into the
+    chrome://tracing, Perfetto or speedscope viewers. Every phase is complete
+    event in microseconds; final values of counters are counter events.'''
+    pid = os.getpid()
+    stopped = self.stopped if self.stopped != None else walltime()
+    events = list()
+    for name, thread, start, wall, cpu in self.events:
+      event = dict()
+      event['name'] = name
+      event['cat'] = name.split(' ')[0].split('.')[0]
+      event['ph'] = 'X'
+      event['ts'] = round((start -self.started) *1000000, 3)
+      event['dur'] = round(wall *1000000, 3)
+      event['pid'] = pid
+      event['tid'] = thread
+      event['args'] = dict([('cpu_ms', round(cpu *1000, 3))])
+      events += [event]
+    for name in sorted(self.counters):
+      event = dict()
+      event['name'] = name
+      event['ph'] = 'C'
+      event['ts'] = round((stopped -self.started) *1000000, 3)
+      event['pid'] = pid
+      event['args'] = dict([('value', self.counters[name])])
+      events += [event]
+    result = dict()
+    result['traceEvents'] = events
+    result['displayTimeUnit'] = 'ms'
+    result['otherData'] = dict([('argv', list(sys.argv))])
+    return(result)
+    
+  def report(self):
+    '''GLProfiler.report()
+    
+    Stop the profiler, print the summary to the standard error and write the
+    trace file, as requested when profiler was created.'''
+    self.stop()
+    if self.summary:
+      sys.stderr.write(self.getSummary())
+      sys.stderr.flush()
+    if self.trace:
+      with open(self.trace, 'w') as file:
+        json.dump(self.getTrace(), file)
+    
+  def phase(name):
+    '''GLProfiler.phase(name) -> context manager
+    
+    Return the context manager which records the block as the phase with the
+    given name, if some profiler is started.'''
+    profiler = GLProfiler.current
+    if profiler == None:
+      return(NOPHASE)
+    return(GLPhase(profiler, name))
+  phase = staticmethod(phase)
+    
+  def measure(name, function):
+    '''GLProfiler.measure(name, function) -> function
+    
+    Return the function which records every call of the given function as the
+    phase with the given name, if some profiler is started. It is applied
+    inside the class body in the same way as staticmethod.'''
+    def wrapper(*args, **kwargs):
+      profiler = GLProfiler.current
+      if profiler == None:
+        return(function(*args, **kwargs))
+      with GLPhase(profiler, name):
+        return(function(*args, **kwargs))
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return(wrapper)
+  measure = staticmethod(measure)
+    
+  def count(name, value=1):
+    '''GLProfiler.count(name, value=1)
+    
+    Add the given value to the counter with the given name, if some profiler
+    is started.'''
+    profiler = GLProfiler.current
+    if profiler != None:
+      profiler.add(name, value)
+  count = staticmethod(count)
+    
+    
+#===============================================================================
+# Define GLPhase class
+#===============================================================================
+class GLPhase(object):
+  '''GLPhase is the context manager which records its block as a phase.'''
+    
+  def __init__(self, profiler, name):
+    '''GLPhase.__init__(profiler, name) -> GLPhase'''
+    self.profiler = profiler
+    self.name = name
+    
+  def __enter__(self):
+    '''GLPhase.__enter__() -> GLPhase'''
+    self.wall = walltime()
+    self.cpu = cputime()
+    return(self)
+    
+  def __exit__(self, type, value, traceback):
+    '''GLPhase.__exit__(type, value, traceback) -> bool'''
+    self.profiler.record(self.name, self.wall, walltime() -self.wall,
+      cputime() -self.cpu)
+    return(False)
+    
+    
+#===============================================================================
+# Define GLNullPhase class
+#===============================================================================
+class GLNullPhase(object):
+  '''GLNullPhase is the context manager which does nothing; it is used when
+  no profiler is started.'''
+    
+  def __enter__(self):
+    '''GLNullPhase.__enter__() -> GLNullPhase'''
+    return(self)
+    
+  def __exit__(self, type, value, traceback):
+    '''GLNullPhase.__exit__(type, value, traceback) -> bool'''
+    return(False)
+    
+NOPHASE = GLNullPhase()
+
+
+#===============================================================================
+# Define GLPopen class
+#===============================================================================
+class GLPopen(POPEN):
+  '''GLPopen replaces subprocess.Popen while profiler is started. It counts
+  the subprocesses by program name and records the time from the start of
+  every subprocess to the moment when it was reaped as the phase. CPU time
+  of such phase is the time which the parent spent meanwhile.'''
+    
+  def __init__(self, args, *rest, **kwargs):
+    '''GLPopen.__init__(args, ...) -> GLPopen'''
+    program = args
+    if type(program) is not bytes and type(program) is not string:
+      program = list(program)[0] if program else string()
+    if type(program) is bytes:
+      program = program.decode(ENCS['default'])
+    if kwargs.get('shell'):
+      program = str(program).split(' ')[0]
+    self.phasename = 'subprocess %s' % os.path.basename(str(program))
+    self.phasestart = walltime()
+    self.phasecpu = cputime()
+    GLProfiler.count('subprocesses')
+    GLProfiler.count(self.phasename)
+    POPEN.__init__(self, args, *rest, **kwargs)
+    
+  def wait(self, *args, **kwargs):
+    '''GLPopen.wait(...) -> int'''
+    result = POPEN.wait(self, *args, **kwargs)
+    profiler = GLProfiler.current
+    if profiler != None and self.phasestart != None:
+      profiler.record(self.phasename, self.phasestart,
+        walltime() -self.phasestart, cputime() -self.phasecpu)
+      self.phasestart = None
+    return(result)
+    
@@ -0,0 +1,295 @@
+#!/usr/bin/python
+# encoding: UTF-8
+
+#===============================================================================
+# Define global imports
+#===============================================================================
+import os
+import gc
+import sys
+import json
+import socket
+import struct
+import threading
+import traceback
+import socketserver
+from . import constants
+from .GLConfig import GLConfig
+from .GLModuleSystem import GLModuleSystem
+from .GLModuleDatabase import DATABASES
+
+
+#===============================================================================
+# Define module information
+#===============================================================================
+__author__ = constants.__author__
+__license__ = constants.__license__
+__copyright__ = constants.__copyright__
+
+
+#===============================================================================
+# Define global constants
+#===============================================================================
+PYTHON3 = constants.PYTHON3
+NoneType = type(None)
+APP = constants.APP
+DIRS = constants.DIRS
+ENCS = constants.ENCS
+UTILS = constants.UTILS
+FILES = constants.FILES
+MODES = constants.MODES
+TESTS = constants.TESTS
+compiler = constants.compiler
+joinpath = constants.joinpath
+cleaner = constants.cleaner
+string = constants.string
+isabs = os.path.isabs
+isdir = os.path.isdir
+isfile = os.path.isfile
+normpath = os.path.normpath
+relpath = os.path.relpath
+# Every frame is channel, length of payload and payload.
+FRAME = struct.Struct('<BI')
+STATUS = struct.Struct('<i')
+CHANNELS = dict() # Channels of frames
+CHANNELS['request'] = 0 # JSON object with argv, cwd and environ
+CHANNELS['stdout'] = 1 # Data written to the standard output
+CHANNELS['stderr'] = 2 # Data written to the standard error
+CHANNELS['exit'] = 3 # Exit status
+
+
+#===============================================================================
+# Define GLServer class
+#===============================================================================
+class GLServer(object):
+  '''GLServer runs gnulib-tool requests which come over the Unix socket. The
+  server parses all module descriptions once and keeps the module system in
+  memory together with the reverse dependency index, the index of files and
+  the cache of patched files. Every request is run in the forked child
+  process, which inherits this warm state: it works in the directory and
+  with the environment of the client, and its standard output and error,
+  including the output of subprocesses, are sent back to the client in
+  frames, followed by the exit status. Module descriptions are read when the
+  server starts, so the server must be restarted after they are changed.'''
+    
+  def __init__(self, config, path, target):
+    '''GLServer.__init__(config, path, target) -> GLServer
+    
+    Create new GLServer instance, which listens on the Unix socket with the
+    given path. Config is used to warm up the module system; target is the
+    function which runs gnulib-tool for the arguments in sys.argv.'''
+    if type(config) is not GLConfig:
+      raise(TypeError('config must be a GLConfig, not %s' % \
+        type(config).__name__))
+    if type(path) is bytes or type(path) is string:
+      if type(path) is bytes:
+        path = path.decode(ENCS['default'])
+    else: # if path has not bytes or string type
+      raise(TypeError('path must be a string, not %s' % type(path).__name__))
+    if not callable(target):
+      raise(TypeError('target must be callable, not %s' % \
+        type(target).__name__))
+    self.config = config
+    self.path = os.path.abspath(path)
+    self.target = target
+    self.modulesystem = None
+    
+  def __repr__(self):
+    '''x.__repr__ <==> repr(x)'''
+    result = '<pygnulib.GLServer %s>' % hex(id(self))
+    return(result)
+    
+  def warm(self):
+    '''GLServer.warm()
+    
+    Parse all module descriptions, build the reverse dependency index and the
+    index of files and save the module database. The module system is shared,
+    so every module system of the requests starts with its modules and
+    indices and finds everything in memory.
+    GLConfig: localdir, modcache, errors.'''
+    modulesystem = GLModuleSystem(self.config)
+    database = modulesystem.getDatabase()
+    if database:
+      database.shared = True
+    for name in modulesystem.list():
+      modulesystem.find(name).getSections()
+      if modulesystem.exists('%s-tests' % name):
+        modulesystem.find('%s-tests' % name).getSections()
+    modulesystem.getReverseIndex()
+    modulesystem.getFileIndex()
+    if database:
+      database.save()
+    modulesystem.share()
+    self.modulesystem = modulesystem
+    
+  def serve(self):
+    '''GLServer.serve()
+    
+    Warm up and serve the requests until the server is interrupted. Socket is
+    accessible only by the current user and it is removed at exit.'''
+    if os.path.exists(self.path):
+      if GLServer.request(self.path, None) != None:
+        raise(OSError('server is already running at %s' % self.path))
+      os.remove(self.path)
+    self.warm()
+    # Warm objects are never freed, so garbage collector of every child need
+    # not scan them; it also keeps the pages of the parent shared.
+    if hasattr(gc, 'freeze'):
+      gc.collect()
+      gc.freeze()
+    # Socket is created with restricted permissions, so nobody else can
+    # connect before it is ready.
+    umask = os.umask(0o077)
+    try: # Try to bind socket
+      server = GLSocketServer(self.path, GLRequestHandler)
+    finally: # Restore umask
+      os.umask(umask)
+    server.target = self.target
+    try: # Try to serve requests
+      server.serve_forever()
+    except KeyboardInterrupt as error:
+      pass
+    finally: # Remove socket
+      server.server_close()
+      if os.path.exists(self.path):
+        os.remove(self.path)
+    
+  def request(path, argv):
+    '''GLServer.request(path, argv) -> int or None
+    
+    Send the given arguments together with the current directory and the
+    environment to the server listening on the given socket, copy the output
+    of the request to the standard output and error and return the exit
+    status. If argv is None, only check whether server is running. Return None
+    if there is no server, so the caller can do the work itself.'''
+    try: # Try to connect
+      connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+      connection.connect(path)
+    except (OSError, socket.error) as error:
+      return(None)
+    if argv == None:
+      connection.close()
+      return(0)
+    request = dict()
+    request['argv'] = list(argv)
+    request['cwd'] = os.getcwd()
+    request['environ'] = dict(os.environ)
+    payload = json.dumps(request).encode(ENCS['default'])
+    result = 1
+    reader = connection.makefile('rb')
+    try: # Try to process request
+      connection.sendall(FRAME.pack(CHANNELS['request'], len(payload)))
+      connection.sendall(payload)
+      while True:
+        header = reader.read(FRAME.size)
+        if len(header) < FRAME.size:
+          break # Server has gone away
+        channel, length = FRAME.unpack(header)
+        payload = reader.read(length)
+        if channel == CHANNELS['stdout']:
+          sys.stdout.buffer.write(payload)
+          sys.stdout.buffer.flush()
+        elif channel == CHANNELS['stderr']:
+          sys.stderr.buffer.write(payload)
+          sys.stderr.buffer.flush()
+        elif channel == CHANNELS['exit']:
+          result = STATUS.unpack(payload)[0]
+          break
+    finally: # Close connection
+      reader.close()
+      connection.close()
+    return(result)
+  request = staticmethod(request)
+
+
+#===============================================================================
+# Define GLSocketServer class
+#===============================================================================
+class GLSocketServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+  '''GLSocketServer is the Unix stream server which handles every connection
+  in the forked child process.'''
+    
+  target = None
+
+
+#===============================================================================
+# Define GLRequestHandler class
+#===============================================================================
+class GLRequestHandler(socketserver.BaseRequestHandler):
+  '''GLRequestHandler runs one gnulib-tool request in the forked child
+  process of GLSocketServer.'''
+    
+  def send(self, channel, payload):
+    '''GLRequestHandler.send(channel, payload)
+    
+    Send one frame to the client. Frames from different threads never mix.'''
+    with self.lock:
+      self.request.sendall(FRAME.pack(channel, len(payload)) +payload)
+    
+  def pump(self, fd, channel):
+    '''GLRequestHandler.pump(fd, channel)
+    
+    Send everything which is read from the given descriptor to the client
+    until end of file.'''
+    while True:
+      data = os.read(fd, 65536)
+      if not data:
+        break
+      self.send(channel, data)
+    os.close(fd)
+    
+  def handle(self):
+    '''GLRequestHandler.handle()
+    
+    Read the request, redirect descriptors 1 and 2 to the pipes which are
+    pumped to the client, run the target and send its exit status.'''
+    self.lock = threading.Lock()
+    reader = self.request.makefile('rb')
+    header = reader.read(FRAME.size)
+    if len(header) < FRAME.size:
+      return
+    channel, length = FRAME.unpack(header)
+    request = json.loads(reader.read(length).decode(ENCS['default']))
+    reader.close()
+    os.environ.clear()
+    os.environ.update(request['environ'])
+    os.chdir(request['cwd'])
+    DIRS['cwd'] = request['cwd']
+    sys.argv = [sys.argv[0]] +request['argv']
+    saved = [os.dup(1), os.dup(2)]
+    threads = list()
+    for fd, channel in [(1, 'stdout'), (2, 'stderr')]:
+      rfd, wfd = os.pipe()
+      os.dup2(wfd, fd)
+      os.close(wfd)
+      thread = threading.Thread(target=self.pump,
+        args=(rfd, CHANNELS[channel]))
+      thread.start()
+      threads += [thread]
+    status = 0
+    try: # Try to run target
+      self.server.target()
+    except SystemExit as error:
+      if error.code == None:
+        status = 0
+      elif type(error.code) is int:
+        status = error.code
+      else: # if error.code is message
+        sys.stderr.write('%s\n' % error.code)
+        status = 1
+    except Exception as error:
+      traceback.print_exc()
+      status = 1
+    finally: # Restore descriptors
+      sys.stdout.flush()
+      sys.stderr.flush()
+      os.dup2(saved[0], 1)
+      os.dup2(saved[1], 2)
+      os.close(saved[0])
+      os.close(saved[1])
+    for thread in threads:
+      thread.join()
+    for database in DATABASES.values():
+      database.save()
+    self.send(CHANNELS['exit'], STATUS.pack(status))
+    
@@ -7,11 +7,21 @@
 import os
 import re
 import sys
+import json
+import time
 import locale
 import codecs
 import shutil
 import filecmp
+import tempfile
+import threading
+import multiprocessing
 import subprocess as sp
+from concurrent import futures
+try: # Try to import fcntl
+  import fcntl
+except ImportError as error:
+  fcntl = None
 from . import constants
 from .GLError import GLError
 from .GLConfig import GLConfig
@@ -53,6 +63,14 @@ isabs = os.path.isabs
 isdir = os.path.isdir
 isfile = os.path.isfile
 normpath = os.path.normpath
+# Line of the configure cache which sets the variable.
+CACHEVAR = compiler('^([A-Za-z_][A-Za-z0-9_]*)=')
+LOCK = threading.Lock() # Lock of the shared configure caches
+if fcntl != None:
+  LOCK_SH = fcntl.LOCK_SH
+  LOCK_EX = fcntl.LOCK_EX
+else: # if fcntl == None
+  LOCK_SH = LOCK_EX = None
 
 
 #===============================================================================
@@ -82,7 +100,7 @@ class GLTestDir(object):
     self.emiter = GLEmiter(self.config)
     self.filesystem = GLFileSystem(self.config)
     self.modulesystem = GLModuleSystem(self.config)
-    self.moduletable = GLModuleTable(self.config)
+    self.moduletable = GLModuleTable(self.config, list(), self.modulesystem)
     self.assistant = GLFileAssistant(self.config)
     self.makefiletable = GLMakefileTable(self.config)
     
@@ -162,6 +180,7 @@ class GLTestDir(object):
     single_configure = self.config['single_configure']
     include_guard_prefix = self.config['include_guard_prefix']
     macro_prefix = self.config['macro_prefix']
+    ac_version = self.config['ac_version']
     verbose = self.config['verbosity']
     
     base_modules = [self.modulesystem.find(m) for m in self.config['modules']]
@@ -240,7 +259,7 @@ class GLTestDir(object):
       # Determine whether a $testsbase/libtests.a is needed.
       libtests = False
       for module in tests_modules:
-        files = module.getFiles()
+        files = module.getFiles(ac_version)
         for file in files:
           if file.startswith('lib/'):
             libtests = True
@@ -334,12 +353,13 @@ class GLTestDir(object):
       if isfile(destpath):
         os.remove(destpath)
       if flag:
-        shutil.copy(lookedup, destpath)
+        constants.copy_file(lookedup, destpath, self.config['copymode'])
       else: # if not flag
         if symbolic or (lsymbolic and lookedup == joinpath(localdir, src)):
           constants.link_relative(lookedup, destpath)
         else:
-          shutil.copy(lookedup, destpath)
+          constants.copy_file(lookedup, destpath,
+            self.config['copymode'], True)
     
     # Create $sourcebase/Makefile.am.
     for_test = True
@@ -347,14 +367,14 @@ class GLTestDir(object):
     if not isdir(directory):
       os.mkdir(directory)
     destfile = joinpath(directory, 'Makefile.am')
-    if single_configure:
-      emit, uses_subdirs = self.emiter.lib_Makefile_am(destfile, main_modules,
-        self.moduletable, self.makefiletable, '', for_test)
-    else: # if not single_configure
-      emit, uses_subdirs = self.emiter.lib_Makefile_am(destfile, modules,
-        self.moduletable, self.makefiletable, '', for_test)
     with codecs.open(destfile, 'wb', 'UTF-8') as file:
-      file.write(emit)
+      if single_configure:
+        emit, uses_subdirs = self.emiter.lib_Makefile_am(destfile,
+          main_modules, self.moduletable, self.makefiletable, '', for_test,
+          file)
+      else: # if not single_configure
+        emit, uses_subdirs = self.emiter.lib_Makefile_am(destfile, modules,
+          self.moduletable, self.makefiletable, '', for_test, file)
     any_uses_subdirs = uses_subdirs
     
     # Create $m4base/Makefile.am.
@@ -389,19 +409,17 @@ class GLTestDir(object):
         destfile = joinpath(directory, 'Makefile.am')
         print(repr(destfile))
         witness_macro = '%stests_WITNESS' % macro_prefix
-        emit, uses_subdirs = self.emiter.tests_Makefile_am(destfile,
-          tests_modules, self.makefiletable, witness_macro, for_test)
         with codecs.open(destfile, 'wb', 'UTF-8') as file:
-          file.write(emit)
+          emit, uses_subdirs = self.emiter.tests_Makefile_am(destfile,
+            tests_modules, self.makefiletable, witness_macro, for_test, file)
       else: # if not single_configure
         # Create $testsbase/Makefile.am.
         destfile = joinpath(directory, 'Makefile.am')
         libtests = False
         self.config.disableLibtests()
-        emit, uses_subdirs = self.emiter.tests_Makefile_am(destfile,
-          modules, self.makefiletable, '', for_test)
         with codecs.open(destfile, 'wb', 'UTF-8') as file:
-          file.write(emit)
+          emit, uses_subdirs = self.emiter.tests_Makefile_am(destfile,
+            modules, self.makefiletable, '', for_test, file)
         # Viewed from the $testsbase subdirectory, $auxdir is different.
         emit = string()
         saved_auxdir = self.config['auxdir']
@@ -651,13 +669,16 @@ class GLTestDir(object):
     # Create autogenerated files.
     # Do not use "${AUTORECONF} --force --install", because it may invoke
     # autopoint, which brings in older versions of some of our .m4 files.
-    os.chdir(self.testdir)
+    # Tools are run in the scratch package, the current directory of the
+    # process is never changed, so scratch packages can be created
+    # concurrently.
+    directory = self.testdir
     # gettext
-    if isfile(joinpath(m4base, 'gettext.m4')):
+    if isfile(joinpath(directory, m4base, 'gettext.m4')):
       args = [UTILS['autopoint'], '--force']
-      constants.execute(args, verbose)
-      for src in os.listdir(m4base):
-        src = joinpath(m4base, src)
+      constants.execute(args, verbose, directory)
+      for src in os.listdir(joinpath(directory, m4base)):
+        src = joinpath(directory, m4base, src)
         if src.endswith('.m4~'):
           dest = src[:-1]
           if isfile(dest):
@@ -666,32 +687,31 @@ class GLTestDir(object):
     # libtoolize
     if libtool:
       args = [UTILS['libtoolize'], '--copy']
-      constants.execute(args, verbose)
+      constants.execute(args, verbose, directory)
     # aclocal
     args = [UTILS['aclocal'], '-I', m4base]
-    constants.execute(args, verbose)
-    if not isdir('build-aux'):
-      os.mkdir('build-aux')
+    constants.execute(args, verbose, directory)
+    if not isdir(joinpath(directory, 'build-aux')):
+      os.mkdir(joinpath(directory, 'build-aux'))
     # autoconf
     args = [UTILS['autoconf']]
-    constants.execute(args, verbose)
+    constants.execute(args, verbose, directory)
     # autoheader
     args = [UTILS['autoheader']]
-    constants.execute(args, verbose)
+    constants.execute(args, verbose, directory)
     # automake
     args = [UTILS['automake'], '--add-missing', '--copy']
-    constants.execute(args, verbose)
-    os.chdir(DIRS['cwd'])
+    constants.execute(args, verbose, directory)
     if inctests and not single_configure:
       # Do not use "${AUTORECONF} --force --install", because it may invoke
       # autopoint, which brings in older versions of some of our .m4 files.
-      os.chdir(joinpath(self.testdir, testsbase))
+      directory = joinpath(self.testdir, testsbase)
       # gettext
-      if isfile(joinpath(m4base, 'gettext.m4')):
+      if isfile(joinpath(directory, m4base, 'gettext.m4')):
         args = [UTILS['autopoint'], '--force']
-        constants.execute(args, verbose)
-        for src in os.listdir(m4base):
-          src = joinpath(m4base, src)
+        constants.execute(args, verbose, directory)
+        for src in os.listdir(joinpath(directory, m4base)):
+          src = joinpath(directory, m4base, src)
           if src.endswith('.m4~'):
             dest = src[:-1]
             if isfile(dest):
@@ -699,19 +719,18 @@ class GLTestDir(object):
             shutil.move(src, dest)
       # aclocal
       args = [UTILS['aclocal'], '-I', joinpath('..', m4base)]
-      constants.execute(args, verbose)
-      if not isdir(joinpath('../build-aux')):
-        os.mkdir('../build-aux')
+      constants.execute(args, verbose, directory)
+      if not isdir(joinpath(directory, '..', 'build-aux')):
+        os.mkdir(joinpath(directory, '..', 'build-aux'))
       # autoconf
       args = [UTILS['autoconf']]
-      constants.execute(args, verbose)
+      constants.execute(args, verbose, directory)
       # autoheader
       args = [UTILS['autoheader']]
-      constants.execute(args, verbose)
+      constants.execute(args, verbose, directory)
       # automake
       args = [UTILS['automake'], '--add-missing', '--copy']
-      constants.execute(args, verbose)
-      os.chdir(DIRS['cwd'])
+      constants.execute(args, verbose, directory)
     
     # Need to run configure and make once, to create built files that are to be
     # distributed (such as parse-datetime.c).
@@ -785,11 +804,11 @@ class GLTestDir(object):
         if file not in cleaned_files]
     
     if distributed_built_sources or tests_distributed_built_sources:
-      os.chdir(self.testdir)
-      sp.call('./configure')
+      sp.call('./configure', cwd=self.testdir)
       if distributed_built_sources:
-        os.chdir(sourcebase)
-        with codecs.open('Makefile', 'ab', 'UTF-8') as file:
+        directory = joinpath(self.testdir, sourcebase)
+        path = joinpath(directory, 'Makefile')
+        with codecs.open(path, 'ab', 'UTF-8') as file:
           file.write('built_sources: $(BUILT_SOURCES)\n')
         args = [UTILS['make'],
           'AUTOCONF=%s'   % UTILS['autoconf'],
@@ -798,11 +817,11 @@ class GLTestDir(object):
           'AUTOMAKE=%s'   % UTILS['automake'],
           'AUTORECONF=%s' % UTILS['autoreconf'],
           'built_sources']
-        sp.call(args)
-        os.chdir('..')
+        sp.call(args, cwd=directory)
       if tests_distributed_built_sources:
-        os.chdir(testsbase)
-        with codecs.open('Makefile', 'ab', 'UTF-8') as file:
+        directory = joinpath(self.testdir, testsbase)
+        path = joinpath(directory, 'Makefile')
+        with codecs.open(path, 'ab', 'UTF-8') as file:
           file.write('built_sources: $(BUILT_SOURCES)\n')
         args = [UTILS['make'],
           'AUTOCONF=%s'   % UTILS['autoconf'],
@@ -811,8 +830,7 @@ class GLTestDir(object):
           'AUTOMAKE=%s'   % UTILS['automake'],
           'AUTORECONF=%s' % UTILS['autoreconf'],
           'built_sources']
-        sp.call(args)
-        os.chdir('..')
+        sp.call(args, cwd=directory)
       args = [UTILS['make'],
         'AUTOCONF=%s'   % UTILS['autoconf'],
         'AUTOHEADER=%s' % UTILS['autoheader'],
@@ -822,8 +840,8 @@ class GLTestDir(object):
         'AUTOPOINT=%s'  % UTILS['autopoint'],
         'LIBTOOLIZE=%s' % UTILS['libtoolize'],
         'distclean']
-      sp.call(args)
-    sp.call(['rm', '-rf', self.config['tempdir']], shell=False)
+      sp.call(args, cwd=self.testdir)
+    self.config.removeTempDir()
 
 
 #===============================================================================
@@ -853,15 +871,33 @@ class GLMegaTestDir(object):
     self.emiter = GLEmiter(self.config)
     self.filesystem = GLFileSystem(self.config)
     self.modulesystem = GLModuleSystem(self.config)
-    self.moduletable = GLModuleTable(self.config)
+    self.moduletable = GLModuleTable(self.config, list(), self.modulesystem)
     self.assistant = GLFileAssistant(self.config)
     self.makefiletable = GLMakefileTable(self.config)
+    self.megasubdirs = list()
+    
+  def getSubdirs(self):
+    '''GLMegaTestDir.getSubdirs() -> list
+    
+    Return the list of subdirectories of the mega scratch package which were
+    created successfully by the last call of execute().'''
+    return(list(self.megasubdirs))
     
   def execute(self):
-    '''GLMegaTestDir.execute()
+    '''GLMegaTestDir.execute() -> list
     
     Create a mega scratch package with the given modules one by one and all
-    together.'''
+    together. Scratch packages are created by the pool of worker processes;
+    the size of the pool is limited by jobs. Module descriptions are parsed
+    once and saved to the module database before workers start; every worker
+    uses this database as a read-only snapshot. Failure of one scratch package
+    does not abort the run: it is left out of the mega scratch package and is
+    reported in the summary. Return the list of tuples of failed subdirectory
+    and error message.
+    GLConfig: auxdir, modcache, jobs, configcache, verbosity.'''
+    auxdir = self.config['auxdir']
+    verbose = self.config['verbosity']
+    jobs = self.config['jobs']
     megasubdirs = list()
     modules = [self.modulesystem.find(m) for m in self.config['modules']]
     if not modules:
@@ -869,18 +905,56 @@ class GLMegaTestDir(object):
       modules = [self.modulesystem.find(m) for m in modules]
     modules = sorted(set(modules))
     
+    # Parse all module descriptions before workers start.
+    database = self.modulesystem.getDatabase()
+    if database:
+      for module in self.modulesystem.list():
+        self.modulesystem.find(module).getSections()
+        if self.modulesystem.exists('%s-tests' % module):
+          self.modulesystem.find('%s-tests' % module).getSections()
+      database.save()
+    
     # First, all modules one by one.
+    tasks = list()
     for module in modules:
-      self.config.setModules([str(module)])
-      #GLTestDir(self.config, self.megatestdir).execute()
-      megasubdirs += [str(module)]
+      tasks += [tuple([str(module), [str(module)]])]
     
     # Then, all modules all together.
     # Except config-h, which breaks all modules which use HAVE_CONFIG_H.
     modules = [module for module in modules if str(module) != 'config-h']
-    self.config.setModules([str(module) for module in modules])
-    #GLTestDir(self.config, self.megatestdir).execute()
-    megasubdirs += ['ALL']
+    tasks += [tuple(['ALL', [str(module) for module in modules]])]
+    tasks = \
+    [ # Begin the list of tasks
+      tuple([self.config, joinpath(self.megatestdir, name), names]) \
+      for name, names in tasks
+    ] # Finish the list of tasks
+    
+    # Create scratch packages.
+    failures = list()
+    if jobs > 1 and len(tasks) > 1:
+      sys.stdout.flush()
+      sys.stderr.flush()
+      pool = multiprocessing.Pool(min(jobs, len(tasks)),
+        _initialize_worker_, tuple([self.config]))
+      results = pool.imap(_create_testdir_, tasks)
+    else: # if jobs == 1 or len(tasks) == 1
+      pool = None
+      results = (_create_testdir_(task) for task in tasks)
+    try: # Try to create scratch packages
+      for testdir, output, error in results:
+        name = os.path.basename(testdir)
+        if verbose >= 1:
+          print('created %s' % testdir)
+        sys.stdout.write(output)
+        sys.stdout.flush()
+        if error == None:
+          megasubdirs += [name]
+        else: # if error != None
+          failures += [tuple([name, error])]
+    finally: # Stop workers
+      if pool != None:
+        pool.close()
+        pool.join()
     
     # Create autobuild.
     emit = string()
@@ -925,7 +999,11 @@ class GLMegaTestDir(object):
     emit += '   : autobuild revision... cvs-$CVSDATE-000000\n'
     emit += '   : autobuild timestamp... `date "+%Y%m%d-%H%M%S"`\n'
     emit += '   : autobuild hostname... `hostname`\n'
-    emit += '   cd $module && ./configure $CONFIGURE_OPTIONS && $MAKE'
+    if self.config['configcache']:
+      emit += '   cd $module && ./configure --cache-file=../config.cache'
+      emit += ' $CONFIGURE_OPTIONS && $MAKE'
+    else: # if not self.config['configcache']
+      emit += '   cd $module && ./configure $CONFIGURE_OPTIONS && $MAKE'
     emit += ' && $MAKE check && $MAKE distclean\n'
     emit += '   echo rc=$?\n'
     emit += '  ) 2>&1 | { if test -n "$AUTOBUILD_SUBST"; then '
@@ -960,28 +1038,384 @@ class GLMegaTestDir(object):
       emit += 'AC_CONFIG_AUX_DIR([%s])\n' % auxdir
     emit += 'AM_INIT_AUTOMAKE\n\n'
     emit += 'AC_PROG_MAKE_SET\n\n'
-    emit += 'AC_CONFIG_SUBDIRS([%s])\n' % ' '.megasubdirs
+    emit += 'AC_CONFIG_SUBDIRS([%s])\n' % ' '.join(megasubdirs)
     emit += 'AC_CONFIG_FILES([Makefile])\n'
     emit += 'AC_OUTPUT\n'
     emit = constants.nlconvert(emit)
     if type(emit) is bytes:
       emit = emit.decode(ENCS['default'])
-    path = joinpath(self.megatestdir, 'Makefile.am')
+    path = joinpath(self.megatestdir, 'configure.ac')
     with codecs.open(path, 'wb', 'UTF-8') as file:
       file.write(emit)
     
     # Create autogenerated files.
-    os.chdir(DIRS['cwd'])
+    directory = self.megatestdir
     args = [UTILS['aclocal']]
-    constants.execute(args, verbose)
-    try: # Try to make a directory
-      if not isdir('build-aux'):
-        os,mkdir('build-aux')
-    except Exception as error:
-      pass
+    constants.execute(args, verbose, directory)
+    if not isdir(joinpath(directory, auxdir)):
+      os.makedirs(joinpath(directory, auxdir))
     args = [UTILS['autoconf']]
-    constants.execute(args, verbose)
+    constants.execute(args, verbose, directory)
     args = [UTILS['automake'], '--add-missing', '--copy']
-    constants.execute(args, verbose)
-    sp.call(['rm', '-rf', self.config['tempdir']], shell=False)
+    constants.execute(args, verbose, directory)
+    shutil.rmtree(joinpath(directory, 'autom4te.cache'), True)
+    self.config.removeTempDir()
+    self.megasubdirs = list(megasubdirs)
+    
+    # Show summary of the failed scratch packages.
+    if failures:
+      message = '%s: *** ' % constants.APP['name']
+      message += 'failed to create %d of %d scratch packages:\n' % \
+        (len(failures), len(tasks))
+      for name, error in failures:
+        message += '  %s: %s\n' % (name, error)
+      sys.stderr.write(message)
+    return(failures)
+
+
+#===============================================================================
+# Define GLTestRunner class
+#===============================================================================
+class GLTestRunner(object):
+  '''GLTestRunner class is used to configure, build and check the scratch
+  packages. Several packages are processed concurrently; the CPU budget given
+  by jobs is shared between them and the rest of it is passed to make as -j
+  option. Wall time and exit status of every phase are recorded, so they can
+  be saved to the results file in JSON format. Packages may share the cache
+  of configure: every package starts with the copy of the shared cache and
+  adds its own results to it, so every feature test is run only once.'''
+  
+  def __init__(self, config, testdirs, cache=None):
+    '''GLTestRunner.__init__(config, testdirs[, cache]) -> GLTestRunner
+    
+    Create new GLTestRunner instance for the given list of scratch packages.
+    If cache is given, it is the path to the configure cache shared by all
+    scratch packages.'''
+    if type(config) is not GLConfig:
+      raise(TypeError('config must be a GLConfig, not %s' % \
+        type(config).__name__))
+    if type(testdirs) is not list:
+      raise(TypeError('testdirs must be a list, not %s' % \
+        type(testdirs).__name__))
+    testdirs = \
+    [ # Begin to convert bytes to string
+      testdir.decode(ENCS['default']) \
+      if type(testdir) is bytes else testdir \
+      for testdir in testdirs
+    ] # Finish to convert bytes to string
+    for testdir in testdirs:
+      if type(testdir) is not string:
+        raise(TypeError('each testdir must be a string instance'))
+    if cache != None:
+      if type(cache) is bytes or type(cache) is string:
+        if type(cache) is bytes:
+          cache = cache.decode(ENCS['default'])
+        cache = os.path.abspath(cache)
+      else: # if cache has not bytes or string type
+        raise(TypeError('cache must be a string, not %s' % \
+          type(cache).__name__))
+    self.config = config
+    self.testdirs = [os.path.normpath(testdir) for testdir in testdirs]
+    self.cache = cache
+    self.results = list()
+    
+  def __repr__(self):
+    '''x.__repr__ <==> repr(x)'''
+    result = '<pygnulib.GLTestRunner %s>' % hex(id(self))
+    return(result)
+    
+  def getBudget(self):
+    '''GLTestRunner.getBudget() -> tuple
+    
+    Return tuple of the number of packages which are processed concurrently
+    and the number of jobs which is passed to make.
+    GLConfig: jobs.'''
+    jobs = self.config['jobs']
+    workers = max(1, min(jobs, len(self.testdirs)))
+    makejobs = max(1, jobs // workers)
+    result = tuple([workers, makejobs])
+    return(result)
+    
+  def getPhases(self, makejobs):
+    '''GLTestRunner.getPhases(makejobs) -> list
+    
+    Return the list of tuples of phase name and command, which are run in the
+    build subdirectory of every scratch package one after another.'''
+    make = [UTILS['make'], '-j%d' % makejobs]
+    configure = ['../configure']
+    if self.cache:
+      configure += ['--cache-file=config.cache']
+    result = \
+    [ # Begin the list of phases
+      tuple(['configure', configure]),
+      tuple(['make', list(make)]),
+      tuple(['check', make +['check']]),
+      tuple(['distclean', make +['distclean']]),
+    ] # Finish the list of phases
+    return(result)
+    
+  def getRemaining(self, directory):
+    '''GLTestRunner.getRemaining(directory) -> list
+    
+    Return the sorted list of regular files which remain inside the given
+    directory, in the same form as 'find . -type f -print' shows them.'''
+    result = list()
+    for root, dirnames, filenames in os.walk(directory):
+      for filename in filenames:
+        path = joinpath(root, filename)
+        if isfile(path) and not os.path.islink(path):
+          result += ['./%s' % os.path.relpath(path, directory)]
+    return(sorted(result))
+    
+  def _lock_(self, mode):
+    '''GLTestRunner._lock_(mode) -> file
+    
+    Lock the shared configure cache and return the opened lock file, which
+    must be passed to _unlock_ method. Mode is fcntl.LOCK_SH or LOCK_EX. The
+    lock is held by the file next to the cache, so the cache itself can be
+    replaced atomically.'''
+    LOCK.acquire()
+    file = open('%s.lock' % self.cache, 'ab')
+    if fcntl != None:
+      fcntl.flock(file.fileno(), mode)
+    return(file)
+    
+  def _unlock_(self, file):
+    '''GLTestRunner._unlock_(file)
+    
+    Release the lock of the shared configure cache.'''
+    if fcntl != None:
+      fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    file.close()
+    LOCK.release()
+    
+  def _parse_(self, path):
+    '''GLTestRunner._parse_(path) -> tuple
+    
+    Read the configure cache from the given file. Return tuple of the list of
+    comment lines and the dictionary which maps every cached variable to its
+    line, e.g. 'ac_cv_header_stdio_h=${ac_cv_header_stdio_h=yes}'.'''
+    comments = list()
+    entries = dict()
+    if isfile(path):
+      with codecs.open(path, 'rb', 'UTF-8') as file:
+        for line in file.read().split('\n'):
+          match = CACHEVAR.match(line)
+          if match:
+            entries[match.group(1)] = line
+          elif line.startswith('#'):
+            comments += [line]
+    result = tuple([comments, entries])
+    return(result)
+    
+  def seed(self, build):
+    '''GLTestRunner.seed(build)
+    
+    Copy the shared configure cache to the given build directory.'''
+    if self.cache:
+      file = self._lock_(LOCK_SH)
+      try: # Try to copy cache
+        if isfile(self.cache):
+          shutil.copyfile(self.cache, joinpath(build, 'config.cache'))
+      finally: # Release lock
+        self._unlock_(file)
+    
+  def merge(self, build):
+    '''GLTestRunner.merge(build)
+    
+    Add the variables from the configure cache of the given build directory
+    to the shared configure cache. Variables which are already present in the
+    shared cache are kept as is.'''
+    if self.cache:
+      comments, entries = self._parse_(joinpath(build, 'config.cache'))
+      if not entries:
+        return
+      file = self._lock_(LOCK_EX)
+      try: # Try to merge cache
+        oldcomments, oldentries = self._parse_(self.cache)
+        if oldentries:
+          comments = oldcomments
+        if set(entries).difference(oldentries):
+          entries.update(oldentries)
+          lines = comments +[entries[key] for key in sorted(entries)]
+          temp = '%s.tmp' % self.cache
+          with codecs.open(temp, 'wb', 'UTF-8') as cache:
+            cache.write('%s\n' % '\n'.join(lines))
+          os.rename(temp, self.cache)
+      finally: # Release lock
+        self._unlock_(file)
+    
+  def run(self, testdir, makejobs, capture=False):
+    '''GLTestRunner.run(testdir, makejobs[, capture]) -> dict
+    
+    Configure, build, check and clean the given scratch package in its build
+    subdirectory; stop at the first failed phase. If the configure cache is
+    shared, it is copied before configure and merged back after it. Unless
+    the package failed, check that distclean removed all files from the build
+    subdirectory. If capture is True, output of the commands is collected
+    instead of being shown. Return the dictionary with the results.'''
+    build = joinpath(testdir, 'build')
+    output = list()
+    result = dict()
+    result['testdir'] = testdir
+    result['status'] = 'passed'
+    result['phases'] = list()
+    result['remaining'] = list()
+    if not isdir(build):
+      os.makedirs(build)
+    for name, args in self.getPhases(makejobs):
+      if name == 'configure':
+        self.seed(build)
+      start = time.time()
+      try: # Try to run phase
+        if capture:
+          process = sp.Popen(args, cwd=build, stdout=sp.PIPE, stderr=sp.STDOUT)
+          output += [process.communicate()[0]]
+        else: # if not capture
+          process = sp.Popen(args, cwd=build)
+          process.wait()
+        status = process.returncode
+      except OSError as error:
+        output += [('%s\n' % error).encode(ENCS['default'])]
+        status = 127
+      phase = dict()
+      phase['name'] = name
+      phase['args'] = args
+      phase['status'] = status
+      phase['time'] = round(time.time() -start, 3)
+      result['phases'] += [phase]
+      if status != 0:
+        result['status'] = 'failed'
+        break
+      if name == 'configure':
+        self.merge(build)
+    if result['status'] == 'passed':
+      result['remaining'] = self.getRemaining(build)
+      if result['remaining']:
+        result['status'] = 'failed'
+    output = b''.join(output).decode(ENCS['shell'], 'replace')
+    result['output'] = output
+    return(result)
+    
+  def execute(self):
+    '''GLTestRunner.execute() -> list
+    
+    Run all scratch packages and return the list of the results in the order
+    of packages. If several packages are processed concurrently, output of
+    every package is shown when it is finished. Failures are reported to the
+    standard error.
+    GLConfig: jobs, verbosity.'''
+    verbose = self.config['verbosity']
+    workers, makejobs = self.getBudget()
+    capture = workers > 1
+    if capture:
+      executor = futures.ThreadPoolExecutor(workers)
+      results = [executor.submit(self.run, testdir, makejobs, capture) \
+        for testdir in self.testdirs]
+      results = (future.result() for future in results)
+    else: # if not capture
+      executor = None
+      results = (self.run(testdir, makejobs, capture) \
+        for testdir in self.testdirs)
+    self.results = list()
+    try: # Try to run packages
+      for result in results:
+        sys.stdout.write(result['output'])
+        sys.stdout.flush()
+        if verbose >= 1:
+          times = ['%s %.1fs' % (phase['name'], phase['time']) \
+            for phase in result['phases']]
+          print('%s: %s (%s)' % (result['testdir'], result['status'],
+            ', '.join(times)))
+        if result['remaining']:
+          message = 'Remaining files: %s\n' % ' '.join(result['remaining'])
+          message += 'gnulib-tool: *** Stop.\n'
+          sys.stderr.write(message)
+        elif result['status'] != 'passed':
+          phase = result['phases'][-1]
+          message = 'gnulib-tool: *** %s: %s failed with status %d\n' % \
+            (result['testdir'], ' '.join(phase['args']), phase['status'])
+          sys.stderr.write(message)
+        self.results += [result]
+    finally: # Stop workers
+      if executor != None:
+        executor.shutdown()
+    return(list(self.results))
+    
+  def save(self, path):
+    '''GLTestRunner.save(path)
+    
+    Save the results of the last call of execute() to the given file in JSON
+    format. Collected output of the commands is not saved.'''
+    if type(path) is bytes or type(path) is string:
+      if type(path) is bytes:
+        path = path.decode(ENCS['default'])
+    else: # if path has not bytes or string type
+      raise(TypeError('path must be a string, not %s' % type(path).__name__))
+    workers, makejobs = self.getBudget()
+    data = dict()
+    data['jobs'] = self.config['jobs']
+    data['workers'] = workers
+    data['makejobs'] = makejobs
+    data['testdirs'] = \
+    [ # Begin the list of results
+      dict([pair for pair in result.items() if pair[0] != 'output']) \
+      for result in self.results
+    ] # Finish the list of results
+    with codecs.open(path, 'wb', 'UTF-8') as file:
+      json.dump(data, file, indent=2, sort_keys=True)
+      file.write('\n')
+
+
+#===============================================================================
+# Define worker functions
+#===============================================================================
+def _initialize_worker_(config):
+  '''_initialize_worker_(config)
+  
+  Initialize the worker process of GLMegaTestDir: the module database which
+  was saved by the parent process is used as a read-only snapshot.'''
+  database = GLModuleSystem(config).getDatabase()
+  if database:
+    database.readonly = True
+
+def _create_testdir_(task):
+  '''_create_testdir_(task) -> tuple
+  
+  Create a scratch package for GLMegaTestDir. Task is a tuple of the
+  configuration, the directory and the list of module names. Everything
+  written to the standard output and error, including the output of the
+  child processes, is collected. Return tuple of directory, collected output
+  and error message, which is None if scratch package was created.'''
+  config, testdir, modules = task
+  config = config.copy()
+  config.resetTempDir()
+  config.setModules(modules)
+  sys.stdout.flush()
+  sys.stderr.flush()
+  descriptors = [os.dup(1), os.dup(2)]
+  error = None
+  with tempfile.TemporaryFile() as file:
+    os.dup2(file.fileno(), 1)
+    os.dup2(file.fileno(), 2)
+    try: # Try to create scratch package
+      GLTestDir(config, testdir).execute()
+    except GLError as exc:
+      error = repr(exc)
+    except SystemExit as exc:
+      error = 'exit status %s' % exc.code
+    except Exception as exc:
+      error = '%s: %s' % (type(exc).__name__, exc)
+    finally: # Restore descriptors
+      sys.stdout.flush()
+      sys.stderr.flush()
+      os.dup2(descriptors[0], 1)
+      os.dup2(descriptors[1], 2)
+      os.close(descriptors[0])
+      os.close(descriptors[1])
+      config.removeTempDir()
+    file.seek(0)
+    output = file.read().decode(ENCS['default'], 'replace')
+  result = tuple([testdir, output, error])
+  return(result)
 
@@ -1,71 +1,97 @@
 #!/usr/bin/python
 # encoding: UTF-8
 
-'''An easy access to pygnulib classes.'''
+'''An easy access to pygnulib classes. Since Python 3.7, classes are imported
+on first access, so every mode of gnulib-tool loads only the modules which
+it really needs.'''
 
 #===============================================================================
 # Define global imports
 #===============================================================================
+import sys
+import importlib
 __all__ = list()
 
 try:
   # Constants
   from . import constants
-  
-  # Main classes
-  from .GLConfig import GLConfig
-  from .GLError import GLError
-  from .GLInfo import GLInfo
-  
-  # File system
-  from .GLFileSystem import GLFileSystem
-  from .GLFileSystem import GLFileAssistant
-  
-  # Module system
-  from .GLModuleSystem import GLModule
-  from .GLModuleSystem import GLModuleSystem
-  from .GLModuleSystem import GLModuleTable
-  
-  # Different modes
-  from .GLImport import GLImport
-  from .GLEmiter import GLEmiter
-  from .GLTestDir import GLTestDir
-  from .GLTestDir import GLMegaTestDir
-  
-  # Other modules
-  from .GLMakefileTable import GLMakefileTable
 except ValueError as error:
   # Constants
   import constants
-  
+
+
+#===============================================================================
+# Define global constants
+#===============================================================================
+MODULES = \
+{ # Begin the map of classes to the modules which define them
   # Main classes
-  from GLConfig import GLConfig
-  from GLError import GLError
-  from GLInfo import GLInfo
+  'GLConfig': 'GLConfig',
+  'GLError': 'GLError',
+  'GLInfo': 'GLInfo',
   
   # File system
-  from GLFileSystem import GLFileSystem
-  from GLFileSystem import GLFileAssistant
+  'GLFileSystem': 'GLFileSystem',
+  'GLFileAssistant': 'GLFileSystem',
+  'GLManifest': 'GLFileSystem',
   
   # Module system
-  from GLModuleSystem import GLModule
-  from GLModuleSystem import GLModuleSystem
-  from GLModuleSystem import GLModuleTable
+  'GLModule': 'GLModuleSystem',
+  'GLModuleSystem': 'GLModuleSystem',
+  'GLModuleTable': 'GLModuleSystem',
+  'GLModuleDatabase': 'GLModuleDatabase',
   
   # Different modes
-  from GLImport import GLImport
-  from GLEmiter import GLEmiter
-  from GLTestDir import GLTestDir
-  from GLTestDir import GLMegaTestDir
+  'GLImport': 'GLImport',
+  'GLEmiter': 'GLEmiter',
+  'GLSink': 'GLEmiter',
+  'GLTestDir': 'GLTestDir',
+  'GLMegaTestDir': 'GLTestDir',
+  'GLTestRunner': 'GLTestDir',
+  'GLServer': 'GLServer',
+  'GLProfiler': 'GLProfiler',
   
   # Other modules
-  from GLMakefileTable import GLMakefileTable
+  'GLMakefileTable': 'GLMakefileTable',
+} # Finish the map of classes to the modules which define them
+
+
+#===============================================================================
+# Define lazy access to classes
+#===============================================================================
+def __getattr__(name):
+  '''Import the module which defines the given class and return the class.
+  Class is then stored in the namespace, so it is imported only once.'''
+  if name not in MODULES:
+    raise(AttributeError('module %s has no attribute %s' % \
+      (repr(__name__), repr(name))))
+  if __package__:
+    module = importlib.import_module('.%s' % MODULES[name], __package__)
+  else: # if not __package__
+    module = importlib.import_module(MODULES[name])
+  result = getattr(module, name)
+  globals()[name] = result
+  return(result)
+
+def __dir__():
+  '''Return names of the module together with the names of all classes.'''
+  result = sorted(set(list(globals()) +list(MODULES)))
+  return(result)
+
+# Module __getattr__ (PEP 562) needs Python 3.7; older versions import all
+# classes right away.
+if sys.version_info < (3, 7):
+  for name in MODULES:
+    globals()[name] = __getattr__(name)
+  del name
 
 # Append modules to namespace.
 __all__ += ['GLConfig', 'GLError', 'GLInfo']
-__all__ += ['GLFileSystem', 'GLFileAssistant']
+__all__ += ['GLFileSystem', 'GLFileAssistant', 'GLManifest']
 __all__ += ['GLModule', 'GLModuleSystem', 'GLModuleTable']
-__all__ += ['GLImport', 'GLEmiter', 'GLTestDir']
+__all__ += ['GLModuleDatabase']
+__all__ += ['GLImport', 'GLEmiter', 'GLTestDir', 'GLTestRunner']
+__all__ += ['GLServer', 'GLProfiler']
 __all__ += ['GLMakefileTable']
 
 #===============================================================================
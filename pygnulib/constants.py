@@ -10,7 +10,7 @@ from __future__ import unicode_literals
 import re
 import os
 import sys
-import platform
+import shutil
 import tempfile
 import subprocess as sp
 
@@ -62,6 +62,7 @@ ENCS = dict() # Encodings
 FILES = dict() # Files
 MODES = dict() # Modes
 TESTS = dict() # Tests
+SEDSCRIPTS = dict() # Compiled sed scripts
 NL = '''
 ''' # Newline character
 ALPHANUMERIC = 'abcdefghijklmnopqrstuvwxyz\
@@ -104,6 +105,10 @@ DIRS['modules'] = os.path.join(DIRS['root'], 'modules')
 DIRS['tests'] = os.path.join(DIRS['root'], 'tests')
 DIRS['git'] = os.path.join(DIRS['root'], '.git')
 DIRS['cvs'] = os.path.join(DIRS['root'], 'CVS')
+if os.getenv('XDG_CACHE_HOME'):
+  DIRS['cache'] = os.path.join(os.getenv('XDG_CACHE_HOME'), 'pygnulib')
+else: # if not os.getenv('XDG_CACHE_HOME')
+  DIRS['cache'] = os.path.join(os.path.expanduser('~'), '.cache', 'pygnulib')
 
 # Set FILES dictionary
 FILES['changelog'] = os.path.join(DIRS['root'], 'ChangeLog')
@@ -139,6 +144,30 @@ TESTS = \
   'all-tests':         6,
 }
 
+# Set STATUS dictionary: bit masks of the words from the Status section; every
+# other word which ends with '-test' is treated as 'all-test'
+STATUS = \
+{
+  'obsolete':          1 << 0,
+  'c++-test':          1 << 1,
+  'longrunning-test':  1 << 2,
+  'privileged-test':   1 << 3,
+  'unportable-test':   1 << 4,
+  'all-test':          1 << 5,
+}
+
+# Set FIELDS list: the fields of module which --extract-json can emit
+FIELDS = \
+[
+  'name', 'description', 'comment', 'status', 'notice', 'applicability',
+  'files', 'dependencies', 'autoconf-early', 'autoconf', 'automake',
+  'include', 'link', 'license', 'maintainer', 'tests-module',
+]
+
+# Set COPYMODES list: the ways to place files into the destination directory
+COPYMODES = ['auto', 'reflink', 'hardlink', 'copy']
+FICLONE = 0x40049409 # Linux ioctl which clones a file on CoW filesystems
+
 # Define AUTOCONF minimum version
 DEFAULT_AUTOCONF_MINVERSION = 2.59
 # You can set AUTOCONFPATH to empty if autoconf 2.57 is already in your PATH
@@ -223,12 +252,13 @@ else:
 #===============================================================================
 # Define global functions
 #===============================================================================
-def execute(args, verbose):
-  '''Execute the given shell command.'''
+def execute(args, verbose, cwd=None):
+  '''Execute the given shell command in the given directory, which defaults
+  to the current directory.'''
   if verbose >= 0:
     print("executing %s" % ' '.join(args))
     try: # Try to run
-      retcode = sp.call(args)
+      retcode = sp.call(args, cwd=cwd)
     except Exception as error:
       print(error)
       sys.exit(1)
@@ -240,7 +270,7 @@ def execute(args, verbose):
       temp = temp.decode(ENCS['system'])
     xargs = '%s > %s 2>&1' % (' '.join(args), temp)
     try: # Try to run
-      retcode = sp.call(xargs, shell=True)
+      retcode = sp.call(xargs, shell=True, cwd=cwd)
     except Exception as error:
       print(error)
       sys.exit(1)
@@ -293,9 +323,13 @@ def joinpath(head, *tail):
     result = result.decode(ENCS['default'])
   return(result)
 
-def relativize(dir1, dir2):
-  '''Compute a relative pathname reldir such that dir1/reldir = dir2.'''
-  dir0 = os.getcwd()
+def relativize(dir1, dir2, base=None):
+  '''Compute a relative pathname reldir such that dir1/reldir = dir2. Both
+  relative dir1 and dir2 are relative to the base directory, which defaults
+  to the current directory.'''
+  dir0 = base if base != None else os.getcwd()
+  if type(dir0) is bytes:
+    dir0 = dir0.decode(ENCS['default'])
   if type(dir1) is bytes:
     dir1 = dir1.decode(ENCS['default'])
   if type(dir2) is bytes:
@@ -309,7 +343,7 @@ def relativize(dir1, dir2):
       first = dir1[:dir1.find(os.path.sep)]
     if first != '.':
       if first == '..':
-        dir2 = os.path.basename(joinpath(dir0, dir2))
+        dir2 = joinpath(os.path.basename(dir0), dir2)
         dir0 = os.path.dirname(dir0)
       else: # if first != '..'
         # Get first component of dir2
@@ -326,9 +360,11 @@ def relativize(dir1, dir2):
   result = os.path.normpath(dir2)
   return(result)
 
-def link_relative(src, dest):
-    '''Like ln -s, except that src is given relative to the current directory
-    (or absolute), not given relative to the directory of dest.'''
+def link_relative(src, dest, base=None):
+    '''Like ln -s, except that src is given relative to the base directory
+    (or absolute), not given relative to the directory of dest. Relative dest
+    is also relative to the base directory, which defaults to the current
+    directory.'''
     if type(src) is bytes or type(src) is string:
       if type(src) is bytes:
         src = src.decode(ENCS['default'])
@@ -341,34 +377,96 @@ def link_relative(src, dest):
     else: # if dest has not bytes or string type
       raise(TypeError(
         'dest must be a string, not %s' % (type(dest).__name__)))
+    if base == None:
+      base = os.getcwd()
+    if type(base) is bytes:
+      base = base.decode(ENCS['default'])
     if src.startswith('/'):
-      os.symlink(src, dest)
+      os.symlink(src, joinpath(base, dest))
     else: # if not src.startswith('/')
       if dest.startswith('/'):
-        if not constants.PYTHON3:
-          cwd = os.getcwdu()
-        else: # if constants.PYTHON3
-          cwd = os.getcwd()
-        os.symlink(joinpath(cwd, src), dest)
+        os.symlink(joinpath(base, src), dest)
       else: # if not dest.startswith('/')
         destdir = os.path.dirname(dest)
         if not destdir:
           destdir = '.'
         if type(destdir) is bytes:
           destdir = destdir.decode(ENCS['default'])
-        src = relativize(destdir, src)
-        os.symlink(src, dest)
+        src = relativize(destdir, src, base)
+        os.symlink(src, joinpath(base, dest))
 
-def link_if_changed(src, dest):
-  '''Create a symlink, but avoids munging timestamps if the link is correct.'''
+def link_if_changed(src, dest, base=None):
+  '''Create a symlink, but avoids munging timestamps if the link is correct.
+  Relative src and dest are relative to the base directory, which defaults
+  to the current directory.'''
   if type(src) is bytes:
     src = src.decode(ENCS['default'])
   if type(dest) is bytes:
     dest = dest.decode(ENCS['default'])
-  ln_target = os.path.realpath(src)
-  if not (os.path.islink(dest) and src == ln_target):
+  if base == None:
+    base = os.getcwd()
+  ln_target = os.path.realpath(joinpath(base, src))
+  if not (os.path.islink(joinpath(base, dest)) and src == ln_target):
+    os.remove(joinpath(base, dest))
+    link_relative(src, dest, base)
+
+def copy_file(src, dest, mode='auto', link=False):
+  '''copy_file(src, dest[, mode[, link]]) -> string
+  
+  Copy file src to dest together with its permission bits, replacing dest if
+  it exists. Mode is one of COPYMODES: 'reflink' clones the file using the
+  FICLONE ioctl and fails if filesystem does not support it, 'copy' uses the
+  plain copy and 'auto' tries reflink, then in-kernel copy_file_range or
+  sendfile and then the plain copy. Mode 'hardlink' works like 'auto', but
+  creates a hard link if link is True; caller must allow it only for files
+  which are not changed on the way. Return the method which was used.'''
+  if mode not in COPYMODES:
+    raise(ValueError('invalid copy mode: %s' % repr(mode)))
+  if os.path.lexists(dest):
     os.remove(dest)
-    link_relative(src, dest)
+  if mode == 'hardlink' and link:
+    try: # Try to create hard link
+      os.link(src, dest)
+      return('hardlink')
+    except OSError as error:
+      pass # Different filesystems or no hard links at all
+  if mode != 'copy':
+    try: # Try to clone file
+      import fcntl
+      with open(src, 'rb') as fsrc:
+        with open(dest, 'wb') as fdest:
+          fcntl.ioctl(fdest.fileno(), FICLONE, fsrc.fileno())
+      shutil.copymode(src, dest)
+      return('reflink')
+    except (ImportError, IOError, OSError) as error:
+      if os.path.lexists(dest):
+        os.remove(dest)
+      if mode == 'reflink':
+        raise(error)
+    try: # Try to copy file inside the kernel
+      with open(src, 'rb') as fsrc:
+        with open(dest, 'wb') as fdest:
+          size = os.fstat(fsrc.fileno()).st_size
+          offset = 0
+          while offset < size:
+            if hasattr(os, 'copy_file_range'):
+              count = os.copy_file_range(fsrc.fileno(), fdest.fileno(),
+                size -offset, offset, offset)
+            else: # if not hasattr(os, 'copy_file_range')
+              count = os.sendfile(fdest.fileno(), fsrc.fileno(), offset,
+                size -offset)
+            if not count:
+              break
+            offset += count
+      if offset == size:
+        shutil.copymode(src, dest)
+        return('kernel')
+    except (AttributeError, IOError, OSError) as error:
+      pass # Fall back to the plain copy
+    if os.path.lexists(dest):
+      os.remove(dest)
+  shutil.copy(src, dest)
+  return('copy')
 
 def filter_filelist(separator, filelist,
   prefix, suffix, removed_prefix, removed_suffix,
@@ -402,9 +500,8 @@ def subend(orig, repl, data):
 
 def nlconvert(text):
   '''Convert line-endings to specific for this platform.'''
-  system = platform.system().lower()
   text = text.replace('\r\n', '\n')
-  if system == 'windows':
+  if sys.platform.startswith('win'):
     text = text.replace('\n', '\r\n')
   return(text)
 
@@ -432,5 +529,344 @@ def nlcount(text):
     counter -= 1
   print(before, after)
 
+def splitlines(data):
+  '''Split bytes into lines keeping the trailing newlines. Unlike the method
+  bytes.splitlines, only LF is treated as a line separator.'''
+  lines = [line +b'\n' for line in data.split(b'\n')]
+  lines[-1] = lines[-1][:-1]
+  if not lines[-1]:
+    lines.pop()
+  return(lines)
+
+def apply_patch(data, diff):
+  '''apply_patch(data, diff) -> bytes or None
+  
+  Apply unified diff to the given data, like 'patch -s' does. Each hunk must
+  match exactly, but it may be found at another offset; the hunks must not
+  overlap. Both arguments and result are bytes. If diff does not apply or if
+  it touches more than one file, return None.'''
+  header = re.compile(b'^@@ -(\\d+)(?:,(\\d+))? \\+(\\d+)(?:,(\\d+))? @@')
+  lines = splitlines(data)
+  hunks = list()
+  files = 0
+  difflines = splitlines(diff)
+  counter = 0
+  while counter < len(difflines):
+    line = difflines[counter]
+    counter += 1
+    if line.startswith(b'--- '):
+      files += 1
+      continue
+    match = header.match(line)
+    if not match:
+      continue
+    start = int(match.group(1))
+    oldcount = 1 if match.group(2) == None else int(match.group(2))
+    newcount = 1 if match.group(4) == None else int(match.group(4))
+    old = list()
+    new = list()
+    kinds = bytes()
+    last = None
+    while (oldcount or newcount or (counter < len(difflines) \
+    and difflines[counter].startswith(b'\\'))) and counter < len(difflines):
+      line = difflines[counter]
+      counter += 1
+      kind = line[:1]
+      if kind == b'\\':
+        # "\ No newline at end of file" refers to the previous line.
+        if last in [b' ', b'-']:
+          old[-1] = old[-1].rstrip(b'\n')
+        if last in [b' ', b'+']:
+          new[-1] = new[-1].rstrip(b'\n')
+        continue
+      if kind in [b'\n', b'\r']:
+        # Some editors strip the trailing whitespace of the context lines.
+        kind = b' '
+        line = b' ' +line
+      if kind == b' ':
+        old += [line[1:]]
+        new += [line[1:]]
+        oldcount -= 1
+        newcount -= 1
+      elif kind == b'-':
+        old += [line[1:]]
+        oldcount -= 1
+      elif kind == b'+':
+        new += [line[1:]]
+        newcount -= 1
+      else: # if kind is unknown
+        return(None)
+      kinds += kind
+      last = kind
+    if oldcount > 0 or newcount > 0:
+      return(None)
+    # Pure insertion "@@ -N,0 ..." is placed after the line N.
+    if old:
+      start -= 1
+    # Hunk with less leading than trailing context must match at the start of
+    # file and vice versa, so the hunks at file edges are never moved.
+    prefix = len(kinds) -len(kinds.lstrip(b' '))
+    suffix = len(kinds) -len(kinds.rstrip(b' '))
+    anchor = None
+    if prefix < suffix:
+      anchor = 'start'
+    elif suffix < prefix:
+      anchor = 'end'
+    hunks += [tuple([start, old, new, anchor])]
+  if files > 1 or not hunks:
+    return(None)
+  result = list()
+  position = 0 # First line of data which was not copied yet
+  offset = 0 # Offset at which the previous hunk was found
+  for start, old, new, anchor in hunks:
+    if not old and lines:
+      # Hunk without context lines can be applied only to the empty file.
+      return(None)
+    if anchor == 'start':
+      candidates = [0]
+    elif anchor == 'end':
+      candidates = [len(lines) -len(old)]
+    else: # if anchor == None
+      # Try the expected place first, then look around it.
+      expected = start +offset
+      candidates = [expected]
+      for delta in range(1, len(lines) +1):
+        candidates += [expected +delta, expected -delta]
+    found = None
+    for candidate in candidates:
+      if position <= candidate <= len(lines) -len(old) \
+      and lines[candidate:candidate +len(old)] == old:
+        found = candidate
+        break
+    if found == None:
+      return(None)
+    offset = found -start
+    result += lines[position:found]
+    result += new
+    position = found +len(old)
+  result += lines[position:]
+  result = b''.join(result)
+  return(result)
+
+def compile_bre(regex, delimiter):
+  '''compile_bre(regex, delimiter) -> regex or None
+  
+  Translate POSIX basic regular expression, as used by sed, to the compiled
+  Python regular expression over bytes. Besides the ordinary characters, the
+  translation supports '.', '*', '^' and '$' anchors, bracket expressions
+  without character classes, groups, intervals and back-references, so the
+  result never matches newline. Return None if regex uses something else.'''
+  result = string()
+  index = 0
+  atom = False # Whether previous element can be repeated
+  while index < len(regex):
+    char = regex[index]
+    index += 1
+    if char == '\\':
+      if index == len(regex):
+        return(None)
+      char = regex[index]
+      index += 1
+      if char == '(':
+        result += '('
+        atom = False
+        if regex[index:index +1] == '^':
+          result += '^'
+          index += 1
+        continue
+      elif char == ')':
+        result += ')'
+      elif char == '{':
+        if not atom:
+          return(None)
+        end = regex.find('\\}', index)
+        interval = regex[index:end]
+        if end < 0 or not interval or interval.strip('0123456789,') \
+        or interval.count(',') > 1 or interval.startswith(','):
+          return(None)
+        result += '{%s}' % interval
+        index = end +2
+        continue
+      elif char in '123456789':
+        result += '\\%s' % char
+      elif char in '.*[]^$\\/' or char == delimiter:
+        result += re.escape(char)
+      elif char == 't':
+        result += '\\t'
+      else: # if char is not supported
+        return(None)
+    elif char == '[':
+      end = index
+      if regex[end:end +1] == '^':
+        end += 1
+      if regex[end:end +1] == ']':
+        end += 1
+      end = regex.find(']', end)
+      if end < 0:
+        return(None)
+      content = regex[index:end]
+      index = end +1
+      negation = content.startswith('^')
+      if negation:
+        content = content[1:]
+      if '[' in content or '\\' in content \
+      or [part for part in content if ord(part) > 127]:
+        return(None) # Character classes, escapes and multibyte characters
+      content = ''.join([part if part == '-' else re.escape(part) \
+        for part in content])
+      if negation:
+        result += '[^%s\\n]' % content
+      else: # if not negation
+        result += '[%s]' % content
+    elif char == '*':
+      if not atom:
+        result += '\\*'
+      else: # if atom
+        result += '*'
+        continue
+    elif char == '^':
+      if index == 1:
+        result += '^'
+        continue
+      result += '\\^'
+    elif char == '$':
+      if index == len(regex) or regex[index:index +2] == '\\)':
+        result += '$'
+        continue
+      result += '\\$'
+    elif char == '.':
+      result += '.'
+    else: # if char is an ordinary character
+      result += re.escape(char)
+    atom = True
+  try: # Try to compile regex
+    result = re.compile(result.encode(ENCS['default']), re.M)
+  except Exception as error:
+    return(None)
+  return(result)
+
+def compile_sed(script):
+  '''compile_sed(script) -> list or None
+  
+  Compile sed script into the list of substitutions. Only 's' commands with
+  the optional 'g' flag are supported; commands are separated by newlines or
+  semicolons. Return None if script uses something else. Compiled scripts are
+  memoized, so every script is compiled only once.'''
+  if script in SEDSCRIPTS:
+    return(SEDSCRIPTS[script])
+  result = list()
+  index = 0
+  while index < len(script):
+    char = script[index]
+    index += 1
+    if char.isspace() or char == ';':
+      continue
+    if char == '#':
+      index = script.find('\n', index)
+      if index < 0:
+        break
+      continue
+    if char != 's' or index == len(script):
+      result = None
+      break
+    delimiter = script[index]
+    index += 1
+    if delimiter in '\\\n':
+      result = None
+      break
+    # Split command into regex, replacement and flags.
+    parts = list()
+    start = index
+    while len(parts) < 2 and index < len(script):
+      char = script[index]
+      index += 1
+      if char == '\\':
+        index += 1
+      elif char == delimiter:
+        parts += [script[start:index -1]]
+        start = index
+      elif char == '\n':
+        break
+    end = index
+    while end < len(script) and script[end] not in ';\n':
+      end += 1
+    flags = script[index:end].strip()
+    index = end
+    if len(parts) < 2 or not parts[0] or flags not in ['', 'g']:
+      result = None
+      break
+    regex = compile_bre(parts[0], delimiter)
+    if regex == None:
+      result = None
+      break
+    replacement = list()
+    position = 0
+    text = parts[1]
+    while position < len(text):
+      char = text[position]
+      position += 1
+      if char == '&':
+        replacement += [0]
+      elif char == '\\':
+        char = text[position:position +1]
+        position += 1
+        if char and char in '123456789':
+          replacement += [int(char)]
+        elif char == 'n':
+          replacement += [b'\n']
+        elif char == 't':
+          replacement += [b'\t']
+        elif char and char in '&\\' or char == delimiter:
+          replacement += [char.encode(ENCS['default'])]
+        else: # if char is not supported
+          result = None
+          break
+      else: # if char is an ordinary character
+        replacement += [char.encode(ENCS['default'])]
+    if result == None:
+      break
+    result += [tuple([regex, replacement, flags == 'g'])]
+  SEDSCRIPTS[script] = result
+  return(result)
+
+def apply_sed(script, data):
+  '''apply_sed(script, data) -> bytes
+  
+  Apply sed script to the given bytes and return the result. Scripts which
+  are supported by compile_sed are applied in-process, otherwise 'sed'
+  utility is used. The result is the same as the output of GNU sed.'''
+  commands = compile_sed(script)
+  if commands == None:
+    args = ['sed', '-e', script]
+    result = sp.check_output(args, input=data, shell=False)
+    return(result)
+  if not data:
+    return(data)
+  # Every command is applied to the whole data at once; the last newline is
+  # removed, so '^' and '$' match exactly at the beginning and end of lines.
+  newline = data.endswith(b'\n')
+  if newline:
+    data = data[:-1]
+  for regex, replacement, globally in commands:
+    state = [-1, -1] # End of the last match and end of its line
+    def substitute(match):
+      start, end = match.span()
+      if start == end and start == state[0]:
+        # Empty match is not allowed right after the previous match.
+        return(match.group(0))
+      if not globally and start <= state[1]:
+        return(match.group(0))
+      state[0] = end
+      state[1] = data.find(b'\n', start)
+      if state[1] < 0:
+        state[1] = len(data)
+      parts = [match.group(part) or b'' if type(part) is int else part \
+        for part in replacement]
+      return(b''.join(parts))
+    data = regex.sub(substitute, data)
+  if newline:
+    data += b'\n'
+  return(data)
+
 __all__ += ['APP', 'DIRS', 'FILES', 'MODES', 'UTILS']
 
@@ -6,6 +6,8 @@ from __future__ import unicode_literals
 # Define global imports
 #===============================================================================
 import os
+import sys
+import time
 import difflib
 import subprocess as sp
 from . import constants
@@ -31,12 +33,14 @@ ENCS = constants.ENCS
 UTILS = constants.UTILS
 FILES = constants.FILES
 MODES = constants.MODES
+joinpath = constants.joinpath
 
 
 #===============================================================================
 # The main part of the module
 #===============================================================================
 gnulib_bash = os.path.join(DIRS['root'], 'gnulib-tool')
+gnulib_python = os.path.join(DIRS['root'], 'gnulib-tool.py')
 def testVersion():
   '''Test and compare output from gnulib-tool.sh and gnulib-tool.py with
   --version option enabled. Prints difference between outputs, else prints
@@ -122,3 +126,160 @@ def testList():
   else: # message_sh == message_py:
     print('Test was completed successfully.\n')
 
+
+def testSedTransformers():
+  '''Test and compare output from GNU sed and constants.apply_sed for every
+  file in the lib directory, using the scripts which GLImport.sed_transformers
+  builds for GLImport.prepare with every lgpl setting, with and without
+  copyrights and config-h. Prints the names of the files which differ, else
+  prints that test was completed successfully.'''
+  print('#' *80)
+  print('Begin testing of the sed transformers...')
+  print('#' *80)
+  scripts = list()
+  for lgpl in [False, True, 2, 3]:
+    for copyrights in [True, False]:
+      for config_h in [False, True]:
+        transformers = \
+          classes.GLImport.sed_transformers(lgpl, copyrights, config_h)
+        for key in sorted(transformers):
+          script = transformers[key]
+          if script and script not in scripts:
+            scripts += [script]
+  failures = list()
+  for script in scripts:
+    if constants.compile_sed(script) == None:
+      failures += ['script is not supported: %s' % repr(script)]
+      continue
+    for root, directories, files in os.walk(joinpath(DIRS['root'], 'lib')):
+      for name in sorted(files):
+        path = joinpath(root, name)
+        with open(path, 'rb') as file:
+          data = file.read()
+        expected = sp.check_output(['sed', '-e', script], input=data)
+        if constants.apply_sed(script, data) != expected:
+          failures += ['%s: %s' % (path, repr(script))]
+  if failures:
+    for failure in failures:
+      print(failure)
+  else: # if not failures
+    print('Test was completed successfully.\n')
+
+def testConditionalDependencies():
+  '''Test the gnulib-comp.m4 code which GLModuleTable.transitive_closure and
+  GLEmiter.autoconfSnippets produce with conditional dependencies enabled.
+  Every conditional module must get its shell variable, its function and its
+  automake conditional; unconditional modules must call the functions of their
+  conditional dependencies under the conditions from the module description.
+  Prints the problems which were found, else prints that test was completed
+  successfully.'''
+  print('#' *80)
+  print('Begin testing of the conditional dependencies...')
+  print('#' *80)
+  cases = \
+  [ # Begin the list of cases
+    # errno is unconditional, since its Makefile.am snippet uses 'if'.
+    tuple(['acosf', ['acos'], ['acos', 'test $HAVE_ACOSF = 0']]),
+    tuple(['accept', ['msvc-inval', 'msvc-nothrow'],
+      ['msvc-nothrow', 'test "$ac_cv_header_winsock2_h" = yes']]),
+  ] # Finish the list of cases
+  failures = list()
+  config = classes.GLConfig(conddeps=True)
+  macro_prefix = config['macro_prefix']
+  modulesystem = classes.GLModuleSystem(config)
+  emiter = classes.GLEmiter(config)
+  fileassistant = classes.GLFileAssistant(config)
+  for base, expected, call in cases:
+    moduletable = classes.GLModuleTable(config, list(), modulesystem)
+    modules = moduletable.transitive_closure([modulesystem.find(base)])
+    emit = emiter.autoconfSnippets(modules, moduletable, fileassistant,
+      0, True, False, False, False)
+    conditionals = [str(module) for module in modules \
+      if moduletable.isConditional(module)]
+    if conditionals != expected:
+      failures += ['%s: conditional modules are %s, not %s' % \
+        (base, conditionals, expected)]
+    for module in modules:
+      shellfunc = module.getShellFunc(macro_prefix)
+      shellvar = module.getShellVar(macro_prefix)
+      condname = module.getConditionalName(macro_prefix)
+      lines = \
+      [ # Begin the list of lines
+        '  %s=false\n' % shellvar,
+        '  %s ()\n  {\n    if ! $%s;' % (shellfunc, shellvar),
+        '      %s=true\n' % shellvar,
+        '  AM_CONDITIONAL([%s], [$%s])\n' % (condname, shellvar),
+      ] # Finish the list of lines
+      for line in lines:
+        if (line in emit) != moduletable.isConditional(module):
+          failures += ['%s: %s: %s' % (base, str(module), repr(line))]
+    if emit.count('  {\n') != emit.count('    fi\n  }\n'):
+      failures += ['%s: functions are not closed' % base]
+    shellfunc = modulesystem.find(call[0]).getShellFunc(macro_prefix)
+    line = '  if %s; then\n    %s\n  fi\n' % (call[1], shellfunc)
+    if line not in emit:
+      failures += ['%s: %s is not called' % (base, call[0])]
+  if failures:
+    for failure in failures:
+      print(failure)
+  else: # if not failures
+    print('Test was completed successfully.\n')
+
+#===============================================================================
+# Benchmarks
+#===============================================================================
+def benchTransitiveClosure(repeat=5):
+  '''Measure GLModuleTable.transitive_closure over all available modules,
+  without and with tests modules. Module descriptions are parsed before the
+  measurement, so only the closure itself is timed. Prints the best time of
+  the given number of runs for each case.'''
+  print('#' *80)
+  print('Begin benchmark of the transitive closure...')
+  print('#' *80)
+  for testflags in [list(), [constants.TESTS['tests']]]:
+    config = classes.GLConfig(testflags=testflags)
+    modulesystem = classes.GLModuleSystem(config)
+    modules = [modulesystem.find(module) for module in modulesystem.list()]
+    moduletable = classes.GLModuleTable(config, list(), modulesystem)
+    moduletable.transitive_closure(modules)
+    timings = list()
+    for index in range(repeat):
+      moduletable = classes.GLModuleTable(config, list(), modulesystem)
+      start = time.time()
+      result = moduletable.transitive_closure(modules)
+      timings += [time.time() -start]
+    print('%d modules, testflags %s: %d modules in closure, best of %d: %.3fs' \
+      % (len(modules), testflags, len(result), repeat, min(timings)))
+  print('Benchmark was completed successfully.\n')
+
+def benchStartup(repeat=5):
+  '''Measure the wall time of gnulib-tool.py runs in the modes which do only
+  a little work, so the time is dominated by the startup: imports, parsing of
+  the arguments and creation of the configuration. Every run is a new process
+  with the warm module database. Prints the best time of the given number of
+  runs for each mode.'''
+  print('#' *80)
+  print('Begin benchmark of the startup...')
+  print('#' *80)
+  modes = \
+  [ # Begin the list of modes
+    ['--version'],
+    ['--help'],
+    ['--list'],
+    ['--extract-description', 'stdio'],
+    ['--extract-license', 'stdio'],
+    ['--extract-dependencies', 'stdio'],
+    ['--extract-json', 'stdio'],
+  ] # Finish the list of modes
+  with open(os.devnull, 'wb') as devnull:
+    for args in modes:
+      args = [sys.executable, gnulib_python] +args
+      sp.call(args, stdout=devnull, stderr=devnull)
+      timings = list()
+      for index in range(repeat):
+        start = time.time()
+        sp.call(args, stdout=devnull, stderr=devnull)
+        timings += [time.time() -start]
+      print('%-40s best of %d: %.3fs' % \
+        (' '.join(args[2:]), repeat, min(timings)))
+  print('Benchmark was completed successfully.\n')